@@ -85,6 +85,7 @@ AIMOA=$(pwd)
 /bin/cp "$AIMOA/src/workflow-config.yaml.example" "$AIMOA/config/workflow-config-incomingfax.yaml"	# Uses same default workflow
 /bin/cp "$AIMOA/src/workflow-config-incomingfile.yaml.example" "$AIMOA/config/workflow-config-incomingfile.yaml"	# Custom worklow, skips tagging providers and MRP
 /bin/cp "$AIMOA/src/template_providerlist.txt" "$AIMOA/config/"
+/bin/cp "$AIMOA/src/template_demographics.txt" "$AIMOA/config/"
 /bin/echo "...remember to edit the config files in ../config/* to customize to your installation."
 # Initialize installation to re-fresh provider list
 /bin/echo "Removing provider_list for clean start..."
@@ -0,0 +1,26 @@
+#!/bin/bash
+# Startup script for the AI-MOA LLM broker, shared by the AI-MOA services (main, incomingfax, incomingfile, pif) to queue their LLM requests.
+
+# CONFIGURATION:
+# Automatic configuration of paths:
+CURRENT=$(pwd)
+cd ..
+AIMOA=$(pwd)
+AIPYTHONENV=$(pwd)/.env
+# Override by specifying the full path for AI-MOA base directory and Python virtual environment that contains the installed python pre-requisite packages:
+# AIMOA=/opt/ai-moa
+# AIPYTHONENV=/opt/virtualenv/aimoa
+
+# Activate Python virtual environment with installed pre-requisite packages
+source $AIPYTHONENV/bin/activate
+
+# Option to disable warnings when using a self-signed SSL certificate for servers, quiet the logging
+export PYTHONWARNINGS="ignore:Unverified HTTPS request"
+
+# Command to start the LLM broker, reading the 'llm_broker' section of config.yaml
+/bin/echo "Starting AI-MOA LLM broker..."
+cd $AIMOA/src
+python3 llm_broker.py --config $AIMOA/config/config.yaml
+
+# Returning to previous path location
+cd $CURRENT
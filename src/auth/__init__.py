@@ -22,5 +22,6 @@
 from .login_manager import LoginManager
 from .driver_manager import DriverManager
 from .session_manager import SessionManager
+from .emr_client import EMRClient, AdaptiveLimiter
 
-__all__ = ['LoginManager', 'DriverManager', 'SessionManager']
+__all__ = ['LoginManager', 'DriverManager', 'SessionManager', 'EMRClient', 'AdaptiveLimiter']
@@ -0,0 +1,185 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import time
+import logging
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from config import ConfigManager
+
+logger = logging.getLogger(__name__)
+
+# Concurrency limiters are kept for the lifetime of the process, keyed by EMR base URL, so the learned
+# limit carries over between workflow runs.
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class AdaptiveLimiter:
+    """
+    An AIMD (additive increase, multiplicative decrease) concurrency limiter for EMR requests.
+
+    The number of concurrent requests grows by about one for every `limit` fast, successful requests, and
+    is cut by `decrease_factor` when a request fails or is slower than `target_latency`, at most once per
+    `target_latency` so a burst of slow replies counts as one congestion signal. Bulk requests (document
+    downloads, report queries) are slow because of their size, so only their failures are counted.
+
+    Attributes:
+        limit (float): The current concurrency limit.
+        in_flight (int): The number of requests currently sent.
+    """
+
+    def __init__(self, initial_limit=2, min_limit=1, max_limit=8, target_latency=2.0, decrease_factor=0.5):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.decrease_factor = decrease_factor
+        self.in_flight = 0
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+
+    def acquire(self, timeout=None):
+        """
+        Waits until a request can be sent under the current limit.
+
+        Returns:
+            bool: `True` when acquired, `False` if the timeout expired.
+        """
+        with self._condition:
+            acquired = self._condition.wait_for(lambda: self.in_flight < int(self.limit), timeout)
+            if acquired:
+                self.in_flight += 1
+            return acquired
+
+    def release(self, latency, success, count_latency=True):
+        """
+        Releases a request and adjusts the limit from its latency and outcome.
+
+        Args:
+            latency (float): The request latency, in seconds.
+            success (bool): Whether the EMR answered without a server error.
+            count_latency (bool): Whether the latency is a congestion signal; `False` for bulk requests,
+                which then only lower the limit when they fail.
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+
+            if not success or (count_latency and latency > self.target_latency):
+                if now - self._last_decrease > self.target_latency:
+                    self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                    self._last_decrease = now
+                    logger.info(f"EMR {'error' if not success else 'slow response'} ({latency:.2f}s), concurrency limit lowered to {int(self.limit)}.")
+            elif count_latency:
+                self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+            self._condition.notify_all()
+
+
+class EMRClient:
+    """
+    A thread-safe client for the EMR (OSCAR) web interface.
+
+    Requests share the logged-in `requests.Session` (cookies and connection pool), but headers such as
+    `Referer` are passed per request instead of being set on the session, so the client can be used from
+    several threads at once. The session connection pool is sized to `emr.max_concurrency`, and the
+    number of concurrent requests is adapted to the EMR response time by an `AdaptiveLimiter`.
+
+    Attributes:
+        session (requests.Session): The logged-in session.
+        limiter (AdaptiveLimiter): The concurrency limiter of the EMR.
+    """
+
+    def __init__(self, session: requests.Session, config: ConfigManager):
+        """
+        Initialize the EMRClient with a logged-in session and a configuration.
+
+        Args:
+            session (requests.Session): The logged-in session.
+            config (ConfigManager): An instance of ConfigManager containing the configuration settings.
+        """
+        self.session = session
+        self.config = config
+
+        max_concurrency = config.get('emr.max_concurrency', 4)
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+        base_url = config.get('emr.base_url')
+        with _limiters_lock:
+            if base_url not in _limiters:
+                _limiters[base_url] = AdaptiveLimiter(
+                    initial_limit=config.get('emr.initial_concurrency', 2),
+                    max_limit=max_concurrency,
+                    target_latency=config.get('emr.target_latency', 2.0)
+                )
+            self.limiter = _limiters[base_url]
+
+    def request(self, method, url, headers=None, count_latency=True, **kwargs):
+        """
+        Sends a request to the EMR under the concurrency limit.
+
+        Args:
+            method (str): The HTTP method.
+            url (str): The request URL.
+            headers (dict, optional): Headers for this request only, ie. `Referer`.
+            count_latency (bool): Whether the response time adjusts the concurrency limit. Set to `False`
+                for bulk requests, such as document downloads, whose response time depends on their size.
+            **kwargs: Other `requests` arguments; `verify` and `timeout` default to `emr.verify-HTTPS`
+                and `general_setting.timeout`.
+
+        Returns:
+            requests.Response: The EMR response.
+
+        Raises:
+            requests.Timeout: If no request slot was free within the timeout.
+            requests.RequestException: If the request failed.
+        """
+        timeout = kwargs.setdefault('timeout', self.config.get('general_setting.timeout', 300))
+        kwargs.setdefault('verify', self.config.get('emr.verify-HTTPS'))
+
+        if not self.limiter.acquire(timeout):
+            raise requests.Timeout(f"No EMR request slot available within {timeout} seconds.")
+
+        start_time = time.monotonic()
+        success = False
+
+        try:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+            success = response.status_code < 500
+            return response
+        finally:
+            self.limiter.release(time.monotonic() - start_time, success, count_latency)
+
+    def get(self, url, **kwargs):
+        """
+        Sends a GET request to the EMR, see `request`.
+        """
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        Sends a POST request to the EMR, see `request`.
+        """
+        return self.request('POST', url, **kwargs)
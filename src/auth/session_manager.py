@@ -22,6 +22,7 @@
 import logging
 from config import ConfigManager
 from .login_manager import LoginManager
+from .emr_client import EMRClient
 
 logger = logging.getLogger(__name__)
 
@@ -38,6 +39,7 @@ class SessionManager:
         login_manager (LoginManager): An instance of LoginManager for
                                       handling login operations.
         session: The current session object.
+        emr_client (EMRClient): The thread-safe EMR client of the current session.
     """
 
     def __init__(self, config: ConfigManager):
@@ -54,6 +56,7 @@ class SessionManager:
         self.config = config
         self.login_manager = LoginManager(config)
         self.session = None
+        self.emr_client = None
         self.driver = None
         self.login_successful = False
         logger.debug("SessionManager initialized")
@@ -66,6 +69,7 @@ class SessionManager:
         driver, and login success status. Logs the outcome of the login attempt.
         """
         self.session, self.driver, self.login_successful = self.login_manager.login()
+        self.emr_client = EMRClient(self.session, self.config)
         if self.login_successful:
             logger.info("Login successful!")
         else:
@@ -81,6 +85,16 @@ class SessionManager:
         logger.debug("Retrieving current session")
         return self.session
 
+    def get_emr_client(self):
+        """
+        Get the thread-safe EMR client of the current session.
+
+        Returns:
+            EMRClient: The EMR client.
+        """
+        logger.debug("Retrieving EMR client")
+        return self.emr_client
+
     def get_driver(self):
         """
         Get the current driver object.
@@ -21,5 +21,6 @@
 
 from .config_manager import ConfigManager
 from .provider_list_manager import ProviderListManager
+from .demographic_index_manager import DemographicIndex, DemographicIndexManager
 
-__all__ = ['ConfigManager', 'ProviderListManager']
+__all__ = ['ConfigManager', 'ProviderListManager', 'DemographicIndex', 'DemographicIndexManager']
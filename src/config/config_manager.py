@@ -256,6 +256,26 @@ class ConfigManager:
         """
         return self.get_workflow('ai_prompts', {})
 
+    @property
+    def ai_prompt_schemas(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Retrieves the output constraints (JSON schema or GBNF grammar) for AI prompts from the workflow configuration.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: A dictionary of constraints keyed by AI prompt name.
+        """
+        return self.get_workflow('ai_prompt_schemas', {})
+
+    @property
+    def ai_prompt_tiers(self) -> Dict[str, Any]:
+        """
+        Retrieves the model tiers AI prompts are sent to first, from the workflow configuration.
+
+        Returns:
+            Dict[str, Any]: A dictionary of model tiers (or tier options) keyed by AI prompt name.
+        """
+        return self.get_workflow('ai_prompt_tiers', {})
+
     @property
     def default_values(self) -> Dict[str, str]:
         """
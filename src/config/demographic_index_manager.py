@@ -0,0 +1,326 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import re
+import csv
+import io
+import sqlite3
+import datetime
+import threading
+import requests
+from typing import Dict, List, Optional
+from bs4 import BeautifulSoup
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_TITLE = "AI-MOA Config Search Demographics (System generated)"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS demographics (
+    demographic_no TEXT PRIMARY KEY,
+    last_name TEXT,
+    first_name TEXT,
+    dob TEXT,
+    hin TEXT,
+    provider_no TEXT,
+    roster_status TEXT,
+    patient_status TEXT,
+    last_update TEXT
+);
+CREATE INDEX IF NOT EXISTS demographics_hin ON demographics (hin);
+CREATE INDEX IF NOT EXISTS demographics_dob ON demographics (dob);
+CREATE TABLE IF NOT EXISTS name_tokens (
+    token TEXT NOT NULL,
+    demographic_no TEXT NOT NULL,
+    part TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS name_tokens_token ON name_tokens (token);
+CREATE INDEX IF NOT EXISTS name_tokens_demographic ON name_tokens (demographic_no);
+CREATE TABLE IF NOT EXISTS sync (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def name_tokens(name: str) -> List[str]:
+    """
+    Returns the normalized tokens of a name: lowercase letters only, split on spaces, hyphens and apostrophes.
+    """
+    return [token for token in re.split(r"[\s,.'-]+", (name or '').lower()) if token]
+
+
+class DemographicIndex:
+    """
+    A local SQLite index of the EMR demographics, searched instead of the EMR demographic search.
+
+    Demographics are indexed by health card number, date of birth and normalized name tokens. Each thread
+    uses its own connection.
+
+    Attributes:
+        file_path (str): The SQLite database file.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self._local = threading.local()
+        self.connection().executescript(SCHEMA)
+
+    def connection(self) -> sqlite3.Connection:
+        """
+        Returns the connection of the current thread.
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.file_path, timeout=30)
+            connection.row_factory = sqlite3.Row
+            self._local.connection = connection
+        return connection
+
+    def get_sync_value(self, key: str) -> Optional[str]:
+        """
+        Returns a value of the sync table, ie. 'last_sync', or `None` if it is not set.
+        """
+        row = self.connection().execute("SELECT value FROM sync WHERE key = ?", (key,)).fetchone()
+        return row['value'] if row else None
+
+    def upsert(self, records: List[Dict[str, str]], synced_at: str) -> None:
+        """
+        Adds or updates demographics and their name tokens, and records the sync time.
+
+        Args:
+            records (List[dict]): The demographics, with the `demographics` table columns.
+            synced_at (str): The time of the sync, 'YYYY-MM-DD HH:MM:SS'.
+        """
+        connection = self.connection()
+        with connection:
+            for record in records:
+                connection.execute(
+                    "INSERT OR REPLACE INTO demographics VALUES (:demographic_no, :last_name, :first_name, :dob, :hin, :provider_no, :roster_status, :patient_status, :last_update)",
+                    record
+                )
+                connection.execute("DELETE FROM name_tokens WHERE demographic_no = ?", (record['demographic_no'],))
+                connection.executemany(
+                    "INSERT INTO name_tokens VALUES (?, ?, ?)",
+                    [(token, record['demographic_no'], part) for part in ('last_name', 'first_name') for token in name_tokens(record[part])]
+                )
+            connection.execute("INSERT OR REPLACE INTO sync VALUES ('last_sync', ?)", (synced_at,))
+
+    def search(self, type_of_query: str, keyword: str, limit: int = 10) -> List[sqlite3.Row]:
+        """
+        Searches active demographics like the EMR demographic search.
+
+        Args:
+            type_of_query (str): 'search_hin', 'search_dob', 'search_name' ('last,first' fragments) or
+                'search_demographic_no'.
+            keyword (str): The search keyword, without wildcards.
+            limit (int): The maximum number of demographics returned.
+
+        Returns:
+            List[sqlite3.Row]: The matching demographics, by last and first name.
+        """
+        connection = self.connection()
+        active = "patient_status = 'AC'"
+
+        if type_of_query == 'search_demographic_no':
+            return connection.execute("SELECT * FROM demographics WHERE demographic_no = ?", (keyword,)).fetchall()
+
+        if type_of_query == 'search_hin':
+            digits = re.sub(r'\D', '', keyword)
+            if not digits:
+                return []
+            rows = connection.execute(f"SELECT * FROM demographics WHERE hin = ? AND {active} ORDER BY last_name, first_name LIMIT ?", (digits, limit)).fetchall()
+            if rows or len(digits) == 10:
+                return rows
+            # Part of a health card number, as searched when the full number was not found.
+            return connection.execute(f"SELECT * FROM demographics WHERE instr(hin, ?) > 0 AND {active} ORDER BY last_name, first_name LIMIT ?", (digits, limit)).fetchall()
+
+        if type_of_query == 'search_dob':
+            return connection.execute(f"SELECT * FROM demographics WHERE dob = ? AND {active} ORDER BY last_name, first_name LIMIT ?", (keyword, limit)).fetchall()
+
+        if type_of_query == 'search_name':
+            parts = [part.strip('% ').lower() for part in keyword.split(',')]
+            last_name, first_name = (parts + [''])[:2]
+            if not last_name:
+                return []
+            # Last name fragments are matched as a token prefix, through the token index.
+            return connection.execute(
+                f"SELECT DISTINCT d.* FROM name_tokens t JOIN demographics d ON d.demographic_no = t.demographic_no "
+                f"WHERE t.part = 'last_name' AND t.token >= ? AND t.token < ? AND instr(lower(d.first_name), ?) > 0 AND {active} "
+                f"ORDER BY d.last_name, d.first_name LIMIT ?",
+                (last_name, last_name + '\uffff', first_name, limit)
+            ).fetchall()
+
+        return []
+
+
+class DemographicIndexManager:
+    """
+    Synchronizes the local demographic index from the EMR with a Report by Template query.
+
+    Like `ProviderListManager`, the report template (`demographic_index.template_file`) is uploaded to the
+    EMR if it does not exist yet, then run with the time of the last sync, so only demographics updated
+    since then are fetched.
+
+    Attributes:
+        config (ConfigManager): The configuration settings.
+        base_url (str): The base URL of the EMR system.
+        logger (logging.Logger): A logger instance to log information and errors.
+        emr_client (EMRClient): The EMR client of the logged-in session.
+    """
+    def __init__(self, workflow):
+        """
+        Initializes the DemographicIndexManager with the workflow configuration and EMR client.
+
+        Args:
+            workflow (object): The workflow object that contains configuration data and logger instance.
+        """
+        self.config = workflow.config
+        self.base_url = workflow.config.get('emr.base_url')
+        self.logger = workflow.logger
+        self.headers = dict(workflow.headers)
+        self.emr_client = workflow.emr_client
+
+    def upload_template_file(self) -> bool:
+        """
+        Uploads the demographic index template file to the EMR system.
+
+        Returns:
+            bool: `True` if the file was uploaded successfully, otherwise `False`.
+        """
+        url = f"{self.base_url}/oscarReport/reportByTemplate/uploadTemplates.do"
+        template_file = self.config.get('demographic_index.template_file', 'template_demographics.txt')
+        try:
+            with open(template_file, 'rb') as file:
+                files = {'templateFile': (template_file, file, 'text/plain')}
+                response = self.emr_client.post(url, files=files, data={'action': 'add'}, headers=dict(self.headers, Referer=url), count_latency=False)
+                if response.status_code == 200:
+                    self.logger.info("Demographic index template uploaded successfully.")
+                    return True
+        except FileNotFoundError:
+            self.logger.error(f"Template file not found: {template_file}")
+        except requests.RequestException as e:
+            self.logger.error(f"Error uploading template file: {e}")
+        return False
+
+    def find_template_id(self) -> Optional[str]:
+        """
+        Finds the id of the demographic index template, uploading the template if it does not exist.
+
+        Returns:
+            Optional[str]: The template id if found, otherwise `None`.
+        """
+        url = f"{self.base_url}/oscarReport/reportByTemplate/homePage.jsp?templates=all"
+
+        for attempt in range(2):
+            response = self.emr_client.get(url, headers=dict(self.headers, Referer=url))
+            tbody = BeautifulSoup(response.text, 'html.parser').find('tbody', id='tableData')
+
+            if tbody:
+                for row in tbody.find_all('tr'):
+                    cells = row.find_all('td')
+                    if len(cells) > 3 and cells[1].get_text(strip=True) == TEMPLATE_TITLE:
+                        return cells[3].get('id')
+
+            if attempt == 0 and not self.upload_template_file():
+                break
+
+        return None
+
+    def fetch_demographics(self, template_id: str, since: str) -> Optional[List[Dict[str, str]]]:
+        """
+        Runs the demographic index template and parses its CSV output.
+
+        Args:
+            template_id (str): The template id.
+            since (str): Only demographics updated since this time are returned, 'YYYY-MM-DD HH:MM:SS'.
+
+        Returns:
+            Optional[List[dict]]: The demographics, or `None` if the report failed.
+        """
+        url = f"{self.base_url}/oscarReport/reportByTemplate/GenerateReportAction.do"
+        params = {"templateId": template_id, "since": since, "submitButton": "Run Query"}
+        try:
+            response = self.emr_client.post(url, data=params, headers=dict(self.headers, Referer=url), count_latency=False)
+        except requests.RequestException as e:
+            self.logger.info(f"Error fetching demographic data: {e}")
+            return None
+
+        input_element = BeautifulSoup(response.text, 'html.parser').find('input', {'type': 'hidden', 'name': 'csv'})
+        if not input_element:
+            return None
+
+        records = []
+        for fields in list(csv.reader(io.StringIO(input_element.get('value', ''))))[1:]:  # Skip header row
+            if len(fields) < 11 or not fields[0].strip().isdigit():
+                continue
+            demographic_no, last_name, first_name, year, month, day, hin, provider_no, roster_status, patient_status, last_update = (field.strip() for field in fields[:11])
+            records.append({
+                'demographic_no': demographic_no,
+                'last_name': last_name,
+                'first_name': first_name,
+                'dob': f"{year}-{month.zfill(2)}-{day.zfill(2)}" if year and month and day else '',
+                'hin': re.sub(r'\D', '', hin),
+                'provider_no': provider_no,
+                'roster_status': roster_status,
+                'patient_status': patient_status,
+                'last_update': last_update
+            })
+        return records
+
+    def sync(self, index: DemographicIndex) -> Optional[int]:
+        """
+        Fetches the demographics updated since the last sync (all demographics on the first sync) into the index.
+
+        The previous sync time is moved back by `demographic_index.sync_overlap` minutes, so updates made
+        while the previous sync was running are not missed.
+
+        Args:
+            index (DemographicIndex): The local demographic index.
+
+        Returns:
+            Optional[int]: The number of demographics added or updated, or `None` if the sync failed.
+        """
+        started = datetime.datetime.now()
+        last_sync = index.get_sync_value('last_sync')
+
+        if last_sync:
+            overlap = datetime.timedelta(minutes=self.config.get('demographic_index.sync_overlap', 60))
+            since = (datetime.datetime.strptime(last_sync, '%Y-%m-%d %H:%M:%S') - overlap).strftime('%Y-%m-%d %H:%M:%S')
+        else:
+            since = '1900-01-01 00:00:00'
+
+        template_id = self.find_template_id()
+
+        if not template_id:
+            self.logger.info("Demographic index template id not found.")
+            return None
+
+        records = self.fetch_demographics(template_id, since)
+
+        if records is None:
+            self.logger.info("No demographic data returned by the EMR.")
+            return None
+
+        index.upsert(records, started.strftime('%Y-%m-%d %H:%M:%S'))
+        self.logger.info(f"Demographic index synced, {len(records)} demographics updated since {since}.")
+        return len(records)
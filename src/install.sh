@@ -17,6 +17,7 @@ cp ../config/template_providerlist.txt ../config/template_providerlist.txt.$(dat
 # Copy example configs and Report by Template provider search to config directory
 cp template_providerlist.txt.example ../config/template_providerlist.txt
 cp template_providerlist.txt ../config/
+cp template_demographics.txt ../config/
 cp config.yaml.example ../config/config.yaml
 cp workflow-config.yaml.example ../config/workflow-config.yaml
 
@@ -0,0 +1,231 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import argparse
+import itertools
+import json
+import logging
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+import yaml
+
+logger: logging.Logger = logging.getLogger('llm_broker')
+
+SERVICE_HEADER = 'X-AIMOA-Service'
+
+
+class RequestScheduler:
+    """
+    Admits LLM requests from several AI-MOA services under a global concurrency cap.
+
+    Waiting requests are grouped by service. When a slot is free, the waiting request of the highest
+    priority class (lowest number) is admitted, taking the services of that class in turn (round robin)
+    so one busy service cannot starve another of the same class. A request waiting longer than
+    `aging_seconds` moves up one priority class for every `aging_seconds` waited.
+
+    Attributes:
+        max_concurrency (int): Maximum number of requests sent to the LLM at the same time.
+        priorities (dict): Priority class of each service name.
+        default_priority (int): Priority class of services not listed in `priorities`.
+        aging_seconds (float): Waiting time after which a request moves up one priority class.
+    """
+    def __init__(self, max_concurrency, priorities, default_priority=1, aging_seconds=60):
+        self.max_concurrency = max_concurrency
+        self.priorities = priorities
+        self.default_priority = default_priority
+        self.aging_seconds = aging_seconds
+        self.running = 0
+        self.queues = {}
+        self.turn = itertools.count()
+        self.last_turn = {}
+        self.condition = threading.Condition()
+
+    def _priority(self, service, enqueued_at, now):
+        priority = self.priorities.get(service, self.default_priority)
+        if self.aging_seconds:
+            priority -= int((now - enqueued_at) / self.aging_seconds)
+        return priority
+
+    def _next_ticket(self):
+        now = time.monotonic()
+        waiting = [(self._priority(service, queue[0][1], now), self.last_turn.get(service, -1), service) for service, queue in self.queues.items() if queue]
+        if not waiting:
+            return None
+        service = min(waiting)[2]
+        return self.queues[service][0][0]
+
+    def acquire(self, service, abandoned=None):
+        """
+        Waits until the request of `service` is admitted.
+
+        Returns `False` without taking a slot if `abandoned()` becomes true while waiting, ie. the client
+        has gone, so an abandoned request is never sent to the LLM.
+        """
+        ticket = object()
+        with self.condition:
+            queue = self.queues.setdefault(service, deque())
+            queue.append((ticket, time.monotonic()))
+            while self.running >= self.max_concurrency or self._next_ticket() is not ticket:
+                if abandoned is not None and abandoned():
+                    queue.remove(next(entry for entry in queue if entry[0] is ticket))
+                    self.condition.notify_all()
+                    return False
+                self.condition.wait(1)
+            queue.popleft()
+            self.last_turn[service] = next(self.turn)
+            self.running += 1
+            return True
+
+    def release(self):
+        """
+        Frees the slot of a finished request.
+        """
+        with self.condition:
+            self.running -= 1
+            self.condition.notify_all()
+
+    def status(self):
+        with self.condition:
+            return {"running": self.running, "waiting": {service: len(queue) for service, queue in self.queues.items() if queue}}
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    """
+    Forwards OpenAI-compatible chat completion requests to the LLM server once admitted by the scheduler.
+    """
+    scheduler: RequestScheduler = None
+    upstream: list = []
+    settings: dict = {}
+    lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _reply(self, status, body, content_type='application/json'):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _client_gone(self):
+        """
+        Returns `True` if the client has closed the connection, ie. it timed out while its request was queued.
+        """
+        try:
+            readable, _, _ = select.select([self.connection], [], [], 0)
+            return bool(readable) and not self.connection.recv(1, socket.MSG_PEEK)
+        except (OSError, ValueError):
+            return True
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._reply(200, json.dumps(dict(self.scheduler.status(), status="ok")).encode('utf-8'))
+        else:
+            self._reply(404, b'{"error": "not found"}')
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        service = self.headers.get(SERVICE_HEADER, 'default')
+        start_time = time.monotonic()
+
+        # Other requests (ie. /tokenize) are cheap and forwarded without queuing.
+        if not self.path.endswith('/chat/completions'):
+            origin = '/'.join(self.upstream[0]['uri'].split('/')[:3])
+            try:
+                response = requests.post(origin + self.path, data=body, headers={'Content-Type': 'application/json'}, verify=self.settings.get('verify-HTTPS', False), timeout=self.settings.get('timeout', 300))
+                self._reply(response.status_code, response.content, response.headers.get('Content-Type', 'application/json'))
+            except requests.RequestException as e:
+                self._reply(502, json.dumps({"error": str(e)}).encode('utf-8'))
+            return
+
+        if not self.scheduler.acquire(service, self._client_gone):
+            logger.info(f"{service}: client disconnected after waiting {time.monotonic() - start_time:.2f}s, request dropped.")
+            return
+        waited = time.monotonic() - start_time
+
+        try:
+            # Send to the upstream LLM server with the fewest outstanding requests per weight.
+            with self.lock:
+                endpoint = min(self.upstream, key=lambda e: (e['outstanding'] + 1) / e.get('weight', 1))
+                endpoint['outstanding'] += 1
+            try:
+                response = requests.post(endpoint['uri'], data=body, headers={'Content-Type': 'application/json'}, verify=self.settings.get('verify-HTTPS', False), timeout=self.settings.get('timeout', 300))
+            except requests.RequestException as e:
+                logger.error(f"LLM request failed for {service}: {e}")
+                self._reply(502, json.dumps({"error": str(e)}).encode('utf-8'))
+                return
+            finally:
+                with self.lock:
+                    endpoint['outstanding'] -= 1
+            self._reply(response.status_code, response.content, response.headers.get('Content-Type', 'application/json'))
+            logger.info(f"{service}: waited {waited:.2f}s, LLM {time.monotonic() - start_time - waited:.2f}s, status {response.status_code}.")
+        finally:
+            self.scheduler.release()
+
+
+def args_parse_broker():
+    """
+    Parses command-line arguments for the AI-MOA LLM broker.
+    """
+    parser = argparse.ArgumentParser(description="AI-MOA LLM broker")
+    parser.add_argument("--config", help="Path to the config file with the 'llm_broker' section")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    args = args_parse_broker()
+    config_file = args.config or os.environ.get('AIMOA_CONFIG') or os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "config.yaml")
+
+    with open(config_file, 'r') as file:
+        config = yaml.safe_load(file)
+
+    settings = config.get('llm_broker', {}) or {}
+    logging.basicConfig(level=settings.get('log_level', 'INFO'), format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    upstream = settings.get('upstream') or config.get('ai', {}).get('uri', "https://localhost:3334/v1/chat/completions")
+    upstream = [dict(endpoint, outstanding=0) if isinstance(endpoint, dict) else {'uri': endpoint, 'outstanding': 0} for endpoint in (upstream if isinstance(upstream, list) else [upstream])]
+
+    BrokerHandler.settings = settings
+    BrokerHandler.scheduler = RequestScheduler(
+        settings.get('max_concurrency', 4),
+        settings.get('priorities', {}),
+        settings.get('default_priority', 1),
+        settings.get('aging_seconds', 60)
+    )
+    BrokerHandler.upstream = upstream
+
+    host = settings.get('host', '127.0.0.1')
+    port = settings.get('port', 3340)
+    server = ThreadingHTTPServer((host, port), BrokerHandler)
+    server.daemon_threads = True
+    logger.info(f"AI-MOA LLM broker listening on {host}:{port}, {settings.get('max_concurrency', 4)} concurrent requests to {', '.join(endpoint['uri'] for endpoint in upstream)}.")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("LLM broker stopped.")
@@ -90,6 +90,12 @@ class AIMOAAutomation:
         Perform cleanup operations to release resources properly.
         """
         self.logger.info("Cleaning up resources")
+
+        # Document prefetches use this run's session, finish them before it is closed.
+        try:
+            self.workflow.finish_prefetch(self.workflow)
+        except Exception as e:
+            self.logger.exception(f"An error occurred while finishing document prefetches: {e}")
         
         if hasattr(self.session_manager, 'close'):
             try:
@@ -19,6 +19,9 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
-from .document_category import get_category_types, get_category_type, get_document_description
+from .document_category import get_category_types, get_category_type, get_document_description, get_description_task_dependencies, run_description_task
+from .category_classifier import CategoryClassifier, get_category_classifier, classify_document_category, record_category_sample
+from .category_batch import DocumentContext, get_cached_document, cache_document, get_upcoming_documents, extract_document_text, classify_document, classify_category_batch
+from .sender_template import SenderTemplateIndex, get_sender_template_index, get_sender_signature, match_sender_template, record_sender_template
 
-__all__ = ['get_category_types','get_category_type','get_document_description']
+__all__ = ['get_category_types','get_category_type','get_document_description','get_description_task_dependencies','run_description_task','CategoryClassifier','get_category_classifier','classify_document_category','record_category_sample','DocumentContext','get_cached_document','cache_document','get_upcoming_documents','extract_document_text','classify_document','classify_category_batch','SenderTemplateIndex','get_sender_template_index','get_sender_signature','match_sender_template','record_sender_template']
@@ -0,0 +1,237 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from ..utils.circuit_breaker import LLMUnavailableError
+
+# OCR text and category results of documents classified in a batch window, keyed by document content hash.
+# Kept for the lifetime of the process, so they are found when the documents come up in later workflow runs.
+_batch_cache = OrderedDict()
+_batch_cache_lock = threading.Lock()
+
+
+class DocumentConfig:
+    """
+    Configuration view of one document in a batch window, with its own shared state.
+
+    Shared state reads and writes go to the document; everything else is delegated to the workflow configuration.
+    """
+    def __init__(self, config, shared_state):
+        self._config = config
+        self._shared_state = shared_state
+
+    def get_shared_state(self, key, default=None):
+        return self._shared_state.get(key, default)
+
+    def set_shared_state(self, key, value):
+        self._shared_state[key] = value
+
+    def update_lock_status(self, status):
+        # The workflow lock is released by the workflow run, once every document of the batch has finished.
+        pass
+
+    def __getattr__(self, name):
+        return getattr(self._config, name)
+
+
+class DocumentContext:
+    """
+    Per-document view of the workflow, used to run workflow steps for another document of the batch window.
+
+    The document has its own `file_name`, `ocr_text` and shared state; all other attributes and steps are
+    taken from the workflow.
+    """
+    def __init__(self, workflow, file_name, content):
+        self._workflow = workflow
+        self.config = DocumentConfig(workflow.config, {'current_file': content})
+        self.file_name = file_name
+        self.ocr_text = None
+
+    def __getattr__(self, name):
+        return getattr(self._workflow, name)
+
+
+def document_key(content):
+    """
+    Returns the content hash used to find a document in the batch cache.
+    """
+    return hashlib.sha256(content).hexdigest() if content else None
+
+
+def get_cached_document(self, content=None):
+    """
+    Returns the batch cache entry of the current document (or of `content`), or `None`.
+    """
+    key = document_key(content if content is not None else self.config.get_shared_state('current_file'))
+    with _batch_cache_lock:
+        return _batch_cache.get(key) if key else None
+
+
+def cache_document(self, content, **values):
+    """
+    Stores values for a document in the batch cache, keeping the most recent `category_batch.cache_size` documents.
+    """
+    key = document_key(content)
+    if not key:
+        return
+    with _batch_cache_lock:
+        _batch_cache.setdefault(key, {}).update(values)
+        _batch_cache.move_to_end(key)
+        while len(_batch_cache) > self.config.get('category_batch.cache_size', 100):
+            _batch_cache.popitem(last=False)
+
+
+def get_upcoming_documents(self):
+    """
+    Fetches the documents that follow the current document in the inbox or input directory.
+
+    The document fetch steps store the next `category_batch.window` documents in the `upcoming_documents`
+    shared state, each with a `url` (EMR) or `path` (local input directory). EMR documents already in the
+    prefetch spool are read from it instead of being downloaded again.
+
+    Returns:
+        list: `(name, content)` tuples of the upcoming documents that could be fetched.
+    """
+    documents = []
+
+    for document in self.config.get_shared_state('upcoming_documents') or []:
+        try:
+            if 'path' in document:
+                with open(document['path'], 'rb') as file:
+                    content = file.read()
+            else:
+                content = self.get_spooled_document(self, document['url'])
+                if content is None:
+                    response = self.emr_client.get(document['url'], headers=dict(self.headers, Referer=document['url']), count_latency=False)
+                    if response.status_code != 200 or not response.content:
+                        continue
+                    content = response.content
+        except Exception as e:
+            self.logger.info(f"Could not fetch upcoming document {document['name']} for the category batch: {e}")
+            continue
+        documents.append((document['name'], content))
+
+    return documents
+
+
+def extract_document_text(self):
+    """
+    Extracts and compacts the text of a batch window document, with the same OCR steps as the workflow.
+    """
+    if self.has_ocr(self):
+        extracted = self.extract_text_from_pdf_file(self)
+    else:
+        extracted = getattr(self, self.config.get('category_batch.ocr_step', 'extract_text_doctr'))(self)
+
+    if extracted and self.ocr_text:
+        self.compact_ocr_text(self)
+        return True
+    return False
+
+
+def classify_document(self):
+    """
+    Runs the category prompts for a batch window document, as `get_category_types` and `get_category_type` would.
+
+    An `LLMUnavailableError` is returned instead of raised, so the failure of one document does not stop the
+    other documents of the batch.
+    """
+    try:
+        types_result = self.get_category_types(self)
+        if not types_result:
+            return None
+        self.config.set_shared_state('get_category_types', types_result)
+        return types_result, self.get_category_type(self)
+    except LLMUnavailableError as e:
+        return e
+
+
+def classify_category_batch(self):
+    """
+    Classifies the category of the current document together with a window of upcoming documents.
+
+    During backlog processing, the upcoming documents (`category_batch.window`) are fetched and OCR'd, then
+    the `get_category_types` and `get_category_type` prompts of all documents in the window are sent as
+    concurrent requests (`category_batch.concurrency`, matched to the LLM server parallel slots). The OCR text
+    and category results are cached by document content, so when an upcoming document is processed its OCR
+    and category prompts are not repeated. The per-document prompts and logic are unchanged.
+
+    An upcoming document whose prompts fail because the LLM is unavailable is left uncached and classified
+    again when it comes up; only a failure of the current document is raised, once the batch has finished.
+
+    Returns:
+        tuple: `True, category` if the category of the current document was found in the batch.
+        bool: `False` if batching is disabled or failed, so the regular category steps are used.
+
+    Example:
+        >>> result = manager.classify_category_batch()
+        >>> print(result)
+        (True, 'Lab')
+    """
+    if not self.config.get('category_batch.enabled', False):
+        return False
+
+    content = self.config.get_shared_state('current_file')
+    cached = self.get_cached_document(self, content)
+
+    if cached is None or 'get_category_type' not in cached:
+        current = DocumentContext(self, self.file_name, content)
+        current.ocr_text = self.ocr_text
+        contexts = [current]
+        for name, upcoming in self.get_upcoming_documents(self):
+            upcoming_cache = self.get_cached_document(self, upcoming)
+            if upcoming_cache and 'get_category_type' in upcoming_cache:
+                continue
+            context = DocumentContext(self, name, upcoming)
+            if upcoming_cache and upcoming_cache.get('ocr_text'):
+                context.ocr_text = upcoming_cache['ocr_text']
+            elif not self.extract_document_text(context):
+                continue
+            contexts.append(context)
+
+        self.logger.info(f"Classifying a batch of {len(contexts)} documents with {self.config.get('category_batch.concurrency', 4)} concurrent requests.")
+
+        with ThreadPoolExecutor(max_workers=self.config.get('category_batch.concurrency', 4)) as executor:
+            results = list(executor.map(lambda context: self.classify_document(context), contexts))
+
+        for context, result in zip(contexts, results):
+            if isinstance(result, LLMUnavailableError):
+                self.logger.info(f"LLM unavailable for document {context.file_name} of the category batch, it is not cached.")
+                continue
+            values = {'ocr_text': context.ocr_text}
+            if result is not None:
+                values['get_category_types'], values['get_category_type'] = result
+            self.cache_document(self, context.config.get_shared_state('current_file'), **values)
+
+        if isinstance(results[0], LLMUnavailableError):
+            raise results[0]
+
+        cached = self.get_cached_document(self, content)
+
+    if not cached or 'get_category_type' not in cached:
+        return False
+
+    self.config.set_shared_state('get_category_types', cached['get_category_types'])
+    self.config.set_shared_state('get_category_type', cached['get_category_type'])
+    return cached['get_category_type']
@@ -0,0 +1,341 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import os
+import re
+import json
+import zlib
+import threading
+import datetime
+import numpy as np
+from typing import Dict, List, Optional, Tuple
+
+# Loaded models are kept for the lifetime of the process, keyed by model file path and modification time.
+_model_cache: Dict[str, Tuple[float, 'CategoryClassifier']] = {}
+_model_cache_lock = threading.Lock()
+_corpus_lock = threading.Lock()
+
+
+class CategoryClassifier:
+    """
+    Local document category classifier trained from previously tagged documents.
+
+    Documents are represented as hashed character n-gram TF-IDF vectors and classified by the nearest
+    category centroid (cosine similarity). Scores are turned into a confidence with a softmax whose
+    temperature is calibrated on held-out documents during training.
+
+    Attributes:
+        n_features (int): Size of the hashed feature space.
+        ngram_range (tuple): Minimum and maximum character n-gram length.
+        max_chars (int): Number of leading characters of the document text that are used.
+        categories (List[str]): The category names, in centroid order.
+        idf (np.ndarray): Inverse document frequency for each hashed feature.
+        centroids (np.ndarray): L2-normalized category centroids, shape (categories, n_features).
+        temperature (float): Softmax temperature applied to the cosine similarities.
+    """
+    def __init__(self, n_features: int = 2 ** 17, ngram_range: Tuple[int, int] = (3, 5), max_chars: int = 6000):
+        """
+        Initializes an untrained classifier.
+
+        Args:
+            n_features (int): Size of the hashed feature space. Defaults to 2**17.
+            ngram_range (tuple): Minimum and maximum character n-gram length. Defaults to (3, 5).
+            max_chars (int): Number of leading characters of the document text that are used. Defaults to 6000.
+        """
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.max_chars = max_chars
+        self.categories: List[str] = []
+        self.idf: Optional[np.ndarray] = None
+        self.centroids: Optional[np.ndarray] = None
+        self.temperature = 20.0
+
+    def _features(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Hashes the character n-grams of a text into feature indices and sublinear term frequencies.
+        """
+        text = re.sub(r'\d', '', (text or '')[:self.max_chars].lower())
+        text = re.sub(r'\s+', ' ', text)
+        counts: Dict[int, int] = {}
+        low, high = self.ngram_range
+
+        for word in text.split(' '):
+            if not word:
+                continue
+            word = f" {word} "
+            for n in range(low, high + 1):
+                for start in range(0, len(word) - n + 1):
+                    index = zlib.crc32(word[start:start + n].encode('utf-8')) % self.n_features
+                    counts[index] = counts.get(index, 0) + 1
+
+        if not counts:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+
+        indices = np.fromiter(counts.keys(), dtype=np.int64, count=len(counts))
+        values = 1.0 + np.log(np.fromiter(counts.values(), dtype=np.float32, count=len(counts)))
+        return indices, values
+
+    def _vector(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns the L2-normalized TF-IDF vector of a text in sparse (indices, values) form.
+        """
+        indices, values = self._features(text)
+        if self.idf is not None and len(indices):
+            values = values * self.idf[indices]
+        norm = np.linalg.norm(values)
+        return indices, (values / norm if norm else values)
+
+    def fit(self, texts: List[str], labels: List[str]) -> 'CategoryClassifier':
+        """
+        Trains the classifier from document texts and their category labels.
+
+        Args:
+            texts (List[str]): The OCR text of each document.
+            labels (List[str]): The category of each document.
+
+        Returns:
+            CategoryClassifier: The trained classifier.
+        """
+        features = [self._features(text) for text in texts]
+
+        document_frequency = np.zeros(self.n_features, dtype=np.float32)
+        for indices, _ in features:
+            document_frequency[indices] += 1
+        self.idf = (np.log((1 + len(texts)) / (1 + document_frequency)) + 1).astype(np.float32)
+
+        self.categories = sorted(set(labels))
+        category_index = {name: index for index, name in enumerate(self.categories)}
+        self.centroids = np.zeros((len(self.categories), self.n_features), dtype=np.float32)
+
+        for (indices, values), label in zip(features, labels):
+            values = values * self.idf[indices]
+            norm = np.linalg.norm(values)
+            if norm:
+                self.centroids[category_index[label], indices] += values / norm
+
+        norms = np.linalg.norm(self.centroids, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        self.centroids /= norms
+        return self
+
+    def scores(self, text: str) -> np.ndarray:
+        """
+        Returns the cosine similarity of a text to each category centroid.
+        """
+        indices, values = self._vector(text)
+        if not len(indices):
+            return np.zeros(len(self.categories), dtype=np.float32)
+        return self.centroids[:, indices] @ values
+
+    def probabilities(self, similarities: np.ndarray, temperature: Optional[float] = None) -> np.ndarray:
+        """
+        Converts centroid similarities into per-category confidences with a temperature softmax.
+        """
+        logits = similarities * (temperature or self.temperature)
+        logits = logits - logits.max()
+        weights = np.exp(logits)
+        return weights / weights.sum()
+
+    def calibrate(self, texts: List[str], labels: List[str], temperatures=(5, 10, 20, 40, 80, 160)) -> float:
+        """
+        Selects the softmax temperature with the lowest log loss on held-out documents.
+
+        Args:
+            texts (List[str]): Held-out document texts.
+            labels (List[str]): Held-out document categories.
+            temperatures (tuple): Candidate temperatures.
+
+        Returns:
+            float: The selected temperature.
+        """
+        similarities = [self.scores(text) for text, label in zip(texts, labels) if label in self.categories]
+        targets = [self.categories.index(label) for label in labels if label in self.categories]
+        if not targets:
+            return self.temperature
+
+        def log_loss(temperature):
+            return -sum(np.log(self.probabilities(s, temperature)[t] + 1e-12) for s, t in zip(similarities, targets))
+
+        self.temperature = float(min(temperatures, key=log_loss))
+        return self.temperature
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        Predicts the category of a document.
+
+        Args:
+            text (str): The OCR text of the document.
+
+        Returns:
+            tuple: The predicted category name and its confidence (0 to 1).
+        """
+        probabilities = self.probabilities(self.scores(text))
+        best = int(np.argmax(probabilities))
+        return self.categories[best], float(probabilities[best])
+
+    def save(self, file_path: str) -> None:
+        """
+        Saves the trained classifier to a compressed NumPy (.npz) file.
+
+        Args:
+            file_path (str): The output file path.
+        """
+        np.savez_compressed(
+            file_path,
+            categories=np.array(self.categories),
+            idf=self.idf,
+            centroids=self.centroids,
+            params=np.array([self.n_features, self.ngram_range[0], self.ngram_range[1], self.max_chars], dtype=np.int64),
+            temperature=np.array([self.temperature], dtype=np.float32)
+        )
+
+    @classmethod
+    def load(cls, file_path: str) -> 'CategoryClassifier':
+        """
+        Loads a classifier saved with `save`.
+
+        Args:
+            file_path (str): The model file path.
+
+        Returns:
+            CategoryClassifier: The loaded classifier.
+        """
+        with np.load(file_path) as data:
+            n_features, low, high, max_chars = (int(value) for value in data['params'])
+            classifier = cls(n_features, (low, high), max_chars)
+            classifier.categories = [str(name) for name in data['categories']]
+            classifier.idf = data['idf']
+            classifier.centroids = data['centroids']
+            classifier.temperature = float(data['temperature'][0])
+        return classifier
+
+
+def get_category_classifier(self):
+    """
+    Returns the trained category classifier set in `category_classifier.model_file`.
+
+    The model is loaded once per process and reloaded when the model file changes.
+
+    Returns:
+        CategoryClassifier or None: The classifier, or `None` if no model file is available.
+    """
+    model_file = self.config.get('category_classifier.model_file', '../config/category_classifier.npz')
+
+    try:
+        modified = os.path.getmtime(model_file)
+    except OSError:
+        self.logger.info(f"Category classifier model file {model_file} not found.")
+        return None
+
+    with _model_cache_lock:
+        cached = _model_cache.get(model_file)
+        if cached is None or cached[0] != modified:
+            self.logger.info(f"Loading category classifier model from {model_file}.")
+            cached = (modified, CategoryClassifier.load(model_file))
+            _model_cache[model_file] = cached
+
+    return cached[1]
+
+
+def classify_document_category(self):
+    """
+    Classifies the document category with the local classifier, without querying the AI model.
+
+    The classifier returns a category and confidence from the OCR text in milliseconds. If the confidence
+    reaches `category_classifier.threshold`, the category is stored as the `get_category_type` result
+    so the workflow can skip `get_category_types` and `get_category_type`; otherwise the LLM steps are used.
+
+    Returns:
+        tuple: `True, category` if the classifier is confident about a configured document category.
+        bool: `False` if the classifier is disabled, unavailable, or below the confidence threshold.
+
+    Example:
+        >>> result = manager.classify_document_category()
+        >>> print(result)
+        (True, 'Lab')
+    """
+    if not self.config.get('category_classifier.enabled', False):
+        return False
+
+    classifier = self.get_category_classifier(self)
+
+    if classifier is None:
+        return False
+
+    start_time = datetime.datetime.now()
+    category, confidence = classifier.predict(self.ocr_text)
+    duration = (datetime.datetime.now() - start_time).total_seconds() * 1000
+    threshold = self.config.get('category_classifier.threshold', 0.9)
+
+    self.logger.info(f"Category classifier predicted '{category}' with confidence {confidence:.2f} in {duration:.1f} ms.")
+
+    if confidence < threshold:
+        self.logger.info(f"Category classifier confidence below threshold ({threshold}), using LLM category prompts.")
+        return False
+
+    for item in self.document_categories:
+        if item['name'].strip().lower() == category.strip().lower():
+            self.config.set_shared_state('get_category_type', (True, item['name']))
+            return True, item['name']
+
+    self.logger.info(f"Category classifier predicted an unknown category '{category}', using LLM category prompts.")
+    return False
+
+
+def record_category_sample(self):
+    """
+    Appends the processed document text and its LLM category to the category classifier corpus.
+
+    The corpus (`category_classifier.corpus_file`, JSON lines) is the processing history used to train the
+    classifier with `train_category_classifier.py`. Only documents categorized by the LLM prompts are
+    recorded, so the classifier does not learn from its own predictions. Recording is off unless
+    `corpus_file` is set, and stops once the file reaches `category_classifier.corpus_max_mb`.
+
+    Returns:
+        bool: `True` if the sample was recorded, `False` otherwise.
+    """
+    corpus_file = self.config.get('category_classifier.corpus_file')
+    category = self.config.get_shared_state('get_category_type')
+
+    if not corpus_file or not self.ocr_text or category is None or self.config.get_shared_state('get_category_types') is None:
+        return False
+
+    max_bytes = self.config.get('category_classifier.corpus_max_mb', 100) * 1024 * 1024
+    if os.path.exists(corpus_file) and os.path.getsize(corpus_file) >= max_bytes:
+        self.logger.warning(f"Category corpus {corpus_file} reached its size limit, the sample was not recorded.")
+        return False
+
+    record = {
+        "document": str(self.file_name),
+        "date": str(datetime.datetime.now().date()),
+        "category": category[1],
+        "text": self.ocr_text
+    }
+
+    try:
+        with _corpus_lock:
+            with open(corpus_file, 'a', encoding='utf-8') as file:
+                file.write(json.dumps(record) + '\n')
+    except IOError as e:
+        self.logger.error(f"Error saving category corpus sample: {e}")
+        return False
+
+    return True
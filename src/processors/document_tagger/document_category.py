@@ -19,6 +19,15 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+# Outputs of description tasks, keyed by task prompt hash and input hash, kept for the lifetime of the process.
+_description_cache = OrderedDict()
+_description_cache_lock = threading.Lock()
+
 def get_category_types(self):
     """
     Retrieves the category types by querying an AI model with a predefined prompt.
@@ -35,8 +44,8 @@ def get_category_types(self):
         >>> result, response = manager.get_category_types()
         >>> print(result, response)
     """
-    prompt = f"\n{self.ocr_text}.\n" + self.ai_prompts.get('category_types_prompt', '')
-    return self.query_prompt(self,prompt)
+    prompt = f"\n{self.get_prompt_text(self, 'category_types_prompt')}.\n" + self.ai_prompts.get('category_types_prompt', '')
+    return self.query_prompt(self,prompt,'category_types_prompt')
 
 def get_category_type(self):
     """
@@ -58,7 +67,7 @@ def get_category_type(self):
         >>> print(result, category)
     """
     prompt = f"EMR Document content : {self.config.get_shared_state('get_category_types')[1]}.\n" + self.ai_prompts.get('category_type_prompt', '')
-    text = self.query_prompt(self,prompt)[1]
+    text = self.query_prompt(self,prompt,'category_type_prompt')[1]
     if '.' in text:
         text = text.replace('.', '')
 
@@ -86,13 +95,92 @@ def get_category_type(self):
     return True, self.default_values.get('default_category', '').lower()
 
 
+def get_description_task_dependencies(self, tasks):
+    """
+    Returns the names of the tasks each description task of a category depends on.
+
+    A task can list the tasks whose output it uses in `depends_on`. Tasks without `depends_on` depend on
+    the previous task of the list, as in a chain; `depends_on: []` makes a task use only the document.
+
+    Args:
+        tasks (list): The `tasks` of a document category.
+
+    Returns:
+        dict: The task names each task depends on, or `None` if a dependency is unknown or circular.
+    """
+    dependencies = {}
+    previous = None
+
+    for task in tasks:
+        depends_on = task.get('depends_on', [previous] if previous else [])
+        if isinstance(depends_on, str):
+            depends_on = [depends_on]
+        dependencies[task['name']] = list(depends_on)
+        previous = task['name']
+
+    for name, depends_on in dependencies.items():
+        unknown = [dependency for dependency in depends_on if dependency not in dependencies]
+        if unknown:
+            self.logger.error(f"Description task {name} depends on unknown task(s): {', '.join(unknown)}.")
+            return None
+
+    done = set()
+    while len(done) < len(dependencies):
+        ready = [name for name, depends_on in dependencies.items() if name not in done and set(depends_on) <= done]
+        if not ready:
+            self.logger.error(f"Description tasks have circular dependencies: {', '.join(name for name in dependencies if name not in done)}.")
+            return None
+        done.update(ready)
+
+    return dependencies
+
+
+def run_description_task(self, task, prompt):
+    """
+    Queries the AI model for one description task, reusing the cached output for an identical input.
+
+    Outputs are cached per process by the hash of the task prompt and the hash of its input (the document
+    text or the outputs of the tasks it depends on), bounded by `document_description.cache_size`. The task
+    is queried with the prompt key `document_description.<task>`, so `ai_prompt_tiers` and
+    `ai_prompt_schemas` can target it, and its LLM usage is recorded per task.
+
+    Args:
+        task (dict): The description task.
+        prompt (str): The input of the task, without the task prompt.
+
+    Returns:
+        str or None: The output of the task, or `None` if the query failed.
+    """
+    key = (hashlib.sha256(task['prompt'].encode('utf-8')).hexdigest(), hashlib.sha256(prompt.encode('utf-8')).hexdigest())
+
+    with _description_cache_lock:
+        if key in _description_cache:
+            _description_cache.move_to_end(key)
+            self.logger.info(f"Reusing cached output of description task {task['name']}.")
+            return _description_cache[key]
+
+    result = self.query_prompt(self, prompt + task['prompt'], f"document_description.{task['name']}")
+
+    if not result:
+        return None
+
+    with _description_cache_lock:
+        _description_cache[key] = result[1]
+        while len(_description_cache) > self.config.get('document_description.cache_size', 256):
+            _description_cache.popitem(last=False)
+
+    return result[1]
+
+
 def get_document_description(self):
     """
     Retrieves the document description for a given category based on its tasks.
 
-    This method retrieves the category name from the shared state and then iterates over the document categories.
-    For the matching category, it queries an AI model for each task's description and updates the shared state
-    with the response.
+    This method retrieves the category name from the shared state and then runs the tasks of the matching
+    document category. Each task receives the document, or the outputs of the tasks listed in its `depends_on`
+    (by default the previous task, as a chain). Tasks whose dependencies are done run concurrently, up to
+    `document_description.concurrency` requests at once. Each task output is stored in the shared state as
+    `get_document_description_<task>`, and the output of the last task is the description.
 
     Returns:
         tuple: A tuple containing:
@@ -108,12 +196,30 @@ def get_document_description(self):
     # Iterate over document categories
     for item in self.document_categories:
         if isinstance(item, dict) and item.get('name').strip().lower() == category_name.strip().lower():
-            previous_response = f"\n{self.ocr_text}.\n"
-            for task in item['tasks']:
-                prompt = previous_response + task['prompt']
-                previous_response = self.query_prompt(self,prompt)[1]
-                name = 'get_document_description_' + task['name']
-                self.config.set_shared_state(name, previous_response)
+            document_prompt = f"\n{self.get_prompt_text(self, 'document_description')}.\n"
+            tasks = {task['name']: task for task in item['tasks']}
+            dependencies = self.get_description_task_dependencies(self, item['tasks'])
+
+            if dependencies is None:
+                return False
+
+            outputs = {}
+
+            with ThreadPoolExecutor(max_workers=self.config.get('document_description.concurrency', 4)) as executor:
+                while len(outputs) < len(tasks):
+                    ready = [name for name, depends_on in dependencies.items() if name not in outputs and all(dependency in outputs for dependency in depends_on)]
+                    prompts = ['\n'.join(outputs[dependency] for dependency in dependencies[name]) if dependencies[name] else document_prompt for name in ready]
+
+                    if len(ready) > 1:
+                        self.logger.info(f"Running description tasks {', '.join(ready)} concurrently.")
+
+                    for name, response in zip(ready, executor.map(lambda name, prompt: self.run_description_task(self, tasks[name], prompt), ready, prompts)):
+                        if response is None:
+                            return False
+                        outputs[name] = response
+                        self.config.set_shared_state('get_document_description_' + name, response)
+
+            previous_response = outputs[item['tasks'][-1]['name']]
 
             # Check if there is more than one line
             if previous_response.count('\n') > 0:
@@ -0,0 +1,292 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import os
+import re
+import json
+import zlib
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Union
+
+NUM_HASHES = 64
+BAND_ROWS = 4
+MERSENNE_PRIME = (1 << 61) - 1
+
+# Fixed MinHash permutations (a * x + b mod p), so fingerprints stay comparable across restarts.
+_PERMUTATIONS = [
+    ((zlib.crc32(f"a{i}".encode()) << 16 | 1) % MERSENNE_PRIME, (zlib.crc32(f"b{i}".encode()) << 16) % MERSENNE_PRIME)
+    for i in range(NUM_HASHES)
+]
+
+# Loaded indexes are kept for the lifetime of the process, keyed by index file path.
+_index_cache: Dict[str, Tuple[float, 'SenderTemplateIndex']] = {}
+_index_lock = threading.Lock()
+
+
+def header_shingles(text: str, header_lines: int = 15, shingle_size: int = 3) -> set:
+    """
+    Returns the word shingles of the normalized header (first non-empty lines) of a document.
+
+    Digits are replaced with '0' so dates, page numbers and patient identifiers in the header do not
+    change the fingerprint of the sender layout.
+    """
+    lines = []
+    for line in (text or '').splitlines():
+        line = re.sub(r'\d', '0', line.lower())
+        line = re.sub(r'[^a-z0\s]', ' ', line)
+        line = re.sub(r'\s+', ' ', line).strip()
+        if len(line) > 2:
+            lines.append(line)
+        if len(lines) >= header_lines:
+            break
+
+    words = ' '.join(lines).split(' ')
+    if len(words) < shingle_size:
+        return {' '.join(words)} if words[0] else set()
+    return {' '.join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)}
+
+
+def minhash(shingles: set) -> List[int]:
+    """
+    Returns the MinHash signature of a set of shingles.
+    """
+    hashes = [zlib.crc32(shingle.encode('utf-8')) for shingle in shingles]
+    return [min((a * h + b) % MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def _bands(signature: List[int]) -> List[str]:
+    return [f"{i}:" + ','.join(str(value) for value in signature[i:i + BAND_ROWS]) for i in range(0, NUM_HASHES, BAND_ROWS)]
+
+
+class SenderTemplateIndex:
+    """
+    Index of recurring sender layouts, mapping header fingerprints to the tagging decisions learned for them.
+
+    Each template keeps the MinHash signature of the header and the counts of the categories, descriptions
+    and providers assigned to documents with that header. Candidates are found through LSH bands and
+    compared by the estimated Jaccard similarity of their signatures.
+
+    Attributes:
+        file_path (str): The JSON file the index is stored in.
+        templates (List[dict]): The sender templates.
+    """
+    def __init__(self, file_path: str):
+        self.file_path = file_path
+        self.templates: List[dict] = []
+        self.buckets: Dict[str, List[int]] = {}
+
+        if os.path.exists(file_path):
+            with open(file_path, 'r', encoding='utf-8') as file:
+                self.templates = json.load(file).get('templates', [])
+
+        for index, template in enumerate(self.templates):
+            self._add_buckets(index, template['signature'])
+
+    def _add_buckets(self, index: int, signature: List[int]) -> None:
+        for band in _bands(signature):
+            self.buckets.setdefault(band, []).append(index)
+
+    def find(self, signature: List[int], similarity: float) -> Optional[Tuple[int, float]]:
+        """
+        Returns the index and estimated similarity of the closest template at or above `similarity`.
+        """
+        best = None
+        candidates = {index for band in _bands(signature) for index in self.buckets.get(band, [])}
+        for index in candidates:
+            template = self.templates[index]['signature']
+            score = sum(1 for x, y in zip(signature, template) if x == y) / NUM_HASHES
+            if score >= similarity and (best is None or score > best[1]):
+                best = (index, score)
+        return best
+
+    def record(self, signature: List[int], similarity: float, category: str, description: str, provider: Optional[Union[int, str]]) -> None:
+        """
+        Adds the tagging decisions of a processed document to its template, creating the template if needed.
+
+        Votes are keyed by the value as a string, as the keys are after the index is saved and reloaded.
+        """
+        match = self.find(signature, similarity)
+        if match is None:
+            self.templates.append({"signature": signature, "documents": 0, "categories": {}, "descriptions": {}, "providers": {}})
+            index = len(self.templates) - 1
+            self._add_buckets(index, signature)
+        else:
+            index = match[0]
+
+        template = self.templates[index]
+        template['documents'] += 1
+        for field, value in (('categories', category), ('descriptions', description), ('providers', provider)):
+            if value:
+                template[field][str(value)] = template[field].get(str(value), 0) + 1
+
+    def save(self) -> None:
+        """
+        Writes the index to its JSON file.
+        """
+        temp_path = f"{self.file_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump({"templates": self.templates}, file)
+        os.replace(temp_path, self.file_path)
+
+
+def _agreed_value(votes: Dict[str, int], documents: int, min_support: int, min_agreement: float) -> Optional[str]:
+    """
+    Returns the most common value when it was assigned often and consistently enough to be reused.
+    """
+    if not votes:
+        return None
+    value, count = Counter(votes).most_common(1)[0]
+    if count >= min_support and count / documents >= min_agreement:
+        return value
+    return None
+
+
+def get_sender_template_index(self):
+    """
+    Returns the sender template index set in `sender_template.index_file`, loaded once per process.
+
+    Returns:
+        SenderTemplateIndex: The sender template index.
+    """
+    index_file = self.config.get('sender_template.index_file', '../config/sender_templates.json')
+
+    try:
+        modified = os.path.getmtime(index_file)
+    except OSError:
+        modified = 0
+
+    with _index_lock:
+        cached = _index_cache.get(index_file)
+        if cached is None or cached[0] != modified:
+            cached = (modified, SenderTemplateIndex(index_file))
+            _index_cache[index_file] = cached
+
+    return cached[1]
+
+
+def get_sender_signature(self):
+    """
+    Returns the MinHash signature of the document header, or `None` if the header has no text.
+    """
+    shingles = header_shingles(self.ocr_text, self.config.get('sender_template.header_lines', 15))
+    return minhash(shingles) if shingles else None
+
+
+def match_sender_template(self):
+    """
+    Reuses the tagging decisions learned for a recurring sender layout (fax header) of the document.
+
+    The normalized header of the document is fingerprinted and looked up in the sender template index.
+    When a template matches and its category and description were assigned consistently (at least
+    `sender_template.min_support` documents and `sender_template.min_agreement` of them), they are stored as
+    the `get_category_type` and `get_document_description` results, so the category and description
+    prompts are skipped. The provider is reused as well when it is consistent, otherwise `get_provider_list`
+    is run. When no template matches, the full pipeline is used.
+
+    Returns:
+        tuple: `True, category` if the document matched a sender template.
+        bool: `False` if sender templates are disabled or no template matched.
+
+    Example:
+        >>> result = manager.match_sender_template()
+        >>> print(result)
+        (True, 'Lab')
+    """
+    if not self.config.get('sender_template.enabled', False):
+        return False
+
+    signature = self.get_sender_signature(self)
+
+    if signature is None:
+        return False
+
+    index = self.get_sender_template_index(self)
+    similarity = self.config.get('sender_template.similarity', 0.6)
+    match = index.find(signature, similarity)
+
+    if match is None:
+        self.logger.info(f"No sender template matched the document header.")
+        return False
+
+    template = index.templates[match[0]]
+    min_support = self.config.get('sender_template.min_support', 3)
+    min_agreement = self.config.get('sender_template.min_agreement', 0.9)
+
+    category = _agreed_value(template['categories'], template['documents'], min_support, min_agreement)
+    description = _agreed_value(template['descriptions'], template['documents'], min_support, min_agreement)
+
+    known_categories = {item['name'].strip().lower(): item['name'] for item in self.document_categories}
+
+    if category is None or description is None or category.strip().lower() not in known_categories:
+        self.logger.info(f"Sender template matched (similarity {match[1]:.2f}) but its decisions are not consistent yet.")
+        return False
+
+    category = known_categories[category.strip().lower()]
+    self.logger.info(f"Sender template matched (similarity {match[1]:.2f}, {template['documents']} documents), category '{category}', description '{description}'.")
+
+    self.config.set_shared_state('get_category_type', (True, category))
+    self.config.set_shared_state('get_document_description', (True, description))
+
+    provider = _agreed_value(template['providers'], template['documents'], min_support, min_agreement)
+
+    if provider is not None:
+        # Provider numbers are integers, as returned by get_provider_list.
+        self.config.set_shared_state('get_provider_list', (True, int(provider) if provider.isdigit() else provider))
+    else:
+        self.config.set_shared_state('get_provider_list', self.get_provider_list(self))
+
+    return True, category
+
+
+def record_sender_template(self):
+    """
+    Records the category, description and provider assigned to the processed document under its sender template.
+
+    Only documents tagged by the full pipeline are recorded, so templates learn from the LLM decisions and
+    not from their own reuse.
+
+    Returns:
+        bool: `True` if the document was recorded, `False` otherwise.
+    """
+    if not self.config.get('sender_template.enabled', False) or self.config.get_shared_state('match_sender_template'):
+        return False
+
+    category = self.config.get_shared_state('get_category_type')
+    description = self.config.get_shared_state('get_document_description')
+    provider = self.config.get_shared_state('get_provider_list')
+    signature = self.get_sender_signature(self)
+
+    if signature is None or not category or not description:
+        return False
+
+    index = self.get_sender_template_index(self)
+
+    try:
+        with _index_lock:
+            index.record(signature, self.config.get('sender_template.similarity', 0.6), category[1], description[1].strip(), provider[1] if provider else None)
+            index.save()
+            _index_cache[index.file_path] = (os.path.getmtime(index.file_path), index)
+    except (IOError, OSError) as e:
+        self.logger.error(f"Error saving sender template index: {e}")
+        return False
+
+    return True
@@ -20,6 +20,6 @@
 # ***
 
 from .o19_updater import update_o19, view_output
-from .o19_inbox import check_lock, release_lock, get_document_processor_type, get_o19_documents, get_inbox_pendingdocs_documents, get_inbox_incomingdocs_documents, get_inbox_pendingdocs_documents_opro
+from .o19_inbox import check_lock, release_lock, get_document_processor_type, get_o19_documents, get_inbox_pendingdocs_documents, get_inbox_incomingdocs_documents, get_inbox_pendingdocs_documents_opro, get_inbox_pendingdocs_list, get_inbox_incomingdocs_list
 
-__all__ = ['view_output', 'update_o19', 'check_lock', 'release_lock', 'get_inbox_pendingdocs_documents','get_inbox_incomingdocs_documents', 'get_inbox_pendingdocs_documents_opro']
+__all__ = ['view_output', 'update_o19', 'check_lock', 'release_lock', 'get_inbox_pendingdocs_documents','get_inbox_incomingdocs_documents', 'get_inbox_pendingdocs_documents_opro', 'get_inbox_pendingdocs_list', 'get_inbox_incomingdocs_list']
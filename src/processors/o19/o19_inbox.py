@@ -19,12 +19,18 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
+import re
+import json
 from datetime import datetime, timedelta
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
 from selenium.common.exceptions import TimeoutException, NoSuchElementException
 from bs4 import BeautifulSoup
 
+# The document queues are set in a script of the pending documents page, ie. `var typeDocLab = {"DOC": ["12", "13"], "HL7": []};`.
+TYPE_DOC_LAB_PATTERN = re.compile(r'typeDocLab\s*=\s*(\{.*?\})\s*;', re.DOTALL)
+DOC_LIST_PATTERN = re.compile(r'["\']?DOC["\']?\s*:\s*\[(.*?)\]', re.DOTALL)
+
 def get_document_processor_type(self):
 	"""
     Determines the document processor type based on the configuration.
@@ -119,14 +125,91 @@ def get_o19_documents(self):
 		return self.get_inbox_incomingdocs_documents(self)
 
 
+def get_inbox_pendingdocs_list(self):
+	"""
+    Lists the pending documents with a direct HTTP request, without the browser.
+
+    The pending documents page (`inboxManage.do?method=getDocumentsInQueues`) is fetched with the
+    authenticated EMR session and the document numbers are read from its `typeDocLab` script value.
+
+    Returns:
+        list: The pending document numbers, in queue order.
+        None: If the page could not be fetched or read, in which case Selenium is used.
+
+    Example:
+        >>> manager.get_inbox_pendingdocs_list()
+        ['12', '13']
+    """
+	if self.config.get('emr.system_type', 'o19') == 'openo':
+		url = f"{self.base_url}/documentManager/inboxManage.do?method=getDocumentsInQueues"
+	else:
+		url = f"{self.base_url}/dms/inboxManage.do?method=getDocumentsInQueues"
+
+	try:
+		response = self.emr_client.get(url, headers=dict(self.headers, Referer=url))
+	except Exception as e:
+		self.logger.info(f"Pending documents could not be listed over HTTP: {e}")
+		return None
+
+	match = TYPE_DOC_LAB_PATTERN.search(response.text) if response.status_code == 200 else None
+
+	if match is None:
+		self.logger.info("Pending documents queue not found in the HTTP response, using the browser.")
+		return None
+
+	try:
+		return [str(item) for item in json.loads(match.group(1)).get('DOC', [])]
+	except (json.JSONDecodeError, AttributeError):
+		documents = DOC_LIST_PATTERN.search(match.group(1))
+		return re.findall(r'\d+', documents.group(1)) if documents else []
+
+
+def get_inbox_incomingdocs_list(self, queue, folder):
+	"""
+    Lists the documents of an incoming folder with a direct HTTP request, without the browser.
+
+    The incoming documents page (`incomingDocs.jsp`) is fetched with the authenticated EMR session for the
+    queue and folder that `loadPdf` loads, and the documents are read from its `SelectPdfList` options.
+
+    Args:
+        queue (str): The incoming folder queue number.
+        folder (str): The incoming folder (ie. 'Fax').
+
+    Returns:
+        list: `(file name, label)` tuples of the documents, the label ending with the upload time.
+        None: If the page could not be fetched or has no document list, in which case Selenium is used.
+    """
+	if self.config.get('emr.system_type', 'o19') == 'openo':
+		url = f"{self.base_url}/documentManager/incomingDocs.jsp"
+	else:
+		url = f"{self.base_url}/dms/incomingDocs.jsp"
+
+	try:
+		response = self.emr_client.get(url, params={'queueId': queue, 'pdfDir': folder}, headers=dict(self.headers, Referer=url))
+	except Exception as e:
+		self.logger.info(f"Incoming documents could not be listed over HTTP: {e}")
+		return None
+
+	select_element = BeautifulSoup(response.text, 'html.parser').find('select', id='SelectPdfList') if response.status_code == 200 else None
+
+	if select_element is None:
+		self.logger.info("Incoming documents list not found in the HTTP response, using the browser.")
+		return None
+
+	return [(option.get('value', ''), option.get_text()) for option in select_element.find_all('option')]
+
+
 def get_inbox_pendingdocs_documents(self):
 	"""
     Retrieves documents from the 'pending' folder in the document management system.
 
-    This method uses Selenium WebDriver to access the document management system and 
-    fetches documents that are in the 'pending' state based on the script value `typeDocLab`.
+    This method fetches documents that are in the 'pending' state based on the script value `typeDocLab`.
+    With `emr.http_listing`, the pending documents are listed with a direct HTTP request
+    (`get_inbox_pendingdocs_list`); Selenium WebDriver is used when it is disabled or fails.
     
-    It retrieves the content of the next unprocessed document and updates the shared state with it.
+    It retrieves the content of the next unprocessed document (from the prefetch spool when it was already
+    downloaded, see `fetch_document`) and updates the shared state with it. The documents that follow are
+    then prefetched in the background (`prefetch_documents`) while the current document is processed.
 
     Returns:
         bool: `True` if the document was retrieved successfully, `False` otherwise.
@@ -137,32 +220,36 @@ def get_inbox_pendingdocs_documents(self):
         True  # if pending documents are fetched successfully
     """
 	if self.login_successful:
-		driver = self.driver
 		system_type = self.config.get('emr.system_type', 'o19')
+		documents = self.get_inbox_pendingdocs_list(self) if self.config.get('emr.http_listing', False) else None
 
-		if(system_type == 'openo'):
-			driver.get(f"{self.base_url}/documentManager/inboxManage.do?method=getDocumentsInQueues")
-		else:
-			driver.get(f"{self.base_url}/dms/inboxManage.do?method=getDocumentsInQueues")
-		
-		try:
-			driver.implicitly_wait(115)
-			queuenames_field = driver.find_element(By.ID, "queueNames")
-		except TimeoutException:
-			self.logger.debug("Timeout occurred when loading pending documents.")
-			return False
-		except NoSuchElementException:
-			self.logger.debug("Error occurred when loading pending documents.")
-			return False
+		if documents is None:
+			driver = self.driver
+
+			if(system_type == 'openo'):
+				driver.get(f"{self.base_url}/documentManager/inboxManage.do?method=getDocumentsInQueues")
+			else:
+				driver.get(f"{self.base_url}/dms/inboxManage.do?method=getDocumentsInQueues")
+			
+			try:
+				driver.implicitly_wait(115)
+				queuenames_field = driver.find_element(By.ID, "queueNames")
+			except TimeoutException:
+				self.logger.debug("Timeout occurred when loading pending documents.")
+				return False
+			except NoSuchElementException:
+				self.logger.debug("Error occurred when loading pending documents.")
+				return False
+
+			documents = driver.execute_script("return typeDocLab;")['DOC']
 
-		script_value = driver.execute_script("return typeDocLab;")
 		pending_file = self.config.get('inbox.pending')
 		if pending_file is not None:
 		    last_processed_file = int(pending_file)
 		else:
 		    # Handle the case where the key is not set
 		    last_processed_file = 0
-		for item in script_value['DOC']:
+		for item in documents:
 			if not item:
 				return False
 			item = int(item)
@@ -186,16 +273,19 @@ def get_inbox_pendingdocs_documents(self):
 					file_url = f"{self.base_url}/dms/ManageDocument.do?method=display&doc_no={item}"
 					if(system_type == 'openo'):
 						file_url = f"{self.base_url}/documentManager/ManageDocument.do?method=display&doc_no={item}"
-					self.headers['Referer'] = file_url
-					self.session.headers.update(self.headers)
-					file_response = self.session.get(file_url, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+					content = self.fetch_document(self, file_url)
+
+					# Documents after this one, downloaded in the background and used by the category batch window.
+					following = [{'name': int(doc), 'url': file_url.replace(f"doc_no={item}", f"doc_no={doc}")} for doc in documents if doc and int(doc) > item]
+					self.prefetch_documents(self, following)
+					window = self.config.get('category_batch.window', 0) if self.config.get('category_batch.enabled', False) else 0
+					self.config.set_shared_state('upcoming_documents', following[:window])
 
-					if file_response.status_code == 200 and file_response.content:
-						self.config.set_shared_state('current_file', file_response.content)
+					if content:
+						self.config.set_shared_state('current_file', content)
 						self.logger.info(f"Fetched EMR document from Pending Docs...Processing Document No: {item}.")
 						return True
 					else:
-						self.logger.error(f"An error occurred: {file_response.status_code}")
 						return False
 	return False
 
@@ -204,8 +294,11 @@ def get_inbox_incomingdocs_documents(self):
 	"""
     Retrieves documents from the 'incoming' folder in the document management system.
 
-    This method uses Selenium WebDriver to access the document management system and fetches 
-    documents from the 'incoming' queue. It compares timestamps to ensure the latest document is retrieved.
+    This method fetches documents from the 'incoming' queue. It compares timestamps to ensure the latest
+    document is retrieved. With `emr.http_listing`, the folder is listed with a direct HTTP request
+    (`get_inbox_incomingdocs_list`); Selenium WebDriver is used when it is disabled or fails. As for the
+    pending documents, the document is taken from the prefetch spool when available and the documents
+    that follow are prefetched in the background.
 
     Returns:
         bool: `True` if the document was retrieved successfully, `False` otherwise.
@@ -216,29 +309,31 @@ def get_inbox_incomingdocs_documents(self):
         True  # if incoming documents are fetched successfully
     """
 	if self.login_successful:
-		driver = self.driver
 		queue = self.config.get('emr.incoming_folder_queue')
 		folder = self.config.get('emr.incoming_folder')
 		system_type = self.config.get('emr.system_type', 'o19')
+		options = self.get_inbox_incomingdocs_list(self, queue, folder) if self.config.get('emr.http_listing', False) else None
 
-		if(system_type == 'openo'):
-			driver.get(f"{self.base_url}/documentManager/incomingDocs.jsp")
-		else:
-			driver.get(f"{self.base_url}/dms/incomingDocs.jsp")
+		if options is None:
+			driver = self.driver
+
+			if(system_type == 'openo'):
+				driver.get(f"{self.base_url}/documentManager/incomingDocs.jsp")
+			else:
+				driver.get(f"{self.base_url}/dms/incomingDocs.jsp")
 
-		driver.execute_script(f"loadPdf('{queue}', '{folder}');")
-		driver.implicitly_wait(10)
-		select_element = Select(driver.find_element(By.ID, "SelectPdfList"))
+			driver.execute_script(f"loadPdf('{queue}', '{folder}');")
+			driver.implicitly_wait(10)
+			select_element = Select(driver.find_element(By.ID, "SelectPdfList"))
+			options = [(option.get_attribute('value'), option.get_attribute('text')) for option in select_element.options]
 
 		update_time = self.config.get('inbox.incoming', None)
 
-		for option in select_element.options:
-			
-			item = option.get_attribute('value')
+		for item, text in options:
 
 			if item != "":
 
-				split_string = option.get_attribute('text').split(") ", 1)
+				split_string = text.split(") ", 1)
 
 				if(update_time is None or update_time == ""):
 					# Handle the case where the key is not set
@@ -258,7 +353,7 @@ def get_inbox_incomingdocs_documents(self):
 						self.config.update_incoming_retries(0)  # Reset the retry count in the configuration
 						tag_skipped_files = self.config.get('emr.tag_skipped_files')
 						if tag_skipped_files:
-							self.file_name = option.get_attribute('value')
+							self.file_name = item
 							self.inbox_incoming_lastfile = update_time
 						else:
 							current_file_plus_one_second = current_file + timedelta(seconds=1)
@@ -268,21 +363,25 @@ def get_inbox_incomingdocs_documents(self):
 					else:
 						self.config.update_incoming_retries(current_retries + 1)  # Increment the retry count by 1
 
-						pdf_url = f"{self.base_url}/dms/ManageDocument.do?method=displayIncomingDocs&curPage=1&pdfDir={folder}&queueId={queue}&pdfName={option.get_attribute('value')}"
+						pdf_url = f"{self.base_url}/dms/ManageDocument.do?method=displayIncomingDocs&curPage=1&pdfDir={folder}&queueId={queue}&pdfName={item}"
 						if(system_type == 'openo'):
-							pdf_url = f"{self.base_url}/documentManager/ManageDocument.do?method=displayIncomingDocs&curPage=1&pdfDir={folder}&queueId={queue}&pdfName={option.get_attribute('value')}"
-						self.headers['Referer'] = pdf_url
-						self.session.headers.update(self.headers)
-						file_response = self.session.get(pdf_url, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
-
-						if file_response.status_code == 200  and file_response.content:
-							self.file_name = option.get_attribute('value')
+							pdf_url = f"{self.base_url}/documentManager/ManageDocument.do?method=displayIncomingDocs&curPage=1&pdfDir={folder}&queueId={queue}&pdfName={item}"
+						content = self.fetch_document(self, pdf_url)
+
+						# Documents after this one, downloaded in the background and used by the category batch window.
+						names = [name for name, label in options if name]
+						following = [{'name': name, 'url': pdf_url.replace(f"pdfName={item}", f"pdfName={name}")} for name in names[names.index(item) + 1:]]
+						self.prefetch_documents(self, following)
+						window = self.config.get('category_batch.window', 0) if self.config.get('category_batch.enabled', False) else 0
+						self.config.set_shared_state('upcoming_documents', following[:window])
+
+						if content:
+							self.file_name = item
 							self.inbox_incoming_lastfile = update_time
-							self.config.set_shared_state('current_file', file_response.content)
+							self.config.set_shared_state('current_file', content)
 							self.logger.info(f"Fetched EMR document from Incoming Docs...Processing Document No: {item}.")
 							return True
 						else:
-							self.logger.error(f"An error occurred: {file_response.status_code}")
 							return False
 	return False
 
@@ -314,14 +413,12 @@ def get_inbox_pendingdocs_documents_opro(self):
 	current_retries = self.config.get('file_processing.pending_retries')  # Get current retry count from configuration
 	
 	file_url = f"{self.base_url}/dms/ManageDocument.do?method=display&doc_no={item}"
-	self.headers['Referer'] = file_url
-	self.session.headers.update(self.headers)
-	file_response = self.session.get(file_url, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+	file_response = self.emr_client.get(file_url, headers=dict(self.headers, Referer=file_url), count_latency=False)
 
 	document_details_url = f"{self.base_url}/dms/showDocument.jsp?inWindow=true&segmentID={item}"
 
 	if file_response.status_code == 200 and file_response.content:
-		document_details = self.session.get(document_details_url, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+		document_details = self.emr_client.get(document_details_url, headers=dict(self.headers, Referer=file_url))
 
 		if document_details.status_code == 200:
 			soup = BeautifulSoup(document_details.text, 'html.parser')
@@ -350,6 +447,8 @@ def get_inbox_pendingdocs_documents_opro(self):
 		else:
 			self.config.update_pending_retries(current_retries + 1)
 			self.config.set_shared_state('current_file', file_response.content)
+			window = self.config.get('category_batch.window', 0) if self.config.get('category_batch.enabled', False) else 0
+			self.config.set_shared_state('upcoming_documents', [{'name': doc, 'url': f"{self.base_url}/dms/ManageDocument.do?method=display&doc_no={doc}"} for doc in range(item + 1, item + 1 + window)])
 			self.file_name = item
 			self.logger.info(f"Fetched EMR document from Pending Docs...Processing Document No: {item}.")
 			return True
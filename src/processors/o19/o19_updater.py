@@ -140,9 +140,7 @@ def update_o19_pendingdocs(self):
 	for value in self.provider_number:
 		params["flagproviders"].append(value)
 
-	self.headers['Referer'] = url
-	self.session.headers.update(self.headers)
-	response = self.session.post(url, data=params, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+	response = self.emr_client.post(url, data=params, headers=dict(self.headers, Referer=url))
 
 	if response.status_code == 200:
 		self.logger.info(f"Completed processing document and posted responses to EMR demographic ({self.demographic_number}) for Document No: {self.file_name}")
@@ -208,10 +206,7 @@ def update_o19_incomingdocs(self):
 	for value in self.provider_number:
 		params["flagproviders"].append(value)
 
-	self.headers['Referer'] = url
-	self.session.headers.update(self.headers)
-
-	response = self.session.post(url, data=params, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+	response = self.emr_client.post(url, data=params, headers=dict(self.headers, Referer=url))
 
 	if response.status_code == 200:
 		self.logger.info(f"Completed processing document and posted responses to EMR demographic ({self.demographic_number}) for Document No: {self.file_name}")
@@ -236,6 +231,11 @@ def update_o19_last_processed_file(self):
         >>> print(status)
         True  # if the last processed file was updated
     """
+	self.record_category_sample(self)
+	self.record_sender_template(self)
+	self.complete_deferred_document(self)
+	self.invalidate_patient_search_cache(self, self.demographic_number)
+
 	system_type = self.config.get('emr.document_folder')
 
 	if system_type == 'pending':
@@ -19,6 +19,11 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
-from .patient import remove_mrp_details, compare_demographic_results_llm, verify_demographic_data, compare_name_with_text, decode_json, compare_demographic_results, verify_demographic_number, get_patient_hin, get_patient_dob, get_patient_name, filter_results, get_patient_Html_Common, convert_date, get_patient_Html, unidentified_patients
+from .patient import remove_mrp_details, compare_demographic_results_llm, verify_demographic_data, compare_name_with_text, decode_json, compare_demographic_results, select_demographic_results_llm, verify_demographic_number, get_patient_hin, get_patient_dob, get_patient_name, get_name_search_keywords, search_patient_names, filter_results, get_patient_Html_Common, convert_date, get_patient_Html, get_cached_patient_search, cache_patient_search, invalidate_patient_search_cache, unidentified_patients, get_cached_mrp, cache_mrp_details
+from .identifiers import extract_hin_candidates, extract_dob_candidates, extract_name_candidates, get_unique_identifier
+from .demographic_index import get_demographic_index, sync_demographic_index, search_demographic_index
+from .search_results import DemographicSearchParser, parse_demographic_search, merge_demographic_records
+from .name_matcher import NameMatcher, nysiis, get_name_matcher, rank_name_candidates, select_name_candidate
+from .identification import get_identification_stats, get_identification_key, get_identification_order, record_identification_results, run_identification_path, identify_patient
 
-__all__ = ['remove_mrp_details', 'compare_demographic_results_llm', 'verify_demographic_data', 'compare_name_with_text', 'decode_json', 'compare_demographic_results', 'verify_demographic_number', 'get_patient_hin', 'get_patient_dob', 'get_patient_name', 'get_mrp_details', 'filter_results', 'get_patient_Html_Common', 'convert_date', 'get_patient_Html', 'unidentified_patients']
+__all__ = ['remove_mrp_details', 'compare_demographic_results_llm', 'verify_demographic_data', 'compare_name_with_text', 'decode_json', 'compare_demographic_results', 'select_demographic_results_llm', 'verify_demographic_number', 'get_patient_hin', 'get_patient_dob', 'get_patient_name', 'get_name_search_keywords', 'search_patient_names', 'get_mrp_details', 'filter_results', 'get_patient_Html_Common', 'convert_date', 'get_patient_Html', 'get_cached_patient_search', 'cache_patient_search', 'invalidate_patient_search_cache', 'unidentified_patients', 'get_cached_mrp', 'cache_mrp_details', 'extract_hin_candidates', 'extract_dob_candidates', 'extract_name_candidates', 'get_unique_identifier', 'get_identification_stats', 'get_identification_key', 'get_identification_order', 'record_identification_results', 'run_identification_path', 'identify_patient', 'get_demographic_index', 'sync_demographic_index', 'search_demographic_index', 'DemographicSearchParser', 'parse_demographic_search', 'merge_demographic_records', 'NameMatcher', 'nysiis', 'get_name_matcher', 'rank_name_candidates', 'select_name_candidate']
@@ -0,0 +1,118 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import datetime
+import threading
+from config import DemographicIndex, DemographicIndexManager
+
+# Open indexes are kept for the lifetime of the process, keyed by database file path.
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_demographic_index(self):
+    """
+    Returns the local demographic index set in `demographic_index.index_file`, or `None` if it is disabled.
+
+    Returns:
+        DemographicIndex or None: The local demographic index.
+    """
+    if not self.config.get('demographic_index.enabled', False):
+        return None
+
+    index_file = self.config.get('demographic_index.index_file', '../config/demographic_index.db')
+
+    with _indexes_lock:
+        if index_file not in _indexes:
+            _indexes[index_file] = DemographicIndex(index_file)
+        return _indexes[index_file]
+
+
+def sync_demographic_index(self):
+    """
+    Synchronizes the local demographic index with the EMR, at most every `demographic_index.sync_interval` minutes.
+
+    The first sync fetches all demographics, later syncs only the demographics updated since the previous sync.
+
+    Returns:
+        bool: `True` if the index is up to date, `False` if it is disabled or the sync failed.
+
+    Example:
+        >>> result = manager.sync_demographic_index()
+        >>> print(result)
+        True
+    """
+    index = self.get_demographic_index(self)
+
+    if index is None:
+        return False
+
+    last_sync = index.get_sync_value('last_sync')
+    interval = datetime.timedelta(minutes=self.config.get('demographic_index.sync_interval', 30))
+
+    if last_sync and datetime.datetime.now() - datetime.datetime.strptime(last_sync, '%Y-%m-%d %H:%M:%S') < interval:
+        return True
+
+    self.logger.info("Synchronizing local demographic index with the EMR.")
+
+    return DemographicIndexManager(self).sync(index) is not None
+
+
+def search_demographic_index(self, type_of_query, query):
+    """
+    Searches the local demographic index and returns the results as EMR demographic search records.
+
+    The records have the same fields (`demographicNo`, `formattedName`, `formattedDob`, `providerNo` of the
+    MRP, `rosterStatus`) as the records parsed from the EMR search result page, so `filter_results` and
+    `verify_demographic_data` work unchanged.
+
+    Args:
+        type_of_query (str): The search mode.
+        query (str): The search keyword.
+
+    Returns:
+        list or None: The search records, or `None` if the index is disabled, not synced yet, or has no match,
+        in which case the EMR is searched.
+    """
+    index = self.get_demographic_index(self)
+
+    if index is None or not index.get_sync_value('last_sync'):
+        return None
+
+    rows = index.search(type_of_query, query)
+
+    if not rows:
+        return None
+
+    records = [
+        {
+            'demographicNo': row['demographic_no'],
+            'formattedName': f"{row['last_name'] or ''}, {row['first_name'] or ''}",
+            'formattedDob': row['dob'] or '',
+            'providerNo': row['provider_no'] or '',
+            'rosterStatus': row['roster_status'] or ''
+        }
+        for row in rows
+    ]
+
+    self.logger.info(f"Found {len(records)} demographics in the local index for {type_of_query}.")
+
+    return records
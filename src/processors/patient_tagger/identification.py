@@ -0,0 +1,248 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import os
+import json
+import threading
+from typing import Dict, Tuple
+
+IDENTIFICATION_PATHS = ('dob', 'hin', 'name')
+
+# Loaded statistics are kept for the lifetime of the process, keyed by statistics file path.
+_stats_cache: Dict[str, Tuple[float, dict]] = {}
+_stats_lock = threading.Lock()
+
+
+def get_identification_stats(self):
+    """
+    Returns the identification path statistics set in `adaptive_identification.stats_file`.
+
+    The statistics map a document key to the number of attempts and successes of each identification
+    path, ie. `{"sender:12": {"hin": [40, 38], "dob": [2, 1]}}`. They are loaded once per process and
+    reloaded when the file changes.
+
+    Returns:
+        dict: The identification path statistics.
+    """
+    stats_file = self.config.get('adaptive_identification.stats_file', '../config/identification_stats.json')
+
+    try:
+        modified = os.path.getmtime(stats_file)
+    except OSError:
+        modified = 0
+
+    with _stats_lock:
+        cached = _stats_cache.get(stats_file)
+        if cached is None or cached[0] != modified:
+            stats = {}
+            if modified:
+                try:
+                    with open(stats_file, 'r', encoding='utf-8') as file:
+                        stats = json.load(file)
+                except (IOError, ValueError) as e:
+                    self.logger.error(f"Error loading identification statistics: {e}")
+            cached = (modified, stats)
+            _stats_cache[stats_file] = cached
+
+    return cached[1]
+
+
+def get_identification_key(self):
+    """
+    Returns the key the identification statistics of the document are kept under.
+
+    Documents that match a sender template share the statistics of their sender, other documents share
+    the statistics of their category.
+
+    Returns:
+        str: 'sender:<template>', 'category:<category>' or 'default'.
+    """
+    if self.config.get('sender_template.enabled', False):
+        signature = self.get_sender_signature(self)
+        if signature is not None:
+            match = self.get_sender_template_index(self).find(signature, self.config.get('sender_template.similarity', 0.6))
+            if match is not None:
+                return f"sender:{match[0]}"
+
+    category = self.config.get_shared_state('get_category_type')
+
+    if category:
+        return f"category:{category[1]}"
+
+    return 'default'
+
+
+def get_identification_order(self, key):
+    """
+    Returns the identification paths in descending order of expected success for a document key.
+
+    The expected success of a path is its smoothed success rate ((successes + 1) / (attempts + 2)) for the
+    key, so paths without history keep the configured order until enough documents have been processed.
+
+    Args:
+        key (str): The document key from `get_identification_key`.
+
+    Returns:
+        list: The identification paths ('hin', 'dob', 'name') to try, in order.
+    """
+    paths = [path for path in self.config.get('adaptive_identification.paths', list(IDENTIFICATION_PATHS)) if path in IDENTIFICATION_PATHS]
+    stats = self.get_identification_stats(self).get(key, {})
+
+    def expected_success(path):
+        attempts, successes = stats.get(path, (0, 0))
+        return (successes + 1) / (attempts + 2)
+
+    # sorted is stable, so paths with the same expected success keep the configured order.
+    return sorted(paths, key=expected_success, reverse=True)
+
+
+def record_identification_results(self, key, results):
+    """
+    Adds the outcome of the identification paths tried for a document to the statistics.
+
+    Args:
+        key (str): The document key from `get_identification_key`.
+        results (dict): `True` or `False` for each path that was tried.
+
+    Returns:
+        bool: `True` if the statistics were saved, `False` otherwise.
+    """
+    stats_file = self.config.get('adaptive_identification.stats_file', '../config/identification_stats.json')
+    stats = self.get_identification_stats(self)
+
+    try:
+        with _stats_lock:
+            entry = stats.setdefault(key, {})
+            for path, success in results.items():
+                attempts, successes = entry.get(path, (0, 0))
+                entry[path] = [attempts + 1, successes + (1 if success else 0)]
+
+            temp_path = f"{stats_file}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as file:
+                json.dump(stats, file)
+            os.replace(temp_path, stats_file)
+            _stats_cache[stats_file] = (os.path.getmtime(stats_file), stats)
+    except (IOError, OSError) as e:
+        self.logger.error(f"Error saving identification statistics: {e}")
+        return False
+
+    return True
+
+
+def run_identification_path(self, path):
+    """
+    Searches the patient with one identification path and filters the search results.
+
+    Args:
+        path (str): 'hin', 'dob' or 'name'.
+
+    Returns:
+        dict or None: The demographic selected from the search results, or `None` if there is none.
+    """
+    searches = {
+        'hin': self.get_patient_hin,
+        'dob': self.get_patient_dob,
+        'name': self.get_patient_name
+    }
+
+    self.logger.info(f"Identifying patient by {path.upper()}.")
+
+    if not searches[path](self):
+        return None
+
+    self.filter_results(self)
+
+    data = self.decode_json(self, self.config.get_shared_state(f'search_{path}filter'), path)
+
+    return data if isinstance(data, dict) and data.get('demographicNo') else None
+
+
+def identify_patient(self):
+    """
+    Identifies the patient of the document with the HIN, DOB and name searches, best path first.
+
+    With `adaptive_identification.enabled`, the paths are tried in descending order of their past success
+    for the sender template (or category) of the document, and the cascade stops at the first path whose
+    demographic is verified: it exists in the EMR, its name appears in the document and the LLM confirms it.
+    The outcome of each tried path is recorded, so the order adapts to each sender. When no single path is
+    verified, the results are compared by `compare_demographic_results`, which reuses the checks already done
+    for each demographic, so each one is verified and confirmed by the LLM at most once.
+
+    When disabled, all paths are run in the configured order and compared, as the separate search and
+    `filter_results` steps do.
+
+    Returns:
+        tuple: `True, demographic` if the patient was identified.
+        bool: `False` if the patient could not be identified.
+
+    Example:
+        >>> result = manager.identify_patient()
+        >>> print(result)
+        (True, '{"demographicNo": "123", "formattedName": "DOE, JOHN", ...}')
+    """
+    adaptive = self.config.get('adaptive_identification.enabled', False)
+
+    if adaptive:
+        key = self.get_identification_key(self)
+        paths = self.get_identification_order(self, key)
+        self.logger.info(f"Identification order for {key}: {', '.join(path.upper() for path in paths)}.")
+    else:
+        paths = [path for path in self.config.get('adaptive_identification.paths', list(IDENTIFICATION_PATHS)) if path in IDENTIFICATION_PATHS]
+
+    found = {}
+    checked = {}
+
+    for path in paths:
+        data = self.run_identification_path(self, path)
+        found[path] = data
+
+        if not adaptive or data is None:
+            continue
+
+        # A demographic already checked for an earlier path is not checked again.
+        demographic_no = str(data.get('demographicNo'))
+        if demographic_no in checked:
+            continue
+
+        check = checked[demographic_no] = {'verified': self.verify_demographic_data(self, data)}
+        if check['verified']:
+            check['name'] = self.compare_name_with_text(self, data, self.ocr_text)[0]
+        if check.get('name'):
+            check['llm'] = self.compare_demographic_results_llm(self, data)
+
+        if check.get('llm'):
+            skipped = len(paths) - len(found)
+            self.logger.info(f"Patient identified by {path.upper()}, skipping {skipped} identification path(s).")
+            self.record_identification_results(self, key, {name: name == path for name in found})
+            self.config.set_shared_state('filter_results', (True, json.dumps(data)))
+            return True, json.dumps(data)
+
+    result = self.compare_demographic_results(self, checked)
+
+    if result:
+        self.config.set_shared_state('filter_results', (True, result[1]))
+
+    if adaptive:
+        selected = self.decode_json(self, result[1], "identify_patient") if result else None
+        demographic_no = selected.get('demographicNo') if isinstance(selected, dict) else None
+        self.record_identification_results(self, key, {name: data is not None and data.get('demographicNo') == demographic_no for name, data in found.items()})
+
+    return result
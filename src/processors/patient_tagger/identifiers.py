@@ -0,0 +1,249 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import re
+from datetime import date
+
+# Labels used on lab, radiology and hospital reports in front of the patient identifiers.
+HIN_LABEL = r'(?:HCN|HC|PHN|HIN|HN|OHIN|OHIP|Health\s*(?:Card|Insurance)?\s*(?:No|Number|Num|#)|Personal\s+Health\s+Number)'
+DOB_LABEL = r'(?:DOB|D\.O\.B\.?|Date\s+of\s+Birth|Birth\s*Date|Birthdate|Born)'
+NAME_LABEL = r'(?:Patient\s+Name|Patient|Pt\.?\s+Name|Name\s+of\s+Patient|Client\s+Name)'
+
+MONTH = r'(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Sept|Oct|Nov|Dec)[a-z]*\.?'
+
+MONTHS = {
+    "jan": 1, "feb": 2, "mar": 3, "apr": 4, "may": 5, "jun": 6,
+    "jul": 7, "aug": 8, "sep": 9, "oct": 10, "nov": 11, "dec": 12
+}
+
+HIN_PATTERN = re.compile(
+    r'\b' + HIN_LABEL + r'[\s.:#-]{0,6}(?:No\.?|Number|#)?[\s.:#-]{0,3}(\d{4})[\s-]?(\d{3})[\s-]?(\d{3})(?:[\s-]?[A-Z]{2})?\b',
+    re.IGNORECASE
+)
+
+DOB_PATTERN = re.compile(
+    r'\b' + DOB_LABEL + r'[\s.:#/()-]{0,6}(?:\(?[ymd/-]{6,10}\)?[\s.:-]{0,3})?'
+    r'(\d{4}[-/. ]\d{1,2}[-/. ]\d{1,2}'
+    r'|\d{1,2}[-/. ]\d{1,2}[-/. ]\d{4}'
+    r'|\d{4}[-/ ]' + MONTH + r'[-/ ]\d{1,2}'
+    r'|\d{1,2}[-/ ]' + MONTH + r',?[-/ ]\d{4}'
+    r'|' + MONTH + r' \d{1,2},? \d{4})',
+    re.IGNORECASE
+)
+
+NAME_PATTERN = re.compile(
+    r'\b(?i:' + NAME_LABEL + r')\s*[:#-]\s*'
+    r"([A-Z][A-Za-z'-]+(?:[ \t]*,[ \t]*|[ \t]+)[A-Z][A-Za-z'-]+(?:[ \t]+[A-Z][A-Za-z'-]+)?)"
+)
+
+# Words that follow a name on the same line and are not part of it.
+NAME_STOP_WORDS = {'dob', 'sex', 'hcn', 'hin', 'phn', 'ohip', 'date', 'birth', 'gender', 'age', 'mrn', 'chart', 'tel', 'phone', 'dr', 'md'}
+
+
+def _luhn_valid(number):
+    """
+    Validates a number with the Luhn (mod 10) algorithm used by Ontario health card numbers.
+    """
+    total = 0
+    for index, digit in enumerate(reversed(number)):
+        value = int(digit)
+        if index % 2 == 1:
+            value *= 2
+            if value > 9:
+                value -= 9
+        total += value
+    return total % 10 == 0
+
+
+def _bc_phn_valid(number):
+    """
+    Validates a British Columbia PHN (10 digits starting with 9) with its mod 11 check digit.
+    """
+    if len(number) != 10 or number[0] != '9':
+        return False
+    weights = [2, 4, 8, 5, 10, 9, 7, 3]
+    total = sum(int(digit) * weight % 11 for digit, weight in zip(number[1:9], weights))
+    check = 11 - (total % 11)
+    return check < 10 and check == int(number[9])
+
+
+def _parse_date(text):
+    """
+    Parses a labelled date of birth into a date, reading numeric dates day first.
+    """
+    parts = [part for part in re.split(r'[-/., ]+', text.strip()) if part]
+    if len(parts) != 3:
+        return None
+
+    try:
+        if parts[0].isdigit() and len(parts[0]) == 4:
+            year = int(parts[0])
+            month = int(parts[1]) if parts[1].isdigit() else MONTHS.get(parts[1][:3].lower())
+            day = int(parts[2])
+        elif parts[2].isdigit() and len(parts[2]) == 4:
+            year = int(parts[2])
+            if parts[0].isdigit() and parts[1].isdigit():
+                day, month = int(parts[0]), int(parts[1])
+                if month > 12 and day <= 12:
+                    day, month = month, day
+            elif parts[0].isdigit():
+                day, month = int(parts[0]), MONTHS.get(parts[1][:3].lower())
+            else:
+                month, day = MONTHS.get(parts[0][:3].lower()), int(parts[1])
+        else:
+            return None
+        return date(year, month, day) if month else None
+    except (TypeError, ValueError):
+        return None
+
+
+def extract_hin_candidates(self, text):
+    """
+    Extracts checksum-validated health card numbers that follow an HCN label in the document.
+
+    Only numbers in a labelled position ('HCN', 'PHN', 'OHIP', 'Health Card No', ...) that pass the
+    Ontario (Luhn) or British Columbia (mod 11) check digit are returned, so phone and fax numbers are
+    not picked up.
+
+    Args:
+        text (str): The OCR text of the document.
+
+    Returns:
+        list: The distinct health card numbers (digits only) found in the document.
+
+    Example:
+        >>> manager.extract_hin_candidates(manager, 'HCN: 1234 567 897 AB')
+        ['1234567897']
+    """
+    candidates = []
+
+    for match in HIN_PATTERN.finditer(text or ''):
+        number = ''.join(match.groups())
+        if (_luhn_valid(number) or _bc_phn_valid(number)) and number not in candidates:
+            candidates.append(number)
+
+    return candidates
+
+
+def extract_dob_candidates(self, text):
+    """
+    Extracts dates that follow a date of birth label ('DOB', 'Date of Birth', 'Birth Date', ...).
+
+    Dates are returned in 'YYYY-MM-DD' format; numeric dates are read day first, `convert_date` later
+    searches both day/month orders. Dates in the future or before 1900 are ignored.
+
+    Args:
+        text (str): The OCR text of the document.
+
+    Returns:
+        list: The distinct dates of birth found in the document.
+
+    Example:
+        >>> manager.extract_dob_candidates(manager, 'DOB: 01-Feb-1990')
+        ['1990-02-01']
+    """
+    candidates = []
+    seen = set()
+    today = date.today()
+
+    for match in DOB_PATTERN.finditer(text or ''):
+        value = _parse_date(match.group(1))
+        if value is None or value.year < 1900 or value > today:
+            continue
+        # Day/month swapped dates refer to the same candidate.
+        key = (value.year, frozenset((value.month, value.day)))
+        if key not in seen:
+            seen.add(key)
+            candidates.append(value.strftime('%Y-%m-%d'))
+
+    return candidates
+
+
+def extract_name_candidates(self, text):
+    """
+    Extracts patient names that follow a patient name label ('Patient Name', 'Patient', 'Pt Name', ...).
+
+    Args:
+        text (str): The OCR text of the document.
+
+    Returns:
+        list: The distinct patient names found in the document, as written (ie. 'DOE, JOHN').
+
+    Example:
+        >>> manager.extract_name_candidates(manager, 'Patient Name: DOE, JOHN DOB: 1990-01-01')
+        ['DOE, JOHN']
+    """
+    candidates = []
+    seen = set()
+
+    for match in NAME_PATTERN.finditer(text or ''):
+        name = match.group(1)
+        words = re.split(r'([ \t]*,[ \t]*|[ \t]+)', name)
+        # Drop trailing words that belong to the next label on the same line.
+        while words and words[-1].lower().strip(" ,.'-") in NAME_STOP_WORDS:
+            words = words[:-2]
+        name = ''.join(words).strip(' ,')
+        parts = [part for part in re.split(r'[\s,]+', name) if part]
+        if len(parts) < 2:
+            continue
+        key = frozenset(part.lower() for part in parts)
+        if key not in seen:
+            seen.add(key)
+            candidates.append(name)
+
+    return candidates
+
+
+def get_unique_identifier(self, kind):
+    """
+    Returns the identifier of the given kind when the document contains exactly one labelled candidate.
+
+    Pre-extraction runs directly on the OCR text and is enabled with `identifier_extraction.enabled`.
+    When it finds exactly one high-confidence candidate the LLM query for that identifier can be skipped;
+    otherwise `None` is returned and the LLM remains the fallback.
+
+    Args:
+        kind (str): 'hin', 'dob' or 'name'.
+
+    Returns:
+        str or None: The single candidate, or `None` if there is none or more than one.
+    """
+    if not self.config.get('identifier_extraction.enabled', False):
+        return None
+
+    extractors = {
+        'hin': self.extract_hin_candidates,
+        'dob': self.extract_dob_candidates,
+        'name': self.extract_name_candidates
+    }
+
+    candidates = extractors[kind](self, self.ocr_text)
+
+    if len(candidates) == 1:
+        self.logger.info(f"Found a single labelled patient {kind.upper()} in the document, skipping LLM query.")
+        self.config.set_shared_state(f'identifier_source_{kind}', 'rules')
+        return candidates[0]
+
+    if candidates:
+        self.logger.info(f"Found {len(candidates)} labelled patient {kind.upper()} candidates in the document, using LLM.")
+
+    self.config.set_shared_state(f'identifier_source_{kind}', 'llm')
+    return None
@@ -0,0 +1,309 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import re
+import numpy as np
+
+# Tokens longer than this are not compared by edit distance (ie. URLs, run-together OCR text).
+MAX_TOKEN_LENGTH = 20
+
+VOWELS = 'AEIOU'
+
+
+def nysiis(word):
+    """
+    Returns the NYSIIS phonetic key of a word, so spelling variants of a name ('Johnson', 'Jonson') share a key.
+
+    Args:
+        word (str): The word.
+
+    Returns:
+        str: The phonetic key, or an empty string if the word has no letters.
+
+    Example:
+        >>> nysiis('Johnson'), nysiis('Jonson')
+        ('JANSAN', 'JANSAN')
+    """
+    name = re.sub(r'[^A-Z]', '', (word or '').upper())
+    if not name:
+        return ''
+
+    for prefix, replacement in (('MAC', 'MCC'), ('KN', 'NN'), ('K', 'C'), ('PH', 'FF'), ('PF', 'FF'), ('SCH', 'SSS')):
+        if name.startswith(prefix):
+            name = replacement + name[len(prefix):]
+            break
+
+    for suffix, replacement in (('EE', 'Y'), ('IE', 'Y'), ('DT', 'D'), ('RT', 'D'), ('RD', 'D'), ('NT', 'D'), ('ND', 'D')):
+        if name.endswith(suffix):
+            name = name[:-len(suffix)] + replacement
+            break
+
+    chars = list(name)
+    key = chars[0]
+
+    for i in range(1, len(chars)):
+        char = chars[i]
+        following = chars[i + 1] if i + 1 < len(chars) else ''
+        if char == 'E' and following == 'V':
+            chars[i:i + 2] = ['A', 'F']
+        elif char in VOWELS:
+            chars[i] = 'A'
+        elif char == 'Q':
+            chars[i] = 'G'
+        elif char == 'Z':
+            chars[i] = 'S'
+        elif char == 'M':
+            chars[i] = 'N'
+        elif char == 'K':
+            chars[i] = 'N' if following == 'N' else 'C'
+        elif chars[i:i + 3] == ['S', 'C', 'H']:
+            chars[i:i + 3] = ['S', 'S', 'S']
+        elif char == 'P' and following == 'H':
+            chars[i:i + 2] = ['F', 'F']
+        elif char == 'H' and (chars[i - 1] not in VOWELS or (following and following not in VOWELS)):
+            chars[i] = chars[i - 1]
+        elif char == 'W' and chars[i - 1] in VOWELS:
+            chars[i] = chars[i - 1]
+        if chars[i] != key[-1]:
+            key += chars[i]
+
+    if len(key) > 1 and key.endswith('S'):
+        key = key[:-1]
+    if key.endswith('AY'):
+        key = key[:-2] + 'Y'
+    if len(key) > 1 and key.endswith('A'):
+        key = key[:-1]
+
+    return key
+
+
+class NameMatcher:
+    """
+    Matches patient names against a text that is tokenized once.
+
+    The text is split into a set of lowercase words (including apostrophe names such as 'o'brien'), the NYSIIS keys of its words, and an array of the words' characters, so that the name parts of
+    all candidates are compared in one vectorized edit distance batch instead of a regular expression scan of
+    the text per name part.
+
+    Attributes:
+        words (set): The lowercase words of the text.
+        tokens (list): The distinct alphabetic words of the text that are compared by edit distance.
+        phonetic_keys (set): The NYSIIS keys of the tokens.
+    """
+    def __init__(self, text):
+        """
+        Tokenizes the text.
+
+        Args:
+            text (str): The text, ie. the OCR text of the document.
+        """
+        text = (text or '').lower()
+        self.words = set(re.findall(r'\w+', text)) | set(re.findall(r"\w+(?:'\w+)+", text))
+        self.tokens = sorted(word for word in self.words if word.isalpha() and 2 <= len(word) <= MAX_TOKEN_LENGTH)
+        self.phonetic_keys = {nysiis(token) for token in self.tokens if len(token) >= 3}
+
+        self._lengths = np.array([len(token) for token in self.tokens], dtype=np.int32)
+        self._codes = np.full((len(self.tokens), MAX_TOKEN_LENGTH), -1, dtype=np.int32)
+        for row, token in enumerate(self.tokens):
+            self._codes[row, :len(token)] = [ord(char) for char in token]
+
+    def contains(self, word):
+        """
+        Returns whether the word appears in the text as a whole word, ignoring case.
+        """
+        return word.lower() in self.words
+
+    def distances(self, parts):
+        """
+        Computes the Levenshtein distance of each name part to each token of the text.
+
+        The dynamic programming table is filled for all parts and all tokens at once, one character
+        position at a time.
+
+        Args:
+            parts (list): The lowercase name parts.
+
+        Returns:
+            np.ndarray: The distances, shape (parts, tokens).
+        """
+        if not parts or not self.tokens:
+            return np.zeros((len(parts), len(self.tokens)), dtype=np.int32)
+
+        part_lengths = np.array([len(part) for part in parts], dtype=np.int32)
+        length = int(part_lengths.max())
+        queries = np.full((len(parts), length), -2, dtype=np.int32)
+        for row, part in enumerate(parts):
+            queries[row, :len(part)] = [ord(char) for char in part]
+
+        columns = self._codes.shape[1]
+        previous = np.broadcast_to(np.arange(columns + 1, dtype=np.int32), (len(parts), len(self.tokens), columns + 1)).copy()
+        result = np.zeros((len(parts), len(self.tokens)), dtype=np.int32)
+        token_index = np.arange(len(self.tokens))
+
+        for i in range(1, length + 1):
+            current = np.empty_like(previous)
+            current[:, :, 0] = i
+            cost = (self._codes[None, :, :] != queries[:, i - 1][:, None, None]).astype(np.int32)
+            for j in range(1, columns + 1):
+                current[:, :, j] = np.minimum(
+                    np.minimum(previous[:, :, j], current[:, :, j - 1]) + 1,
+                    previous[:, :, j - 1] + cost[:, :, j - 1]
+                )
+            done = part_lengths == i
+            if done.any():
+                result[done] = current[done][:, token_index, self._lengths]
+            previous = current
+
+        return result
+
+    def score_names(self, names):
+        """
+        Scores how well each name appears in the text.
+
+        Each name part scores 1 when it appears in the text, 0.85 when a word of the text has the same
+        NYSIIS key, and `1 - distance / length` when a word is within one edit (two for parts longer than
+        six letters), so OCR errors and spelling variants still match. The score of a name is the mean of
+        its part scores.
+
+        Args:
+            names (list): The names, ie. 'DOE, JOHN'.
+
+        Returns:
+            list: The score of each name, from 0 to 1.
+        """
+        names_parts = [[part for part in re.split(r"[^\w'-]+|-", name.lower()) if len(part) >= 2] for name in names]
+        fuzzy = sorted({part for parts in names_parts for part in parts if not self.contains(part) and part.isalpha() and len(part) >= 4})
+        distances = dict(zip(fuzzy, self.distances(fuzzy).min(axis=1))) if fuzzy and self.tokens else {}
+
+        scores = []
+        for parts in names_parts:
+            part_scores = []
+            for part in parts:
+                if self.contains(part):
+                    part_scores.append(1.0)
+                    continue
+                score = 0.85 if len(part) >= 3 and nysiis(part) in self.phonetic_keys else 0.0
+                distance = distances.get(part)
+                if distance is not None and distance <= (1 if len(part) <= 6 else 2):
+                    score = max(score, 1 - int(distance) / len(part))
+                part_scores.append(score)
+            scores.append(sum(part_scores) / len(part_scores) if part_scores else 0.0)
+
+        return scores
+
+
+def get_name_matcher(self, text=None):
+    """
+    Returns the name matcher of a text, by default the OCR text of the document.
+
+    The matcher of the OCR text is built once per document and kept in the shared state.
+
+    Args:
+        text (str, optional): The text. Defaults to the OCR text of the document.
+
+    Returns:
+        NameMatcher: The name matcher.
+    """
+    if text is None:
+        text = self.ocr_text
+
+    if text is not self.ocr_text and text != self.ocr_text:
+        return NameMatcher(text)
+
+    cached = self.config.get_shared_state('name_matcher')
+
+    if cached is None or cached[0] != text:
+        cached = (text, NameMatcher(text))
+        self.config.set_shared_state('name_matcher', cached)
+
+    return cached[1]
+
+
+def rank_name_candidates(self, candidates):
+    """
+    Ranks patient candidates by how well their name and date of birth match the document.
+
+    The name score comes from `NameMatcher.score_names`. When the document has labelled dates of birth
+    (`extract_dob_candidates`), the confidence is 75% name score and 25% date of birth match.
+
+    Args:
+        candidates (list): Candidate dictionaries with 'formattedName' and 'formattedDob'.
+
+    Returns:
+        list: `(confidence, candidate)` tuples, highest confidence first.
+
+    Example:
+        >>> manager.rank_name_candidates(manager, candidates)
+        [(0.97, {'demographicNo': '123', 'formattedName': 'DOE, JOHN', ...}), (0.41, {...})]
+    """
+    if not candidates:
+        return []
+
+    matcher = self.get_name_matcher(self)
+    name_scores = matcher.score_names([str(candidate.get('formattedName') or '') for candidate in candidates])
+
+    # Labelled dates are read day first, so either day/month order matches.
+    labelled_dobs = set()
+    for value in self.extract_dob_candidates(self, self.ocr_text):
+        year, month, day = value.split('-')
+        labelled_dobs.update({(year, month, day), (year, day, month)})
+
+    ranked = []
+    for candidate, name_score in zip(candidates, name_scores):
+        confidence = name_score
+        if labelled_dobs:
+            dob = tuple(str(candidate.get('formattedDob') or '').split('-'))
+            confidence = 0.75 * name_score + 0.25 * (dob in labelled_dobs)
+        ranked.append((round(confidence, 3), candidate))
+
+    return sorted(ranked, key=lambda item: item[0], reverse=True)
+
+
+def select_name_candidate(self, candidates):
+    """
+    Selects the patient candidate that clearly matches the document best, without querying the AI model.
+
+    Enabled with `name_matching.enabled`. A candidate is selected when its confidence reaches
+    `name_matching.threshold` and is at least `name_matching.margin` above the next candidate, so the
+    `get_patient_result_filter` prompt is only used when the candidates cannot be told apart.
+
+    Args:
+        candidates (list): Candidate dictionaries with 'formattedName' and 'formattedDob'.
+
+    Returns:
+        dict or None: The selected candidate, or `None` if no candidate is confidently the best.
+    """
+    if not self.config.get('name_matching.enabled', False) or len(candidates) < 2:
+        return None
+
+    ranked = self.rank_name_candidates(self, candidates)
+    threshold = self.config.get('name_matching.threshold', 0.9)
+    margin = self.config.get('name_matching.margin', 0.15)
+
+    best_confidence, best = ranked[0]
+    next_confidence = ranked[1][0]
+
+    if best_confidence >= threshold and best_confidence - next_confidence >= margin:
+        self.logger.info(f"Name matching selected demographic {best.get('demographicNo')} ({best_confidence:.2f}, next {next_confidence:.2f}), skipping LLM filter.")
+        return best
+
+    self.logger.info(f"Name matching is not confident ({best_confidence:.2f}, next {next_confidence:.2f}), using LLM filter.")
+    return None
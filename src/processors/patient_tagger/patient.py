@@ -20,9 +20,22 @@
 # ***
 
 import re
-from bs4 import BeautifulSoup
 import itertools
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import threading
+import time
 import json
+from .search_results import parse_demographic_search, merge_demographic_records
+
+# Cross-document EMR search results, keyed by (base URL, search mode, keyword), with their expiry time.
+_search_cache = OrderedDict()
+_search_cache_lock = threading.Lock()
+_search_cache_stats = {'lookups': 0, 'hits': 0}
+
+# Most responsible provider of each demographic, keyed by (base URL, demographic number), with its expiry time.
+_mrp_cache = OrderedDict()
+_mrp_cache_lock = threading.Lock()
 
 def get_patient_name(self):
     """
@@ -32,83 +45,153 @@ def get_patient_name(self):
     The method then checks the returned result, processes the name, and formats it into a query that can 
     be used to search for patient information in a database.
 
-    It returns a table of matching patient records, if found, or `False` if no valid name is detected.
+    It returns the matching patient search records, if found, or `False` if no valid name is detected.
+    When identifier pre-extraction is enabled and the document contains exactly one labelled patient name,
+    that name is searched directly and the AI model is not queried.
 
     Returns:
         tuple: 
-            - `True, str(table)` if a valid patient name is found and a matching table is returned.
+            - `True, records` if a valid patient name is found and matching patients are returned.
             - `False` if no valid name is found or if the query result is invalid.
 
     Example:
         >>> result = manager.get_patient_name()
         >>> print(result)
-        (True, '<html_table>')  # if the patient's name was successfully extracted and matched.
+        (True, [{'demographicNo': '123', 'formattedName': 'DOE, JOHN', ...}])  # if the patient's name was successfully extracted and matched.
     """
-    prompt = f"\n{self.ocr_text}.\n\n" + self.ai_prompts.get('get_patient_name', '')
-    text = self.query_prompt(self,prompt)[1]
-    query = text.lower()
+    prompt = f"\n{self.get_prompt_text(self, 'get_patient_name')}.\n\n" + self.ai_prompts.get('get_patient_name', '')
 
     type_of_query = "search_name"
 
-    if "False" in query:
-        return False
+    query = self.get_unique_identifier(self, 'name')
 
-    array_pattern = r'\[.*?\]'
-    parts = query.split(':')
-    parts = [part.strip() for part in parts]
-    if len(parts) > 1:
-        query = parts[1]
+    if query:
+        query = query.lower()
+    elif self.ai_prompt_schemas.get('get_patient_name'):
+        result = self.query_prompt_json(self, prompt, 'get_patient_name')
+        if not result or not result[1].get('found'):
+            return False
+        query = str(result[1].get('full_name', '')).lower()
+    else:
+        text = self.query_prompt(self,prompt,'get_patient_name')[1]
+        query = text.lower()
 
-    pattern = r'\bnot provided\b.*?[.!?]'
-    match = re.search(pattern, query)
-    if match:
-        return False
+        if "False" in query:
+            return False
 
+        parts = query.split(':')
+        parts = [part.strip() for part in parts]
+        if len(parts) > 1:
+            query = parts[1]
 
-    pattern = r'\bfull name of the patient\b.*?[.!?]'
-    match = re.search(pattern, query)
-    if match:
-        query = match.group()
+        pattern = r'\bnot provided\b.*?[.!?]'
+        match = re.search(pattern, query)
+        if match:
+            return False
+
+
+        pattern = r'\bfull name of the patient\b.*?[.!?]'
+        match = re.search(pattern, query)
+        if match:
+            query = match.group()
 
     if query:
 
         query = re.sub(r'([A-Za-z]+),([A-Za-z]+)', r'\1, \2', query)
 
-        query = re.sub(r'[.,]', '', query)
-        query = re.sub(r'[-]', ' ', query)
-
         parts = query.split(' is ')
         if len(parts) > 1:
-            name_parts = parts[1].split()
-        else:
-            name_parts = query.split()
+            query = parts[1]
 
-        if len(name_parts) > 5:
-            return False
+        # 'Doe, John' is written surname first, 'John Doe' given name first.
+        surname_first = ',' in query
 
-        all_combinations = list(itertools.permutations(name_parts))
-        formatted_combinations = [f"%{combo[0][:4]}%,%{combo[1][:5]}%" 
-                                for combo in all_combinations 
-                                if len(combo) > 1 and len(combo[0]) >= 2 and len(combo[1]) >= 3]
+        query = re.sub(r'[.,]', '', query)
+        query = re.sub(r'[-]', ' ', query)
 
-        # Initialize an empty string to store all the table results
-        all_tables = ""
+        name_parts = query.split()
 
-        for combo in formatted_combinations:
-            table = self.get_patient_Html(self,type_of_query,combo)
+        if len(name_parts) > 5:
+            return False
 
-            if table:
-                all_tables += str(table)
+        keywords = self.get_name_search_keywords(self, name_parts, surname_first)
 
+        records = self.search_patient_names(self, type_of_query, keywords)
 
-        if all_tables:
+        if records:
             self.config.set_shared_state('type_of_query',type_of_query)
-            self.config.set_shared_state('type_of_query_table',all_tables)
-            return True,all_tables
+            self.config.set_shared_state('type_of_query_table',records)
+            return True,records
     
     return False
 
 
+def get_name_search_keywords(self, name_parts, surname_first=False):
+    """
+    Returns the distinct name search keywords for the parts of a patient name, most likely first.
+
+    Each keyword pairs one part as the surname with another part as the given name ('%doe%,%john%'), as
+    searched by the EMR. Pairs that give the same keyword are searched once. The pair in the order the name
+    was written ('Doe, John' or 'John Doe') comes first, then pairs of adjacent parts, then the others.
+    At most `name_search.max_keywords` keywords are returned.
+
+    Args:
+        name_parts (list): The parts of the patient name, lowercase.
+        surname_first (bool): Whether the name was written surname first ('Doe, John').
+
+    Returns:
+        list: The search keywords.
+
+    Example:
+        >>> manager.get_name_search_keywords(manager, ['john', 'doe'])
+        ['%doe%,%john%', '%john%,%doe%']
+    """
+    pairs = [(i, j) for i, j in itertools.permutations(range(len(name_parts)), 2)
+             if len(name_parts[i]) >= 2 and len(name_parts[j]) >= 3]
+
+    last = len(name_parts) - 1
+
+    def rank(pair):
+        surname, given = pair
+        written = (surname, given) == ((0, 1) if surname_first else (last, 0))
+        return (not written, abs(surname - given), surname_first != (surname < given), pair)
+
+    keywords = []
+    for surname, given in sorted(pairs, key=rank):
+        keyword = f"%{name_parts[surname][:4]}%,%{name_parts[given][:5]}%"
+        if keyword not in keywords:
+            keywords.append(keyword)
+
+    return keywords[:self.config.get('name_search.max_keywords', 20)]
+
+
+def search_patient_names(self, type_of_query, keywords):
+    """
+    Searches the patient name keywords in the EMR and merges the results.
+
+    The keywords are searched concurrently, at most `name_search.concurrency` requests at once, and the
+    result records are merged without duplicate demographic numbers, in keyword order.
+
+    Args:
+        type_of_query (str): The type of search query ("search_name").
+        keywords (list): The search keywords, most likely first.
+
+    Returns:
+        list: The distinct patient search records, empty if nothing was found.
+    """
+    if not keywords:
+        return []
+
+    with ThreadPoolExecutor(max_workers=self.config.get('name_search.concurrency', 4)) as executor:
+        results = list(executor.map(lambda keyword: self.get_patient_Html(self, type_of_query, keyword), keywords))
+
+    records = merge_demographic_records(*results)
+
+    self.logger.info(f"Searched {len(keywords)} name keywords, found {len(records)} distinct patients.")
+
+    return records
+
+
 def get_patient_dob(self):
     """
     Extracts the patient's date of birth (DOB) from the OCR text.
@@ -117,20 +200,32 @@ def get_patient_dob(self):
     The method supports multiple date formats (e.g., "YYYY-MM-DD" and "Month day, year") and converts
     them into a consistent format (YYYY-MM-DD). It then queries the patient data and returns the result.
 
+    When identifier pre-extraction is enabled and the document contains exactly one labelled date of birth,
+    that date is searched directly and the AI model is not queried.
+
     Returns:
-        str: A formatted HTML table if a valid DOB is found and matched; `False` otherwise.
+        tuple: `True, records` with the matching patient search records if a valid DOB is found and matched; `False` otherwise.
 
     Example:
         >>> result = manager.get_patient_dob()
         >>> print(result)
-        (True, '<html_table>')  # if the patient's date of birth was successfully extracted and matched.
+        (True, [{'demographicNo': '123', 'formattedDob': '1990-01-05', ...}])  # if the patient's date of birth was successfully extracted and matched.
     """
-    prompt = f"\n{self.ocr_text}.\n\n" + self.ai_prompts.get('get_patient_dob', '')
-    text = self.query_prompt(self,prompt)[1]
-    query = text.lower()
+    prompt = f"\n{self.get_prompt_text(self, 'get_patient_dob')}.\n\n" + self.ai_prompts.get('get_patient_dob', '')
 
     type_of_query = "search_dob"
 
+    query = self.get_unique_identifier(self, 'dob')
+
+    if query is None and self.ai_prompt_schemas.get('get_patient_dob'):
+        result = self.query_prompt_json(self, prompt, 'get_patient_dob')
+        if not result or not result[1].get('found'):
+            return False
+        query = str(result[1].get('dob', ''))
+    elif query is None:
+        text = self.query_prompt(self,prompt,'get_patient_dob')[1]
+        query = text.lower()
+
     formatted_dates = self.convert_date(self,query)
 
     if isinstance(formatted_dates, bool) and formatted_dates is False:
@@ -139,14 +234,14 @@ def get_patient_dob(self):
     responses = []
 
     for date in formatted_dates:
-        result, table = self.get_patient_Html_Common(self,date,type_of_query)
+        result, records = self.get_patient_Html_Common(self,date,type_of_query)
         if result:
-            responses.append(table)
+            responses.append(records)
 
     if responses:
-        response_str = "\n".join(responses)
-        self.config.set_shared_state('type_of_query_table', response_str)
-        return True, response_str
+        records = merge_demographic_records(*responses)
+        self.config.set_shared_state('type_of_query_table', records)
+        return True, records
 
     return False
 
@@ -160,20 +255,32 @@ def get_patient_hin(self):
     from the OCR text. It processes the result and formats the query to match the expected format for 
     patient search in the database.
 
+    When identifier pre-extraction is enabled and the document contains exactly one labelled, checksum-valid
+    health card number, that number is searched directly and the AI model is not queried.
+
     Returns:
-        str: A formatted HTML table if a valid HIN is found and matched; `False` otherwise.
+        tuple: `True, records` with the matching patient search records if a valid HIN is found and matched; `False` otherwise.
 
     Example:
         >>> result = manager.get_patient_hin()
         >>> print(result)
-        (True, '<html_table>')  # if the patient's HIN was successfully extracted and matched.
+        (True, [{'demographicNo': '123', 'formattedName': 'DOE, JOHN', ...}])  # if the patient's HIN was successfully extracted and matched.
     """
-    prompt = f"\n{self.ocr_text}.\n\n" + self.ai_prompts.get('get_patient_hin', '')
-    text = self.query_prompt(self,prompt)[1]
-    query = text.lower()
+    prompt = f"\n{self.get_prompt_text(self, 'get_patient_hin')}.\n\n" + self.ai_prompts.get('get_patient_hin', '')
 
     type_of_query = "search_hin"
 
+    query = self.get_unique_identifier(self, 'hin')
+
+    if query is None and self.ai_prompt_schemas.get('get_patient_hin'):
+        result = self.query_prompt_json(self, prompt, 'get_patient_hin')
+        if not result or not result[1].get('found'):
+            return False
+        query = str(result[1].get('hin', '')).lower()
+    elif query is None:
+        text = self.query_prompt(self,prompt,'get_patient_hin')[1]
+        query = text.lower()
+
     query = re.sub(r'[#:.,]', ' ', query)
     query = re.sub(r'[-/]', '', query)
     query = re.sub(r'(\d{3,})\s(\d{3,})', r'\1\2', query)
@@ -204,7 +311,9 @@ def get_patient_hin(self):
             p2_result, p2_data = self.get_patient_Html_Common(self,part2,type_of_query)
 
             if p1_result and p2_result:
-                return True, f"{p1_data} {p2_data}"
+                records = merge_demographic_records(p1_data, p2_data)
+                self.config.set_shared_state('type_of_query_table', records)
+                return True, records
             elif p1_result:
                 return True, p1_data
             elif p2_result:
@@ -215,33 +324,39 @@ def get_patient_hin(self):
 
 
 
-def get_patient_Html_Common(self, query, type_of_query):
+def get_patient_Html_Common(self, query, type_of_query, live=False):
     """
-    Helper function to query the patient data and return the matching HTML table.
+    Helper function to query the patient data and return the matching patient search records.
 
     This method standardizes the format of the query by removing any punctuation and sends the query
     to `get_patient_Html` to retrieve the matching records from the system.
 
+    Args:
+        query (str): The search keyword.
+        type_of_query (str): The search mode.
+        live (bool): Whether to search the EMR instead of the local demographic index, ie. when the MRP
+            name (`doctor`) of the records is needed.
+
     Returns:
         tuple: 
-            - `True, str(table)` if matching patient records are found.
-            - `False` if no matching records are found.
+            - `True, records` if matching patient records are found.
+            - `False, []` if no matching records are found.
 
     Example:
         >>> result = manager.get_patient_Html_Common(query, type_of_query)
         >>> print(result)
-        (True, '<html_table>')  # if a matching patient record is found
+        (True, [{'demographicNo': '123', 'formattedName': 'DOE, JOHN', ...}])  # if a matching patient record is found
     """
     query = re.sub(r'[.,]', '', query)
 
-    table = self.get_patient_Html(self,type_of_query,query)
+    records = self.get_patient_Html(self,type_of_query,query,live)
 
-    if table:
+    if records:
         self.config.set_shared_state('type_of_query',type_of_query)
-        self.config.set_shared_state('type_of_query_table',str(table))
-        return True,str(table)
+        self.config.set_shared_state('type_of_query_table',records)
+        return True,records
     else:
-        return False, ''
+        return False, []
 
 
 
@@ -317,10 +432,12 @@ def convert_date(self,query):
 def get_mrp_details(self):
     """
     Retrieves and updates the MRP details for the provider based on the 'formattedName'.
-    
-    This method sends a POST request to the demographic search API with the provided 
-    'formattedName', retrieves the provider details, and updates the shared state with 
-    the provider number if a matching formatted name is found.
+
+    The provider number is first taken from the MRP cache, which is filled from the `providerNo` of the
+    demographic search records (ie. the `search_demographic_no` search of `verify_demographic_number`), so
+    in the common case no request is sent. Otherwise this method sends a POST request to the demographic
+    search API with the provided 'formattedName', retrieves the provider details, and updates the shared
+    state with the provider number if a matching formatted name is found.
 
     Args:
         self: The instance of the class.
@@ -345,6 +462,14 @@ def get_mrp_details(self):
         self.logger.error(f"JSON decoding error: {e}")
         return False
 
+    provider_no = self.get_cached_mrp(self, data.get('demographicNo'))
+
+    if provider_no:
+        self.logger.info(f"MRP of demographic {data.get('demographicNo')} found in the search results.")
+        data['providerNo'] = provider_no
+        self.config.set_shared_state('filter_results', (True, json.dumps(data)))
+        return True, json.dumps(data)
+
     formatted_name = data.get('formattedName', '')
 
     url = f"{self.base_url}/demographic/SearchDemographic.do"
@@ -354,11 +479,8 @@ def get_mrp_details(self):
                   "query": formatted_name
                 }
 
-    self.headers['Referer'] = url
-    self.session.headers.update(self.headers)
-
     # Send the POST request
-    response = self.session.post(url, data=payload, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+    response = self.emr_client.post(url, data=payload, headers=dict(self.headers, Referer=url))
 
     if response.status_code == 200:
         try:
@@ -370,11 +492,54 @@ def get_mrp_details(self):
         if loaded_data['results'] and formatted_name.lower() == loaded_data["results"][0]['formattedName'].lower():
             data['providerNo'] = loaded_data["results"][0]['providerNo']
             self.config.set_shared_state('filter_results', (True, json.dumps(data)))
+            self.cache_mrp_details(self, [data])
 
         return True, json.dumps(data)
     else:
         return False
 
+def get_cached_mrp(self, demographic_no):
+    """
+    Returns the cached provider number (MRP) of a demographic, or `None` if it is not cached or expired.
+    """
+    key = (self.base_url, str(demographic_no))
+
+    with _mrp_cache_lock:
+        entry = _mrp_cache.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.monotonic():
+            del _mrp_cache[key]
+            return None
+        _mrp_cache.move_to_end(key)
+        return entry[1]
+
+
+def cache_mrp_details(self, records):
+    """
+    Stores the provider number (MRP) of the demographic search records for `mrp_cache.ttl` seconds
+    (bounded by `mrp_cache.max_entries`), so `get_mrp_details` does not need to search for it.
+
+    Args:
+        records (list): Search records with 'demographicNo' and 'providerNo'.
+    """
+    ttl = self.config.get('mrp_cache.ttl', 3600)
+
+    if not ttl:
+        return
+
+    expires = time.monotonic() + ttl
+
+    with _mrp_cache_lock:
+        for record in records or []:
+            if record.get('demographicNo') and record.get('providerNo'):
+                key = (self.base_url, str(record['demographicNo']))
+                _mrp_cache[key] = (expires, record['providerNo'])
+                _mrp_cache.move_to_end(key)
+        while len(_mrp_cache) > self.config.get('mrp_cache.max_entries', 2000):
+            _mrp_cache.popitem(last=False)
+
+
 def remove_mrp_details(self):
     """
     Removes MRP details from the 'filter_results' shared state by decoding, modifying, 
@@ -414,35 +579,54 @@ def remove_mrp_details(self):
     return True
 
 
-def get_patient_Html(self,type_of_query,query):
+def get_patient_Html(self,type_of_query,query,live=False):
     """
     Retrieves patient records from the system based on the search query.
 
     This method constructs a search payload and sends it via a POST request to the system. It uses the 
     provided query (such as patient name, DOB, or HIN) to search the demographic database and retrieve 
-    matching patient records.
+    matching patient records. When the local demographic index is enabled, it is searched first and the
+    EMR is only searched if the index has no match, or if `live` is set.
+
+    The result page is parsed once with `parse_demographic_search` into compact records, which are what is
+    cached and passed between the workflow steps; the page itself is not kept.
 
     Args:
         type_of_query (str): The type of search query (e.g., "search_name", "search_dob").
         query (str): The query string used to search for the patient.
+        live (bool): Whether to search the EMR instead of the local demographic index.
 
     Returns:
-        list: A list of matching HTML tables with patient data.
+        list or None: The matching patient search records (`demographicNo`, `formattedName`, `formattedDob`,
+        `providerNo`, `rosterStatus`, `doctor`), or `None` if no patient was found.
 
     Example:
-        >>> table = manager.get_patient_Html('search_name', 'John Doe')
-        >>> print(table)
-        [<html_table>]  # list of matching patient records
+        >>> records = manager.get_patient_Html('search_name', 'John Doe')
+        >>> print(records)
+        [{'demographicNo': '123', 'formattedName': 'DOE, JOHN', 'formattedDob': '1990-01-05', ...}]
     """
+    if not live:
+        local = self.search_demographic_index(self, type_of_query, query)
+        if local:
+            self.cache_mrp_details(self, local)
+            return local
+
+    cached = self.get_cached_patient_search(self, type_of_query, query)
+
+    if cached is not False:
+        return cached
+
     url = f"{self.base_url}/demographic/demographiccontrol.jsp"
 
+    keyword = query
+
     if type_of_query != "search_demographic_no":
-        query = f"%{query}%"
+        keyword = f"%{query}%"
 
     # Define the payload data
     payload = {
                   "search_mode": type_of_query,
-                  "keyword": query,
+                  "keyword": keyword,
                   "orderby": ["last_name", "first_name"],
                   "dboperation": "search_titlename",
                   "limit1": 0,
@@ -453,20 +637,109 @@ def get_patient_Html(self,type_of_query,query):
                   "outofdomain": ""
                 }
 
-    self.headers['Referer'] = url
-    self.session.headers.update(self.headers)
-
     # Send the POST request
-    response = self.session.post(url, data=payload, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+    response = self.emr_client.post(url, data=payload, headers=dict(self.headers, Referer=url))
+
+    result = parse_demographic_search(response.text) or None
+
+    if response.status_code == 200:
+        self.cache_patient_search(self, type_of_query, query, result)
+        self.cache_mrp_details(self, result)
+
+    return result
+
 
-    soup = BeautifulSoup(response.text, 'html.parser')
+def get_cached_patient_search(self, type_of_query, query):
+    """
+    Returns the cached result of an EMR demographic search, or `False` if the search is not cached.
+
+    Searches are memoized for the current document, so the same search (ie. when verifying several
+    candidates with the same demographic number) is only sent once. When `patient_search_cache.ttl` is set,
+    results are also kept across documents for that many seconds. The hit rate is logged every
+    `patient_search_cache.stats_interval` lookups.
+
+    Args:
+        type_of_query (str): The search mode.
+        query (str): The search keyword.
 
-    table = soup.find_all(class_="odd") + soup.find_all(class_="even")
+    Returns:
+        list or None: The cached search records (`None` if the search found no patient).
+        bool: `False` if the search is not cached.
+    """
+    key = (self.base_url, type_of_query, query)
+    document_cache = self.config.get_shared_state('patient_search_cache')
 
-    if table:
-        return response.text
+    if document_cache is not None and key in document_cache:
+        result = document_cache[key]
     else:
-        return
+        result = False
+        with _search_cache_lock:
+            entry = _search_cache.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                _search_cache.move_to_end(key)
+                result = entry[1]
+            elif entry is not None:
+                del _search_cache[key]
+
+    with _search_cache_lock:
+        _search_cache_stats['lookups'] += 1
+        if result is not False:
+            _search_cache_stats['hits'] += 1
+        stats = dict(_search_cache_stats)
+
+    if stats['lookups'] % self.config.get('patient_search_cache.stats_interval', 100) == 0:
+        self.logger.info(f"EMR search cache: {stats['hits']} of {stats['lookups']} searches cached ({stats['hits'] / stats['lookups']:.0%}).")
+
+    return result
+
+
+def cache_patient_search(self, type_of_query, query, result):
+    """
+    Stores the result of an EMR demographic search for the current document and, when
+    `patient_search_cache.ttl` is set, across documents (bounded by `patient_search_cache.max_entries`).
+    """
+    key = (self.base_url, type_of_query, query)
+
+    with _search_cache_lock:
+        document_cache = self.config.get_shared_state('patient_search_cache')
+        if document_cache is None:
+            document_cache = {}
+            self.config.set_shared_state('patient_search_cache', document_cache)
+        document_cache[key] = result
+
+    ttl = self.config.get('patient_search_cache.ttl', 0)
+
+    if ttl:
+        with _search_cache_lock:
+            _search_cache[key] = (time.monotonic() + ttl, result)
+            _search_cache.move_to_end(key)
+            while len(_search_cache) > self.config.get('patient_search_cache.max_entries', 500):
+                _search_cache.popitem(last=False)
+
+
+def invalidate_patient_search_cache(self, demographic_no=None):
+    """
+    Removes cached EMR searches, after a document was tagged to a patient.
+
+    Args:
+        demographic_no (str, optional): Only remove the searches whose result contains this demographic,
+            and searches that found no patient. All searches are removed if not given.
+
+    Returns:
+        int: The number of cross-document cache entries removed.
+    """
+    self.config.set_shared_state('patient_search_cache', {})
+
+    demographic_no = str(demographic_no) if demographic_no else None
+
+    with _search_cache_lock:
+        keys = [key for key, (expires, result) in _search_cache.items()
+                if demographic_no is None or result is None
+                or any(record['demographicNo'] == demographic_no for record in result)]
+        for key in keys:
+            del _search_cache[key]
+
+    return len(keys)
 
 
 def filter_results(self):
@@ -487,45 +760,13 @@ def filter_results(self):
         (True, 'filtered_data')  # cleaned and filtered patient data
     """
     type_of_query = self.config.get_shared_state('type_of_query')
-    str_table = self.config.get_shared_state('type_of_query_table')
-
-    soup = BeautifulSoup(str_table, 'html.parser')
-
-    table = soup.find_all(class_="odd") + soup.find_all(class_="even")
+    records = self.config.get_shared_state('type_of_query_table') or []
 
     result_table_json = []
 
-    provider_no_pattern = re.compile(r'providerNo=(\d+)')
-
-    for parent in table:
-
-        demo_id = parent.find(class_='demoIdSearch')
-        name = parent.find(class_='name')
-        dob = parent.find(class_='dob')
-        links = parent.find(class_='links')
-
-        data = {}
-
-        if demo_id:
-            a_tag = demo_id.find('a')
-            if a_tag:
-                data['demographicNo'] = a_tag.get_text(strip=True)
+    for record in records:
 
-        if links:
-            a_tag = links.find('a')
-            if a_tag:
-                onclick_value = a_tag.get('onclick')
-                if onclick_value:
-                    match = provider_no_pattern.search(onclick_value)
-                    if match:
-                        provider_no = match.group(1)
-                        data['providerNo'] = provider_no
-
-        if name:
-            data['formattedName'] = name.get_text(strip=True)
-
-        if dob:
-            data['formattedDob'] = dob.get_text(strip=True)
+        data = {key: record[key] for key in ('demographicNo', 'providerNo', 'formattedName', 'formattedDob') if key in record}
 
         result, matched_data = self.compare_name_with_text(self,data,self.ocr_text)
 
@@ -541,10 +782,35 @@ def filter_results(self):
 
     if type_of_query is not None and result_table_json:
 
-        prompt = f"\n{table}.\n{self.ocr_text}.\n\n" + self.ai_prompts.get('get_patient_result_filter', '')
-        
-        result = self.query_prompt(self, prompt)
-        
+        selected = self.select_name_candidate(self, result_table_json)
+
+        if selected is not None:
+            text = json.dumps(selected)
+            self.config.set_shared_state(type_of_query+'filter', text)
+            return True,text
+
+        prompt = f"\n{table}.\n{self.get_prompt_text(self, 'get_patient_result_filter')}.\n\n" + self.ai_prompts.get('get_patient_result_filter', '')
+
+        if self.ai_prompt_schemas.get('get_patient_result_filter'):
+            # Constrained output is a single JSON object, so no follow-up prompt or repair is needed.
+            result = self.query_prompt_json(self, prompt, 'get_patient_result_filter')
+
+            if not result or not isinstance(result[1], dict):
+                return False
+
+            demographic_no = str(result[1].get('demographicNo', ''))
+            selected = next((item for item in result_table_json if item.get('demographicNo') == demographic_no), None)
+
+            if selected is None:
+                self.logger.info(f"LLM selected demographic ({demographic_no}) is not part of the search results.")
+                return False
+
+            text = json.dumps(selected)
+            self.config.set_shared_state(type_of_query+'filter', text)
+            return True,text
+
+        result = self.query_prompt(self, prompt, 'get_patient_result_filter')
+
         if isinstance(result, bool):
             return False
 
@@ -572,11 +838,18 @@ def filter_results(self):
                 if result:
                     matched_data_array.append(matched_data)
 
+            selected = None
+
             if len(matched_data_array) > 1:
+                selected = self.select_name_candidate(self, [json.loads(item) for item in matched_data_array])
+
+            if selected is not None:
+                text = json.dumps(selected)
+            elif len(matched_data_array) > 1:
                 result_matched_data_array = ', '.join(matched_data_array)
-                prompt = f"\n{result_matched_data_array}.\n{self.ocr_text}.\n\n" + self.ai_prompts.get('get_patient_result_filter', '')
+                prompt = f"\n{result_matched_data_array}.\n{self.get_prompt_text(self, 'get_patient_result_filter')}.\n\n" + self.ai_prompts.get('get_patient_result_filter', '')
         
-                result = self.query_prompt(self, prompt)
+                result = self.query_prompt(self, prompt, 'get_patient_result_filter')
                 
                 if isinstance(result, bool):
                     return False
@@ -641,6 +914,8 @@ def verify_demographic_number(self):
 
     This method retrieves the demographic number from the shared state, 
     decodes the JSON data, and verifies its existence using `verify_demographic_data`.
+    The demographic is always checked with a live EMR search, so a patient found in the local
+    demographic index is confirmed before the document is tagged.
 
     Returns:
         tuple:
@@ -654,20 +929,21 @@ def verify_demographic_number(self):
     """
     data = self.decode_json(self, self.config.get_shared_state('filter_results')[1], "verify_demographic_number")
 
-    return False if not data else self.verify_demographic_data(self, data)
+    return False if not data else self.verify_demographic_data(self, data, live=True)
 
-def verify_demographic_data(self, data):
+def verify_demographic_data(self, data, live=False):
     """
     Verify the presence of a patient's demographic data in the system.
 
     This function extracts demographic details (number, name, and date of birth) from the provided 
-    data dictionary and checks if they exist in the patient HTML table retrieved from the system.
+    data dictionary and checks them against the patient search records retrieved from the system.
 
     Args:
         data (dict): A dictionary containing patient demographic information with keys:
             - 'demographicNo' (str): The demographic number.
             - 'formattedName' (str): The formatted name.
             - 'formattedDob' (str): The formatted date of birth.
+        live (bool): Whether to check the EMR instead of the local demographic index.
 
     Returns:
         tuple:
@@ -685,22 +961,15 @@ def verify_demographic_data(self, data):
 
     type_of_query = "search_demographic_no"
 
-    table = self.get_patient_Html(self,type_of_query,demographic_no)
-
-    # Compile patterns once
-    demographic_pattern = re.compile(rf"\bdemographic_no={demographic_no}&\b")
-    dob_pattern = re.compile(rf"<td\s+class=\"dob\"\s*>{re.escape(dob)}</td>")
-    name_pattern = r'<td class="name">(.*?)</td>'
+    records = self.get_patient_Html(self,type_of_query,demographic_no,live)
 
+    record = next((item for item in records or [] if item['demographicNo'] == str(demographic_no)), None)
 
-    if table:
-        has_demographic_no = demographic_pattern.search(str(table))
-        has_dob_td = dob_pattern.search(str(table))
-        match = re.search(name_pattern, str(table))
+    if record is not None:
+        has_dob = record.get('formattedDob') == dob
+        text = record.get('formattedName')
 
-        if match:
-            text = match.group(1)
-        else:
+        if not text:
             return False
 
         text = re.sub(r'[.,]', '', text)
@@ -709,7 +978,7 @@ def verify_demographic_data(self, data):
         self.logger.info(f"Comparing LLM response name with demographic search result name.")
         result, matched_data = self.compare_name_with_text(self,data,text)
 
-        if has_demographic_no and has_dob_td and result:
+        if has_dob and result:
             self.logger.info(f"Verified demographic data with system data.")
             return True
     
@@ -719,91 +988,116 @@ def verify_demographic_data(self, data):
 
 
 
-def compare_demographic_results(self):
+def compare_demographic_results(self, checked=None):
     """
     Compares the demographic data (DOB, Name, and HIN) to determine if they match.
 
-    This method retrieves the demographic data from the shared state, decodes it, 
-    and compares the demographic numbers (demographicNo) across the different data types.
-    The function returns `True` if any combination of the data matches, and sets 
-    the shared state 'filter_results' with the matching data.
+    This method retrieves the demographic data from the shared state, decodes it, and groups the
+    candidates by demographic number (demographicNo). Each distinct demographic is verified with the
+    system once, however many of the searches found it. A demographic found by two or three searches
+    is accepted; otherwise the remaining candidates whose name appears in the document are confirmed
+    with a single LLM query (`select_demographic_results_llm`). The shared state 'filter_results' is
+    set with the matching data.
+
+    Args:
+        checked (dict, optional): The checks already done by `identify_patient`, keyed by demographicNo,
+            with the 'verified', 'name' and 'llm' results. These are reused instead of searching the EMR
+            or asking the LLM again, and a demographic already rejected by the LLM is not asked again.
 
     Returns:
         bool: True if demographic numbers match, False otherwise.
         dict or None: The matching demographic data or None if no match found.
     """
-    data_dob = self.config.get_shared_state('search_dobfilter')
-    data_name = self.config.get_shared_state('search_namefilter')
-    data_hin = self.config.get_shared_state('search_hinfilter')
+    candidates = {}
+    checked = checked or {}
+
+    # Candidates are kept in the order their data is preferred (DOB, name, HIN).
+    for label in ('dob', 'name', 'hin'):
+        data = self.decode_json(self, self.config.get_shared_state(f'search_{label}filter'), label)
+        if data is None:
+            continue
+        group = candidates.setdefault(str(data.get('demographicNo')), {'data': data, 'labels': []})
+        group['labels'].append(label)
+
+    # The demographic found by the most searches is verified first, the others are not needed if it matches.
+    for demographic_no, group in sorted(candidates.items(), key=lambda item: len(item[1]['labels']), reverse=True):
+        labels = ', '.join(label.upper() for label in group['labels'])
+        self.logger.info(f"Verifying LLM demographic data ({labels}) with system data.")
+
+        check = checked.get(demographic_no, {})
+        verified = check['verified'] if 'verified' in check else self.verify_demographic_data(self, group['data'])
+
+        if not verified:
+            del candidates[demographic_no]
+        elif len(group['labels']) > 1:
+            labels = ' and '.join(label.upper() for label in group['labels'])
+            self.logger.info(f"Match ({labels}) found when comparing filter result demographic number.")
+            self.config.set_shared_state('filter_results', (True, json.dumps(group['data'])))
+            return True, json.dumps(group['data'])
+
+    if not candidates:
+        self.logger.info(f"Demographic data not available or invalid.")
+        return False
 
-    data_dob = self.decode_json(self, data_dob, "dob")
-    data_name = self.decode_json(self, data_name, "name")
-    data_hin = self.decode_json(self, data_hin, "hin")
+    # Without agreement, the HIN candidate is preferred, then DOB, then name.
+    order = {'hin': 0, 'dob': 1, 'name': 2}
+    survivors = []
 
-    self.logger.info("Verifying LLM demographic data (DOB) with system data.")
-    if data_dob is not None and not self.verify_demographic_data(self, data_dob):
-        data_dob = None
+    for demographic_no, group in sorted(candidates.items(), key=lambda item: order[item[1]['labels'][0]]):
+        check = checked.get(demographic_no, {})
+        if check.get('name') is False or check.get('llm') is False:
+            continue
+        self.logger.info(f"Comparing LLM response name with document for {group['labels'][0].upper()}.")
+        if 'name' in check or self.compare_name_with_text(self, group['data'], self.ocr_text)[0]:
+            survivors.append(group['data'])
 
-    self.logger.info("Verifying LLM demographic data (Name) with system data.")
-    if data_name is not None and not self.verify_demographic_data(self, data_name):
-        data_name = None
+    selected = self.select_demographic_results_llm(self, survivors) if survivors else None
 
-    self.logger.info("Verifying LLM demographic data (HIN) with system data.")
-    if data_hin is not None and not self.verify_demographic_data(self, data_hin):
-        data_hin = None
+    if selected is None:
+        return False
 
+    self.config.set_shared_state('filter_results', (True, json.dumps(selected)))
+    return True, json.dumps(selected)
 
-    if not data_dob and not data_name and not data_hin:
-        self.logger.info(f"Demographic data not available or invalid.")
-        return False
 
-    # Check if all three demographic numbers match
-    if data_dob is not None and data_name is not None and data_hin is not None:
-        if data_dob.get('demographicNo') == data_name.get('demographicNo') == data_hin.get('demographicNo'):
-            self.logger.info("Match (all three) found when comparing demographic number.")
-            return True, json.dumps(data_dob)
-    
-    # Check if two demographic numbers match
-    if data_dob is not None and data_name is not None:
-        if data_dob.get('demographicNo') == data_name.get('demographicNo'):
-            self.config.set_shared_state('filter_results', (True, json.dumps(data_dob)))
-            self.logger.info("Match (dob and name) found when comparing filter result demographic number.")
-            return True, json.dumps(data_dob)
-    
-    if data_name is not None and data_hin is not None:
-        if data_name.get('demographicNo') == data_hin.get('demographicNo'):
-            self.config.set_shared_state('filter_results', (True, json.dumps(data_name)))
-            self.logger.info("Match (name and hin) found when comparing filter result demographic number.")
-            return True, json.dumps(data_name)
-    
-    if data_dob is not None and data_hin is not None:
-        if data_dob.get('demographicNo') == data_hin.get('demographicNo'):
-            self.config.set_shared_state('filter_results', (True, json.dumps(data_dob)))
-            self.logger.info("Match (dob and hin) found when comparing filter result demographic number.")
-            return True, json.dumps(data_dob)
-
-    if data_hin is not None:
-        self.logger.info(f"Comparing LLM response name with document for HIN.")
-        result, matched_data = self.compare_name_with_text(self,data_hin,self.ocr_text)
-        if result and self.compare_demographic_results_llm(self, data_hin):
-            self.config.set_shared_state('filter_results', (result, matched_data))
-            return result, matched_data
-
-    if data_dob is not None:
-        self.logger.info(f"Comparing LLM response name with document for DOB.")
-        result, matched_data = self.compare_name_with_text(self,data_dob,self.ocr_text)
-        if result and self.compare_demographic_results_llm(self, data_dob):
-            self.config.set_shared_state('filter_results', (result, matched_data))
-            return result, matched_data
-
-    if data_name is not None:
-        self.logger.info(f"Comparing LLM response name with document for NAME.")
-        result, matched_data = self.compare_name_with_text(self,data_name,self.ocr_text)
-        if result and self.compare_demographic_results_llm(self, data_name):
-            self.config.set_shared_state('filter_results', (result, matched_data))
-            return result, matched_data
+def select_demographic_results_llm(self, candidates):
+    """
+    Asks the LLM once which of the verified candidates is the patient of the document.
 
-    return False
+    A single candidate is confirmed with `compare_demographic_results_llm`. Several candidates are sent
+    together in the `select_demographic_results_llm` prompt; if that prompt is not configured, they are
+    confirmed one at a time, in order, as before.
+
+    Args:
+        candidates (list): The candidate dictionaries, preferred first.
+
+    Returns:
+        dict or None: The confirmed candidate, or `None` if the LLM confirms none of them.
+
+    Example:
+        >>> manager.select_demographic_results_llm(manager, [data_hin, data_dob])
+        {'demographicNo': '123', 'formattedName': 'DOE, JOHN', ...}
+    """
+    if len(candidates) == 1 or not self.ai_prompts.get('select_demographic_results_llm'):
+        return next((data for data in candidates if self.compare_demographic_results_llm(self, data)), None)
+
+    prompt = f"\n{self.get_prompt_text(self, 'select_demographic_results_llm')}\n\n" + self.ai_prompts.get('select_demographic_results_llm', '') + f"\n {json.dumps(candidates)} \n"
+
+    if self.ai_prompt_schemas.get('select_demographic_results_llm'):
+        result = self.query_prompt_json(self, prompt, 'select_demographic_results_llm')
+        demographic_no = str(result[1].get('demographicNo', '')) if result and isinstance(result[1], dict) else ''
+        selected = next((data for data in candidates if str(data.get('demographicNo')) == demographic_no), None)
+    else:
+        result = self.query_prompt(self, prompt, 'select_demographic_results_llm')
+        text = '' if isinstance(result, bool) else result[1]
+        selected = next((data for data in candidates if re.search(rf"\b{re.escape(str(data.get('demographicNo')))}\b", text)), None)
+
+    if selected is None:
+        self.logger.info(f"None of the {len(candidates)} demographic candidates was confirmed by LLM.")
+    else:
+        self.logger.info(f"Demographic {selected.get('demographicNo')} selected by LLM from {len(candidates)} candidates.")
+
+    return selected
 
 def compare_demographic_results_llm(self, data):
     """
@@ -822,9 +1116,19 @@ def compare_demographic_results_llm(self, data):
         bool: True if the LLM's response contains the word 'yes' followed by any characters,
               indicating a positive match. False otherwise, or if the result is not a valid boolean.
     """
-    prompt = f"\n{self.ocr_text}\n\n" + self.ai_prompts.get('compare_demographic_results_llm', '') + f"\n {data} \n"
+    prompt = f"\n{self.get_prompt_text(self, 'compare_demographic_results_llm')}\n\n" + self.ai_prompts.get('compare_demographic_results_llm', '') + f"\n {data} \n"
 
-    result = self.query_prompt(self, prompt)
+    if self.ai_prompt_schemas.get('compare_demographic_results_llm'):
+        result = self.query_prompt_json(self, prompt, 'compare_demographic_results_llm')
+
+        if result and result[1].get('match') is True:
+            self.logger.info(f"Demographic data verified by LLM and matches the document.")
+            return True
+
+        self.logger.info(f"Demographic data verified by LLM and does not match with the document.")
+        return False
+
+    result = self.query_prompt(self, prompt, 'compare_demographic_results_llm')
 
     if isinstance(result, bool):
         return False
@@ -848,9 +1152,13 @@ def compare_demographic_results_llm(self, data):
 def compare_name_with_text(self, data, text):
     """
     Function to compare the formattedName from the provided data with the OCR text.
+
+    The text is tokenized once by its `NameMatcher` (kept for the document when it is the OCR text), and
+    the name parts are looked up in its word set.
     
     Args:
         data (dict): The data dictionary containing 'formattedName'.
+        text (str): The text to look for the name in.
     
     Returns:
         tuple: (True, data) if a match is found, (False,) otherwise.
@@ -862,11 +1170,12 @@ def compare_name_with_text(self, data, text):
             name = re.sub(r'\s+', ' ', name)   # Normalize multiple spaces to a single space
             name_parts = name.split()          # Split the name into parts
             flag = False
+            matcher = self.get_name_matcher(self, text)
 
             # Check if all part length
             if all(len(part) <= 3 for part in name_parts):
                 # Check if every part except for one in the name_parts has a match in OCR
-                missing_parts_count = sum(1 for part in name_parts if not re.search(r'\b' + re.escape(part) + r'\b', text, re.IGNORECASE))
+                missing_parts_count = sum(1 for part in name_parts if not matcher.contains(part))
 
                 if missing_parts_count <= 1:
                     flag = True
@@ -875,17 +1184,14 @@ def compare_name_with_text(self, data, text):
                 parts_count = 0
                 for part in name_parts:
                     if len(part) > 3:  # Only check for parts longer than 3 characters
-                        match = re.search(r'\b' + re.escape(part) + r'\b', text, re.IGNORECASE)
-                        if match:
+                        if matcher.contains(part):
                             flag = True
                     if len(part) == 3:
-                        match = re.search(r'\b' + re.escape(part) + r'\b', text, re.IGNORECASE)
-                        if match:
+                        if matcher.contains(part):
                             parts_count += 1
                             if parts_count >= 2:
                                 year = data.get('formattedDob').split('-')[0]
-                                match = re.search(r'\b[-/.]*' + re.escape(year) + r'[-/.]*\b', text, re.IGNORECASE)
-                                if match:
+                                if matcher.contains(year):
                                     flag = True
             
             if flag:
@@ -0,0 +1,140 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import re
+from html.parser import HTMLParser
+
+PROVIDER_NO_PATTERN = re.compile(r'providerNo=(\d+)')
+
+# Result table cells kept in the search records, by cell class.
+CELL_FIELDS = {
+    'name': 'formattedName',
+    'dob': 'formattedDob',
+    'rosterStatus': 'rosterStatus',
+    'doctor': 'doctor'
+}
+
+
+class DemographicSearchParser(HTMLParser):
+    """
+    Streaming parser for the EMR demographic search result page.
+
+    Only the result rows (`<tr class="odd|even">`) are read; each becomes a record with the demographic
+    number (link text of the `demoIdSearch` cell), name, date of birth, roster status, doctor and the
+    `providerNo` of the `links` cell. The rest of the page is skipped without building a document tree.
+
+    Attributes:
+        records (list): The parsed records, in page order.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.records = []
+        self._record = None
+        self._cell = None
+        self._in_link = False
+        self._text = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag == 'tr':
+            classes = (dict(attrs).get('class') or '').split()
+            self._record = {} if 'odd' in classes or 'even' in classes else None
+        elif self._record is None:
+            return
+        elif tag == 'td':
+            self._cell = (dict(attrs).get('class') or '').split()[0] if dict(attrs).get('class') else None
+            self._text = []
+        elif tag == 'a':
+            self._in_link = True
+            if self._cell == 'links' and 'providerNo' not in self._record:
+                attributes = dict(attrs)
+                match = PROVIDER_NO_PATTERN.search(f"{attributes.get('onclick') or ''} {attributes.get('href') or ''}")
+                if match:
+                    self._record['providerNo'] = match.group(1)
+
+    def handle_endtag(self, tag):
+        if self._record is None:
+            return
+        if tag == 'a':
+            self._in_link = False
+        elif tag == 'td':
+            self._end_cell()
+        elif tag == 'tr':
+            self._end_cell()
+            if self._record.get('demographicNo'):
+                self.records.append(self._record)
+            self._record = None
+
+    def handle_data(self, data):
+        if self._record is None or self._cell is None:
+            return
+        if self._cell == 'demoIdSearch' and not self._in_link:
+            return
+        if data.strip():
+            self._text.append(data.strip())
+
+    def _end_cell(self):
+        if self._cell == 'demoIdSearch' and 'demographicNo' not in self._record:
+            self._record['demographicNo'] = ''.join(self._text)
+        elif self._cell in CELL_FIELDS:
+            self._record[CELL_FIELDS[self._cell]] = ''.join(self._text)
+        self._cell = None
+        self._text = []
+
+
+def parse_demographic_search(text):
+    """
+    Parses an EMR demographic search result page into compact records.
+
+    Args:
+        text (str): The search result page.
+
+    Returns:
+        list: The records (`demographicNo`, `formattedName`, `formattedDob`, `providerNo`, `rosterStatus`,
+        `doctor`; cells missing from the page are left out), in page order.
+
+    Example:
+        >>> parse_demographic_search('<tr class="odd"><td class="demoIdSearch"><a>12</a></td><td class="name">DOE, JOHN</td></tr>')
+        [{'demographicNo': '12', 'formattedName': 'DOE, JOHN'}]
+    """
+    parser = DemographicSearchParser()
+    parser.feed(text or '')
+    parser.close()
+    return parser.records
+
+
+def merge_demographic_records(*record_lists):
+    """
+    Merges search records, keeping the first record of each demographic number.
+
+    Args:
+        *record_lists (list): Lists of search records, or `None`.
+
+    Returns:
+        list: The distinct records, in order.
+    """
+    merged = []
+    seen = set()
+    for records in record_lists:
+        for record in records or []:
+            if record['demographicNo'] not in seen:
+                seen.add(record['demographicNo'])
+                merged.append(record)
+    return merged
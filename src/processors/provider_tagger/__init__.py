@@ -19,6 +19,6 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
-from .provider import get_provider_list, get_provider_list_filemode
+from .provider import get_provider_list, get_provider_list_filemode, match_provider_candidates
 
-__all__ = ['get_provider_list', 'get_provider_list_filemode']
+__all__ = ['get_provider_list', 'get_provider_list_filemode', 'match_provider_candidates']
@@ -19,10 +19,14 @@
 # source code can be acquired publicly in its latest most up-to-date version, within one month.
 # ***
 
+import os
 import re
 import yaml
 from config import ProviderListManager
 
+# Compiled provider name matchers, keyed by provider list file path and modification time.
+_provider_matchers = {}
+
 def get_provider_list(self):
     """
     Retrieves a provider ID from the OCR text or defaults to a pre-configured provider ID.
@@ -59,10 +63,21 @@ def get_provider_list(self):
         #If provider list is empty return default provider id for notifiying
         return True, default_provider_id
 
+    if self.config.get('provider_list.prefilter', False):
+        candidates, confident = self.match_provider_candidates(self, file_name, provider_list)
+
+        if confident:
+            self.logger.info(f"Provider {candidates[0]['first_name']} {candidates[0]['last_name']} found in the document, skipping LLM query.")
+            return True, int(candidates[0]['provider_no'])
+
+        if candidates:
+            self.logger.info(f"Sending a shortlist of {len(candidates)} providers found in the document to the LLM.")
+            provider_list = candidates
+
     prompt = self.ai_prompts.get('get_provider', '')
 
-    prompt = f"\n{self.ocr_text}.\n" + prompt + str(provider_list)
-    text = self.query_prompt(self,prompt)[1]
+    prompt = f"\n{self.get_prompt_text(self, 'get_provider')}.\n" + prompt + str(provider_list)
+    text = self.query_prompt(self,prompt,'get_provider')[1]
 
     match = re.search(r'\b\d+\b', text)
 
@@ -77,6 +92,64 @@ def get_provider_list(self):
 
 
 
+def match_provider_candidates(self, file_path, provider_list):
+    """
+    Finds the providers whose surname appears in the OCR text, with a single precompiled regular expression.
+
+    The combined surname pattern is compiled once per provider list file and reused until the file changes.
+    A provider is a confident match when its first name (or a 'Dr' title) appears next to its surname.
+
+    Args:
+        file_path (str): The path of the provider list file, used to cache the compiled pattern.
+        provider_list (list): The providers loaded from the provider list file.
+
+    Returns:
+        tuple:
+            - list: The provider list entries whose surname was found in the document.
+            - bool: `True` if exactly one provider was found and the match is confident.
+
+    Example:
+        >>> candidates, confident = manager.match_provider_candidates(manager, file_name, provider_list)
+        >>> print(candidates, confident)
+        [{'first_name': 'William', 'last_name': 'Osler', 'provider_no': '3'}] True
+    """
+    try:
+        key = (file_path, os.path.getmtime(file_path))
+    except OSError:
+        key = (file_path, None)
+
+    if key not in _provider_matchers:
+        surnames = {}
+        for provider in provider_list:
+            last_name = str(provider.get('last_name') or '').strip().lower()
+            if len(last_name) > 1:
+                surnames.setdefault(last_name, []).append(provider)
+        alternatives = '|'.join(re.escape(name) for name in sorted(surnames, key=len, reverse=True))
+        pattern = re.compile(r'\b(' + alternatives + r')\b', re.IGNORECASE) if alternatives else None
+        _provider_matchers.clear()
+        _provider_matchers[key] = (pattern, surnames)
+
+    pattern, surnames = _provider_matchers[key]
+
+    if pattern is None or not self.ocr_text:
+        return [], False
+
+    candidates = {}
+    confident = set()
+
+    for match in pattern.finditer(self.ocr_text):
+        context = self.ocr_text[max(0, match.start() - 40):match.end() + 40].lower()
+        for provider in surnames[match.group(1).lower()]:
+            provider_no = str(provider.get('provider_no'))
+            candidates.setdefault(provider_no, provider)
+            first_name = str(provider.get('first_name') or '').split(' ')[0].lower()
+            if (first_name and re.search(r'\b' + re.escape(first_name) + r'\b', context)) or re.search(r'\bdr\b\.?\s*' + re.escape(match.group(1).lower()), context):
+                confident.add(provider_no)
+
+    shortlist = list(candidates.values())
+    return shortlist, len(shortlist) == 1 and str(shortlist[0].get('provider_no')) in confident
+
+
 def get_provider_list_filemode(self,file_path):
     """
     Loads the provider list from a YAML file.
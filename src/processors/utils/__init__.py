@@ -20,9 +20,14 @@
 # ***
 
 from .local_files import get_local_documents
-from .ocr import has_ocr, extract_text_doctr, extract_text_doctr_api, extract_text_from_pdf_file
-from .llm import query_prompt
+from .ocr import has_ocr, extract_text_doctr, extract_text_doctr_api, extract_text_from_pdf_file, compact_ocr_text
+from .llm import query_prompt, query_prompt_json, send_prompt, get_prompt_tiers, get_tier_option, validate_tier_response, record_tier_stats
+from .llm_balancer import LLMEndpoint, LLMEndpointPool, get_llm_pool
+from .llm_usage import record_llm_usage
+from .token_budget import count_tokens, fit_text_to_budget, get_prompt_text
+from .circuit_breaker import CircuitBreaker, LLMUnavailableError, LLMCircuitOpenError, get_llm_circuit_breaker, defer_document, complete_deferred_document
+from .document_spool import DocumentSpool, get_document_spool, prefetch_documents, finish_prefetch, get_spooled_document, fetch_document
 from .pif import query_pif, get_fht_tickler_config, update_fht_tickler_config, get_postal_code_category, new_patient_details, update_patient_details, search_patient, create_tickler, fill_element
 from .pdf_processor import pif_pdf
 
-__all__ = ['get_local_documents' , 'has_ocr', 'extract_text_from_pdf_file', 'extract_text_doctr', 'extract_text_doctr_api', 'query_prompt', 'query_pif','get_aimoa_status_report', 'get_lines_after_last_match', 'get_postal_code_category', 'new_patient_details', 'update_patient_details', 'search_patient', 'create_tickler', 'get_fht_tickler_config', 'update_fht_tickler_config', 'fill_element', 'pif_pdf']
+__all__ = ['get_local_documents' , 'has_ocr', 'extract_text_from_pdf_file', 'extract_text_doctr', 'extract_text_doctr_api', 'compact_ocr_text', 'query_prompt', 'query_prompt_json', 'send_prompt', 'get_prompt_tiers', 'get_tier_option', 'validate_tier_response', 'record_tier_stats', 'record_llm_usage', 'LLMEndpoint', 'LLMEndpointPool', 'get_llm_pool', 'CircuitBreaker', 'LLMUnavailableError', 'LLMCircuitOpenError', 'get_llm_circuit_breaker', 'defer_document', 'complete_deferred_document', 'DocumentSpool', 'get_document_spool', 'prefetch_documents', 'finish_prefetch', 'get_spooled_document', 'fetch_document', 'count_tokens', 'fit_text_to_budget', 'get_prompt_text', 'query_pif','get_aimoa_status_report', 'get_lines_after_last_match', 'get_postal_code_category', 'new_patient_details', 'update_patient_details', 'search_patient', 'create_tickler', 'get_fht_tickler_config', 'update_fht_tickler_config', 'fill_element', 'pif_pdf']
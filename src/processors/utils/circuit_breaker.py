@@ -0,0 +1,228 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import os
+import json
+import time
+import logging
+import threading
+import datetime
+
+logger = logging.getLogger(__name__)
+
+# One breaker per model tier for the process, shared by every workflow run, so an LLM outage is remembered across documents.
+_breakers = {}
+_breaker_lock = threading.Lock()
+_queue_lock = threading.Lock()
+
+
+class LLMUnavailableError(SystemExit):
+    """
+    Raised when the LLM cannot be reached or the circuit breaker is open.
+
+    It is a `SystemExit`, so the workflow run stops as for other LLM errors, but the document is deferred
+    instead of consuming one of its retries, up to `llm_circuit_breaker.max_deferrals` times.
+    """
+
+
+class LLMCircuitOpenError(LLMUnavailableError):
+    """
+    Raised when the circuit breaker is open and the request was not sent to the LLM.
+
+    The document did not cause the failure, so deferring it does not count towards its deferral limit.
+    """
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker around the LLM client.
+
+    After `failure_threshold` consecutive failed LLM requests the breaker opens and requests fail fast.
+    Once `reset_timeout` seconds have passed, a single trial request is let through (half open); its
+    success closes the breaker and its failure opens it again.
+
+    Attributes:
+        failure_threshold (int): Consecutive failures that open the breaker.
+        reset_timeout (float): Seconds the breaker stays open before a trial request.
+        failures (int): Number of consecutive failures.
+        opened_at (float or None): Time the breaker opened, `None` while closed.
+    """
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 120):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.trial_in_progress = False
+        self.lock = threading.Lock()
+
+    def is_open(self) -> bool:
+        """
+        Returns `True` while the breaker is open and the reset timeout has not passed.
+        """
+        with self.lock:
+            return self.opened_at is not None and time.monotonic() - self.opened_at < self.reset_timeout
+
+    def allow(self) -> bool:
+        """
+        Returns `True` if a request may be sent to the LLM.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at < self.reset_timeout or self.trial_in_progress:
+                return False
+            self.trial_in_progress = True
+            return True
+
+    def record_success(self) -> None:
+        with self.lock:
+            if self.opened_at is not None:
+                logger.info("LLM circuit breaker closed.")
+            self.failures = 0
+            self.opened_at = None
+            self.trial_in_progress = False
+
+    def record_failure(self) -> None:
+        with self.lock:
+            self.failures += 1
+            if self.trial_in_progress or self.failures >= self.failure_threshold:
+                if self.opened_at is None or self.trial_in_progress:
+                    logger.info(f"LLM circuit breaker opened after {self.failures} failures.")
+                self.opened_at = time.monotonic()
+            self.trial_in_progress = False
+
+
+def get_llm_circuit_breaker(self, tier=None):
+    """
+    Returns the process-wide LLM circuit breaker of a model tier, configured in `llm_circuit_breaker`.
+
+    Args:
+        tier (str, optional): The model tier, `None` for the default model.
+
+    Returns:
+        CircuitBreaker: The LLM circuit breaker.
+    """
+    with _breaker_lock:
+        if tier not in _breakers:
+            _breakers[tier] = CircuitBreaker(
+                self.config.get('llm_circuit_breaker.failure_threshold', 3),
+                self.config.get('llm_circuit_breaker.reset_timeout', 120)
+            )
+    return _breakers[tier]
+
+
+def _load_deferred(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (IOError, ValueError):
+        return []
+
+
+def _save_deferred(file_path, documents):
+    temp_path = f"{file_path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as file:
+        json.dump(documents, file, indent=2)
+    os.replace(temp_path, file_path)
+
+
+def defer_document(self, breaker_open=False):
+    """
+    Parks the current document in the deferred queue because the LLM is unavailable.
+
+    The retry taken when the document was fetched is given back, so an LLM outage does not push the
+    document to `max_retries` and the unidentified patient. The inbox position is not advanced, so the
+    document is the next one processed once the circuit breaker closes.
+
+    The queue file keeps the number of failed LLM requests (deferrals) of each document. A document whose
+    own requests keep failing, for example a prompt that always times out, is deferred at most
+    `llm_circuit_breaker.max_deferrals` times; after that its retries are used as for any other error, so
+    it reaches `max_retries` instead of blocking the inbox. Requests refused by an open breaker are not
+    counted.
+
+    Args:
+        breaker_open (bool): Whether the request was refused because the circuit breaker is open.
+
+    Returns:
+        bool: `True` if the document was deferred and its retry given back.
+
+    Example:
+        >>> manager.defer_document(breaker_open=True)
+        True
+    """
+    if not self.file_name:
+        return False
+
+    system_type = self.config.get('emr.document_folder')
+    file_path = self.config.get('llm_circuit_breaker.deferred_queue_file', '../config/deferred_documents.json')
+    max_deferrals = self.config.get('llm_circuit_breaker.max_deferrals', 5)
+
+    with _queue_lock:
+        documents = _load_deferred(file_path)
+        document = next((document for document in documents if str(document['document']) == str(self.file_name)), None)
+        if document is None:
+            document = {"document": str(self.file_name), "folder": system_type, "deferrals": 0}
+            documents.append(document)
+        if not breaker_open:
+            document['deferrals'] = document.get('deferrals', 0) + 1
+        document['deferred_at'] = str(datetime.datetime.now().replace(microsecond=0))
+        try:
+            _save_deferred(file_path, documents)
+        except (IOError, OSError) as e:
+            self.logger.error(f"Error saving deferred document queue: {e}")
+
+    if not breaker_open and document['deferrals'] > max_deferrals:
+        self.logger.info(f"LLM unavailable, Document No. {self.file_name} already deferred {max_deferrals} times, the retry is used.")
+        return False
+
+    if system_type == 'pending':
+        self.config.update_pending_retries(max(0, self.config.get('file_processing.pending_retries', 0) - 1))
+    else:
+        self.config.update_incoming_retries(max(0, self.config.get('file_processing.incoming_retries', 0) - 1))
+
+    self.logger.info(f"LLM unavailable, Document No. {self.file_name} deferred without using a retry ({document['deferrals']} of {max_deferrals} deferrals).")
+    return True
+
+
+def complete_deferred_document(self):
+    """
+    Removes the current document from the deferred queue once it has been processed.
+
+    Returns:
+        bool: `True` if the document was in the deferred queue.
+    """
+    file_path = self.config.get('llm_circuit_breaker.deferred_queue_file', '../config/deferred_documents.json')
+
+    if not os.path.exists(file_path):
+        return False
+
+    with _queue_lock:
+        documents = _load_deferred(file_path)
+        remaining = [document for document in documents if str(document['document']) != str(self.file_name)]
+        if len(remaining) == len(documents):
+            return False
+        try:
+            _save_deferred(file_path, remaining)
+        except (IOError, OSError) as e:
+            self.logger.error(f"Error saving deferred document queue: {e}")
+
+    self.logger.info(f"Deferred Document No. {self.file_name} processed, {len(remaining)} document(s) left in the deferred queue.")
+    return True
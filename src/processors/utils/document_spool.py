@@ -0,0 +1,312 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import os
+import json
+import time
+import hashlib
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Spools and the background download pool are kept for the lifetime of the process, so documents
+# prefetched during one workflow run are found by the next runs.
+_spools = {}
+_spools_lock = threading.Lock()
+_executor = None
+_pending = {}
+_pending_lock = threading.Lock()
+
+
+class DocumentSpool:
+    """
+    Bounded on-disk spool of prefetched EMR documents.
+
+    Each document is stored as `<key>.pdf` with a `<key>.json` metadata file (name, URL, SHA-256 content
+    hash, size and fetch time), the key being the SHA-256 hash of the document URL. Files are written
+    atomically and the content hash is checked when a document is read, so a partly written or corrupted
+    file is never handed to the workflow. When more than `max_documents` documents are spooled, the
+    oldest are removed.
+
+    Attributes:
+        directory (str): The spool directory.
+        max_documents (int): Maximum number of spooled documents.
+    """
+    def __init__(self, directory, max_documents=5):
+        """
+        Opens the spool, creating its directory if needed.
+
+        Args:
+            directory (str): The spool directory.
+            max_documents (int): Maximum number of spooled documents. Defaults to 5.
+        """
+        self.directory = directory
+        self.max_documents = max_documents
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, url, extension):
+        return os.path.join(self.directory, hashlib.sha256(url.encode('utf-8')).hexdigest() + extension)
+
+    def _write(self, path, data):
+        temporary = f"{path}.tmp"
+        with open(temporary, 'wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def _remove(self, url):
+        for extension in ('.pdf', '.json'):
+            try:
+                os.remove(self._path(url, extension))
+            except FileNotFoundError:
+                pass
+
+    def metadata(self):
+        """
+        Returns the metadata of the spooled documents, oldest first.
+        """
+        documents = []
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, file_name), 'r', encoding='utf-8') as file:
+                    documents.append(json.load(file))
+            except (OSError, ValueError):
+                continue
+        return sorted(documents, key=lambda item: item.get('fetched', 0))
+
+    def contains(self, url):
+        """
+        Returns whether the document of the URL is spooled.
+        """
+        return os.path.exists(self._path(url, '.json'))
+
+    def put(self, url, name, content):
+        """
+        Stores a document and removes the oldest documents above `max_documents`.
+
+        Args:
+            url (str): The document URL.
+            name: The document name (pending document number or incoming file name).
+            content (bytes): The document content.
+        """
+        metadata = {
+            'name': str(name),
+            'url': url,
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'size': len(content),
+            'fetched': time.time()
+        }
+
+        with self._lock:
+            self._write(self._path(url, '.pdf'), content)
+            self._write(self._path(url, '.json'), json.dumps(metadata).encode('utf-8'))
+
+            documents = self.metadata()
+            for document in documents[:max(0, len(documents) - self.max_documents)]:
+                self._remove(document['url'])
+
+    def get(self, url, discard=False):
+        """
+        Returns a spooled document.
+
+        Args:
+            url (str): The document URL.
+            discard (bool): Whether to remove the document from the spool.
+
+        Returns:
+            bytes or None: The document content, or `None` if it is not spooled or its content hash does not match.
+        """
+        with self._lock:
+            try:
+                with open(self._path(url, '.json'), 'r', encoding='utf-8') as file:
+                    metadata = json.load(file)
+                with open(self._path(url, '.pdf'), 'rb') as file:
+                    content = file.read()
+            except (OSError, ValueError):
+                return None
+
+            valid = hashlib.sha256(content).hexdigest() == metadata.get('sha256')
+
+            if discard or not valid:
+                self._remove(url)
+
+        return content if valid else None
+
+
+def get_document_spool(self):
+    """
+    Returns the document spool set in `document_spool.directory`, or `None` if prefetching is disabled.
+
+    Returns:
+        DocumentSpool or None: The spool.
+    """
+    if not self.config.get('document_spool.enabled', False):
+        return None
+
+    directory = self.config.get('document_spool.directory', '../config/document_spool')
+
+    with _spools_lock:
+        spool = _spools.get(directory)
+        if spool is None:
+            spool = DocumentSpool(directory, self.config.get('document_spool.size', 5))
+            _spools[directory] = spool
+
+    return spool
+
+
+def prefetch_documents(self, documents):
+    """
+    Downloads the next inbox documents into the spool in the background.
+
+    The documents are downloaded by a background thread pool (`document_spool.concurrency`) with the EMR
+    client, while the workflow works on the current document. Documents already spooled or being
+    downloaded are skipped. Only the first `document_spool.size` documents are prefetched. The downloads
+    use the session of the current run, so they are finished with `finish_prefetch` before it is closed.
+
+    Args:
+        documents (list): The next documents, in processing order, each a dictionary with `name` and `url`.
+
+    Returns:
+        int: The number of downloads started.
+    """
+    global _executor
+
+    spool = self.get_document_spool(self)
+
+    if spool is None:
+        return 0
+
+    emr_client = self.emr_client
+    headers = dict(self.headers)
+    logger = self.logger
+    started = 0
+
+    def download(document):
+        try:
+            response = emr_client.get(document['url'], headers=dict(headers, Referer=document['url']), count_latency=False)
+            if response.status_code == 200 and response.content:
+                spool.put(document['url'], document['name'], response.content)
+                logger.debug(f"Prefetched document {document['name']}.")
+            else:
+                logger.info(f"Could not prefetch document {document['name']}: {response.status_code}")
+        except Exception as e:
+            logger.info(f"Could not prefetch document {document['name']}: {e}")
+        finally:
+            with _pending_lock:
+                _pending.pop(document['url'], None)
+
+    with _pending_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=self.config.get('document_spool.concurrency', 2), thread_name_prefix='document-spool')
+
+        for document in documents[:spool.max_documents]:
+            if document['url'] in _pending or spool.contains(document['url']):
+                continue
+            _pending[document['url']] = _executor.submit(download, document)
+            started += 1
+
+    if started:
+        self.logger.info(f"Prefetching {started} upcoming documents.")
+
+    return started
+
+
+def finish_prefetch(self):
+    """
+    Cancels the prefetches not started yet and waits for the downloads in progress.
+
+    Called when the workflow run ends, before its EMR session is closed, so no download keeps using the
+    closed session. The cancelled documents are prefetched again by the next run.
+
+    Returns:
+        int: The number of prefetches cancelled.
+
+    Example:
+        >>> manager.finish_prefetch(manager)
+        0
+    """
+    with _pending_lock:
+        cancelled = [url for url, download in _pending.items() if download.cancel()]
+        for url in cancelled:
+            del _pending[url]
+        running = list(_pending.values())
+
+    if running:
+        self.logger.info(f"Waiting for {len(running)} document prefetch(es) to finish.")
+        wait(running, timeout=self.config.get('general_setting.timeout', 300))
+
+    return len(cancelled)
+
+
+def get_spooled_document(self, url, discard=False):
+    """
+    Returns a document from the spool, or `None` if it is not spooled (or spooling is disabled).
+
+    If the document is being prefetched, the download in progress is waited for instead of starting another.
+
+    Args:
+        url (str): The document URL.
+        discard (bool): Whether to remove the document from the spool, once it is being processed.
+
+    Returns:
+        bytes or None: The document content.
+    """
+    spool = self.get_document_spool(self)
+
+    if spool is None:
+        return None
+
+    with _pending_lock:
+        download = _pending.get(url)
+
+    if download is not None:
+        download.result()
+
+    return spool.get(url, discard)
+
+
+def fetch_document(self, url):
+    """
+    Fetches an EMR document, from the spool when it was prefetched, otherwise with a request.
+
+    Args:
+        url (str): The document URL.
+
+    Returns:
+        bytes or None: The document content, or `None` if it could not be fetched.
+
+    Example:
+        >>> content = manager.fetch_document(manager, f"{manager.base_url}/dms/ManageDocument.do?method=display&doc_no=12")
+    """
+    content = self.get_spooled_document(self, url, discard=True)
+
+    if content is not None:
+        self.logger.info("Document taken from the prefetch spool.")
+        return content
+
+    response = self.emr_client.get(url, headers=dict(self.headers, Referer=url), count_latency=False)
+
+    if response.status_code == 200 and response.content:
+        return response.content
+
+    self.logger.error(f"An error occurred: {response.status_code}")
+    return None
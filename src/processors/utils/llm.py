@@ -20,10 +20,20 @@
 # ***
 
 import datetime
+import json
+import math
+import re
+import threading
+import time
 import requests
 from requests.exceptions import Timeout, RequestException
+from .circuit_breaker import LLMUnavailableError, LLMCircuitOpenError
 
-def query_prompt(self,prompt):
+# Request count, latency and escalations per model tier, kept for the lifetime of the process.
+_tier_stats = {}
+_tier_stats_lock = threading.Lock()
+
+def query_prompt(self,prompt,prompt_key=None):
     """
     Sends a prompt to the AI model and retrieves the generated response.
 
@@ -36,11 +46,25 @@ def query_prompt(self,prompt):
     - Configuration values such as the chat template, model, temperature, character, and top-p are 
       retrieved from the application settings.
     
-    The request is made via a POST request to a specified URL, and the response content from the model 
-    is returned as part of a tuple.
+    The request is made via a POST request to a specified URL, and the response content from the model
+    is returned as part of a tuple. When several LLM endpoints are configured (`ai.endpoints`), the request
+    is routed to the healthy endpoint with the fewest outstanding requests and retried on the other
+    endpoints if it fails. Failed requests are counted by the LLM circuit breaker; while it is open, requests
+    fail fast with `LLMUnavailableError` and the document is deferred.
+
+    The token usage, server timings and wall time of each request are recorded per workflow step and prompt
+    key when `llm_usage.enabled` is set (see `record_llm_usage`).
+
+    Prompts listed in `ai_prompt_tiers` are sent to a smaller model tier (`llm.tiers`) first, and escalated
+    to the default model when the reply fails validation (see `validate_tier_response`).
+
+    If a `prompt_key` is given and `ai_prompt_schemas` in the workflow configuration defines a `schema`
+    or `grammar` for it, the output of the model is constrained to that JSON schema (sent as an
+    OpenAI-compatible `response_format`) or GBNF grammar (sent in the `llm.grammar_field` field).
 
     Args:
         prompt (str): The prompt text to be sent to the AI model.
+        prompt_key (str, optional): The `ai_prompts` key the prompt was built from.
 
     Returns:
         tuple: 
@@ -53,7 +77,7 @@ def query_prompt(self,prompt):
             (True, "The weather is sunny with a temperature of 25°C.")
         
     Raises:
-        requests.exceptions.RequestException: If there is an issue with the HTTP request.
+        LLMUnavailableError: If the LLM cannot be reached or the circuit breaker is open.
     """
     data = {
         "messages": [
@@ -68,26 +92,272 @@ def query_prompt(self,prompt):
         "character": self.config.get('llm.character'),
         "top_p": self.config.get('llm.top_p')
     }
+
+    constraint = self.ai_prompt_schemas.get(prompt_key) if prompt_key else None
+    if constraint:
+        if constraint.get('grammar'):
+            data[self.config.get('llm.grammar_field', 'grammar')] = constraint['grammar']
+        elif constraint.get('schema'):
+            data['response_format'] = {
+                "type": "json_schema",
+                "json_schema": {"name": prompt_key, "strict": True, "schema": constraint['schema']}
+            }
+
     log_llm_response = self.config.get('llm.log_responses', False)
 
-    try:
-        response = requests.post(self.url, headers=self.headers, json=data, verify=self.config.get('ai.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
-    except Timeout:
-        self.config.update_lock_status(False)
-        self.logger.info(f"Lock released.")
-        self.logger.info(f"An error occurred waiting for LLM response, exceeded time out. Stopping task processing Document No. {self.file_name}")
-        raise SystemExit("Stopping task due to LLM timed out.")
-    except RequestException as e:
-        self.config.update_lock_status(False)
-        self.logger.info(f"Lock released.")
-        self.logger.info(f"An error occurred waiting for LLM response, LLM Request Exception. Stopping task processing Document No. {self.file_name}")
-        raise SystemExit("Stopping task due to LLM Request Exception.")
+    tiers = self.get_prompt_tiers(self, prompt_key)
+
+    # Try the cheaper model tiers first, escalating to the next tier when a reply fails validation.
+    for index, tier in enumerate(tiers):
+        last = index == len(tiers) - 1
+        start_time = time.monotonic()
+        try:
+            body = self.send_prompt(self, data, tier, request_logprobs=not last and bool(self.get_tier_option(self, prompt_key, tier, 'min_confidence')))
+        except LLMUnavailableError:
+            if last:
+                self.config.update_lock_status(False)
+                self.logger.info(f"Lock released.")
+                raise
+            self.logger.info(f"LLM tier {tier} unavailable for {prompt_key}, escalating.")
+            self.record_tier_stats(self, tier, escalated=True)
+            continue
+
+        self.record_llm_usage(self, prompt_key, tier, body, time.monotonic() - start_time)
+
+        if last or self.validate_tier_response(self, prompt_key, tier, body):
+            break
+
+        self.logger.info(f"LLM tier {tier} reply for {prompt_key} failed validation, escalating.")
+        self.record_tier_stats(self, tier, escalated=True)
+
+    if body is False:
+        return False
+    content_value = body['choices'][0]['message']['content']
+    if log_llm_response:
+        print('#### LLM Response ####')
+        print(content_value)
+        print('#### End of Response ####')
+    return True, content_value
+
+def send_prompt(self,data,tier=None,request_logprobs=False):
+    """
+    Sends a chat completion request to the endpoints of a model tier.
+
+    The request is routed to the healthy endpoint with the fewest outstanding requests and retried on
+    the other endpoints of the tier if it fails. Failed requests are counted by the circuit breaker of
+    the tier; while it is open, requests fail fast.
+
+    Args:
+        data (dict): The request body.
+        tier (str, optional): The model tier (`llm.tiers`), `None` for the default model.
+        request_logprobs (bool): Whether to request token log probabilities.
+
+    Returns:
+        dict: The decoded response body.
+        bool: `False` if the LLM server answered with an error status.
+
+    Raises:
+        LLMUnavailableError: If the LLM cannot be reached or the circuit breaker is open.
+    """
+    if tier is not None:
+        data = dict(data, model=self.config.get(f'llm.tiers.{tier}.model', data['model']), chat_template=self.config.get(f'llm.tiers.{tier}.chat_template', data['chat_template']))
+    if request_logprobs:
+        data = dict(data, logprobs=True)
+
+    breaker = self.get_llm_circuit_breaker(self, tier)
+
+    if not breaker.allow():
+        self.logger.info(f"LLM circuit breaker is open, failing fast. Stopping task processing Document No. {self.file_name}")
+        raise LLMCircuitOpenError("Stopping task due to LLM circuit breaker open.")
+
+    pool = self.get_llm_pool(self, tier)
+    tried = []
+    start_time = time.monotonic()
+
+    # Send the request to the least loaded endpoint, retrying on the other endpoints when it fails.
+    while True:
+        endpoint = pool.acquire(exclude=tried, timeout=self.config.get('general_setting.timeout', 300))
+
+        if endpoint is None:
+            self.logger.info(f"An error occurred waiting for LLM response, no LLM endpoint available. Stopping task processing Document No. {self.file_name}")
+            breaker.record_failure()
+            raise LLMUnavailableError("Stopping task due to LLM Request Exception.")
+
+        tried.append(endpoint)
+
+        headers = self.headers
+        timeout = self.config.get('general_setting.timeout', 300)
+        if tier is None and self.config.get('ai.broker_uri'):
+            headers = dict(self.headers, **{'X-AIMOA-Service': self.config.get('ai.service_name', 'aimoa')})
+            # The broker queue time is not an LLM failure, the broker bounds the LLM time itself (llm_broker.timeout).
+            timeout = self.config.get('ai.broker_timeout', 1800)
+
+        try:
+            response = requests.post(endpoint.uri, headers=headers, json=data, verify=self.config.get('ai.verify-HTTPS'), timeout=timeout)
+        except Timeout:
+            pool.release(endpoint, False)
+            if len(tried) < len(pool.endpoints):
+                self.logger.info(f"LLM endpoint {endpoint.uri} timed out, retrying on another endpoint.")
+                continue
+            self.logger.info(f"An error occurred waiting for LLM response, exceeded time out. Stopping task processing Document No. {self.file_name}")
+            breaker.record_failure()
+            raise LLMUnavailableError("Stopping task due to LLM timed out.")
+        except RequestException as e:
+            pool.release(endpoint, False)
+            if len(tried) < len(pool.endpoints):
+                self.logger.info(f"LLM endpoint {endpoint.uri} request failed ({e}), retrying on another endpoint.")
+                continue
+            self.logger.info(f"An error occurred waiting for LLM response, LLM Request Exception. Stopping task processing Document No. {self.file_name}")
+            breaker.record_failure()
+            raise LLMUnavailableError("Stopping task due to LLM Request Exception.")
+
+        # A busy or restarting server answers 5xx, try another endpoint before giving up.
+        if response.status_code >= 500 and len(tried) < len(pool.endpoints):
+            pool.release(endpoint, False)
+            self.logger.info(f"LLM endpoint {endpoint.uri} returned {response.status_code}, retrying on another endpoint.")
+            continue
+
+        pool.release(endpoint, response.status_code < 500)
+        break
+
+    self.record_tier_stats(self, tier, latency=time.monotonic() - start_time)
+
+    if response.status_code >= 500:
+        breaker.record_failure()
     else:
-        if response.status_code != 200:
+        breaker.record_success()
+
+    if response.status_code != 200:
+        return False
+    return response.json()
+
+def get_prompt_tiers(self,prompt_key):
+    """
+    Returns the model tiers a prompt is sent to, in order.
+
+    `ai_prompt_tiers` in the workflow configuration maps a prompt key to a tier name, a list of tier names,
+    or a mapping with `tier` and the validation options. The default model (`None`) is always the last
+    tier, so a reply that fails validation on a cheaper tier is escalated to it.
+
+    Args:
+        prompt_key (str): The `ai_prompts` key of the prompt.
+
+    Returns:
+        list: The model tiers, ending with `None` for the default model.
+    """
+    entry = self.ai_prompt_tiers.get(prompt_key) if prompt_key else None
+
+    if isinstance(entry, dict):
+        entry = entry.get('tier')
+    if not entry:
+        return [None]
+    if not isinstance(entry, list):
+        entry = [entry]
+
+    return [tier for tier in entry if self.config.get(f'llm.tiers.{tier}')] + [None]
+
+def get_tier_option(self,prompt_key,tier,option):
+    """
+    Returns a validation option of a prompt, from its `ai_prompt_tiers` entry or from `llm.tiers.<tier>`.
+    """
+    entry = self.ai_prompt_tiers.get(prompt_key) if prompt_key else None
+    if isinstance(entry, dict) and entry.get(option) is not None:
+        return entry[option]
+    return self.config.get(f'llm.tiers.{tier}.{option}') if tier else None
+
+def validate_tier_response(self,prompt_key,tier,body):
+    """
+    Checks whether the reply of a cheaper model tier can be used, or the prompt must be escalated.
+
+    A reply fails validation if the request failed, if it is not valid JSON for a prompt with a schema or
+    grammar, if it does not match the `validate` regular expression, or if the mean token probability is
+    below `min_confidence`.
+
+    Args:
+        prompt_key (str): The `ai_prompts` key of the prompt.
+        tier (str): The model tier that produced the reply.
+        body (dict or bool): The decoded response body, or `False` if the request failed.
+
+    Returns:
+        bool: `True` if the reply is accepted.
+    """
+    if body is False:
+        return False
+
+    choice = body['choices'][0]
+    content = choice['message']['content'] or ''
+
+    if self.ai_prompt_schemas.get(prompt_key):
+        try:
+            json.loads(content)
+        except json.JSONDecodeError:
+            return False
+
+    pattern = self.get_tier_option(self, prompt_key, tier, 'validate')
+    if pattern and not re.search(pattern, content, re.IGNORECASE):
+        return False
+
+    min_confidence = self.get_tier_option(self, prompt_key, tier, 'min_confidence')
+    if min_confidence:
+        tokens = (choice.get('logprobs') or {}).get('content') or []
+        if not tokens:
             return False
-        content_value = response.json()['choices'][0]['message']['content']
-        if log_llm_response:
-            print('#### LLM Response ####')
-            print(content_value)
-            print('#### End of Response ####')
-        return True, content_value
\ No newline at end of file
+        confidence = math.exp(sum(token['logprob'] for token in tokens) / len(tokens))
+        if confidence < min_confidence:
+            return False
+
+    return True
+
+def record_tier_stats(self,tier,latency=None,escalated=False):
+    """
+    Records the latency or an escalation of a model tier request, logging a summary every
+    `llm.tier_stats_interval` requests of the tier.
+    """
+    name = tier or 'default'
+
+    with _tier_stats_lock:
+        stats = _tier_stats.setdefault(name, {'requests': 0, 'seconds': 0.0, 'max_seconds': 0.0, 'escalations': 0})
+        if escalated:
+            stats['escalations'] += 1
+            return
+        stats['requests'] += 1
+        stats['seconds'] += latency
+        stats['max_seconds'] = max(stats['max_seconds'], latency)
+        summary = dict(stats)
+
+    if summary['requests'] % self.config.get('llm.tier_stats_interval', 50) == 0:
+        self.logger.info(f"LLM tier {name}: {summary['requests']} requests, average {summary['seconds'] / summary['requests']:.2f}s, max {summary['max_seconds']:.2f}s, {summary['escalations']} escalated.")
+
+def query_prompt_json(self,prompt,prompt_key):
+    """
+    Sends a prompt whose output is constrained by a JSON schema or grammar and decodes the reply.
+
+    The constraint for `prompt_key` is read from `ai_prompt_schemas` in the workflow configuration, so the
+    LLM reply is a JSON document and is decoded with a single `json.loads` call; no cleanup of code fences,
+    quotes or surrounding text is needed.
+
+    Args:
+        prompt (str): The prompt text to be sent to the AI model.
+        prompt_key (str): The `ai_prompts` key the prompt was built from.
+
+    Returns:
+        tuple:
+            - `True` if the request and decoding succeeded.
+            - The decoded JSON object.
+        bool: `False` if the request failed or the reply is not valid JSON.
+
+    Example:
+        >>> result = query_prompt_json(prompt, 'get_patient_dob')
+        >>> print(result)
+        (True, {'found': True, 'dob': '1990-01-01'})
+    """
+    result = self.query_prompt(self, prompt, prompt_key)
+
+    if isinstance(result, bool):
+        return False
+
+    try:
+        return True, json.loads(result[1])
+    except json.JSONDecodeError as e:
+        self.logger.info(f"JSON decoding failed for {prompt_key}: {e}")
+        return False
@@ -0,0 +1,210 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import logging
+import threading
+import time
+import requests
+from typing import List, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+# Endpoint pools per model tier for the process, shared by every workflow run, so outstanding requests and health are tracked across documents.
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+class LLMEndpoint:
+    """
+    An LLM server endpoint with its routing weight, concurrency limit and health.
+
+    Attributes:
+        uri (str): The chat completions URI of the endpoint.
+        weight (float): Relative share of requests routed to the endpoint.
+        max_concurrency (int): Maximum number of outstanding requests on the endpoint.
+        health_uri (str): The URI probed to check the endpoint health.
+        outstanding (int): Number of requests currently sent to the endpoint.
+        healthy (bool): `False` while the endpoint is ejected from routing.
+        failures (int): Number of consecutive failed requests or probes.
+    """
+    def __init__(self, uri: str, weight: float = 1, max_concurrency: int = 4, health_path: str = '/health'):
+        self.uri = uri
+        self.weight = float(weight) if weight else 1.0
+        self.max_concurrency = int(max_concurrency) if max_concurrency else 4
+        parts = urlsplit(uri)
+        self.health_uri = f"{parts.scheme}://{parts.netloc}{health_path}"
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+
+
+class LLMEndpointPool:
+    """
+    Routes LLM requests over several endpoints by least outstanding requests (relative to weight).
+
+    A background thread probes the health URI of every endpoint; endpoints that fail requests or probes
+    are ejected from routing and re-admitted once their probe succeeds again.
+
+    Attributes:
+        endpoints (List[LLMEndpoint]): The LLM endpoints.
+        failure_threshold (int): Consecutive failures after which an endpoint is ejected.
+    """
+    def __init__(self, endpoints: List[LLMEndpoint], health_interval: float = 10, failure_threshold: int = 2, verify: bool = False):
+        self.endpoints = endpoints
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        self.verify = verify
+        self.condition = threading.Condition()
+        self.stopped = threading.Event()
+
+        if len(endpoints) > 1 and health_interval:
+            threading.Thread(target=self._probe_loop, name='llm-health-probe', daemon=True).start()
+
+    def acquire(self, exclude=(), timeout: float = 300) -> Optional[LLMEndpoint]:
+        """
+        Reserves a request slot on the endpoint with the fewest outstanding requests per weight.
+
+        Healthy endpoints are preferred; ejected endpoints are only used when no healthy endpoint is left.
+        Waits for a free slot when all endpoints are at their concurrency limit.
+
+        Args:
+            exclude (iterable): Endpoints already tried for this request.
+            timeout (float): Maximum number of seconds to wait for a free slot.
+
+        Returns:
+            LLMEndpoint or None: The reserved endpoint, or `None` if no endpoint is available.
+        """
+        deadline = time.monotonic() + timeout
+
+        with self.condition:
+            while True:
+                candidates = [endpoint for endpoint in self.endpoints if endpoint not in exclude]
+                if not candidates:
+                    return None
+                healthy = [endpoint for endpoint in candidates if endpoint.healthy]
+                available = [endpoint for endpoint in (healthy or candidates) if endpoint.outstanding < endpoint.max_concurrency]
+
+                if available:
+                    endpoint = min(available, key=lambda e: (e.outstanding + 1) / e.weight)
+                    endpoint.outstanding += 1
+                    return endpoint
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.condition.wait(remaining)
+
+    def release(self, endpoint: LLMEndpoint, success: bool) -> None:
+        """
+        Releases the request slot of an endpoint and records whether the request succeeded.
+        """
+        with self.condition:
+            endpoint.outstanding -= 1
+            self._record(endpoint, success)
+            self.condition.notify_all()
+
+    def _record(self, endpoint: LLMEndpoint, success: bool) -> None:
+        if success:
+            if not endpoint.healthy:
+                logger.info(f"LLM endpoint {endpoint.uri} re-admitted.")
+            endpoint.failures = 0
+            endpoint.healthy = True
+        else:
+            endpoint.failures += 1
+            if endpoint.healthy and endpoint.failures >= self.failure_threshold:
+                logger.info(f"LLM endpoint {endpoint.uri} ejected after {endpoint.failures} failures.")
+                endpoint.healthy = False
+
+    def close(self) -> None:
+        """
+        Stops the background health probes.
+        """
+        self.stopped.set()
+
+    def _probe_loop(self) -> None:
+        while not self.stopped.is_set():
+            for endpoint in self.endpoints:
+                try:
+                    response = requests.get(endpoint.health_uri, verify=self.verify, timeout=5)
+                    success = response.status_code == 200
+                except requests.RequestException:
+                    success = False
+
+                with self.condition:
+                    # A passing probe re-admits an ejected endpoint, a failing one counts as a failure.
+                    if success or endpoint.healthy:
+                        self._record(endpoint, success)
+                    self.condition.notify_all()
+
+            self.stopped.wait(self.health_interval)
+
+
+def get_llm_pool(self, tier=None):
+    """
+    Returns the process-wide LLM endpoint pool of a model tier.
+
+    Endpoints are read from `ai.endpoints` (a list of `uri`, `weight` and `max_concurrency`); `ai.uri` may
+    also be a list of URIs. A single `ai.uri` gives a pool with one endpoint; with `ai.broker_uri` set, all
+    requests of the default model go to the LLM broker (`llm_broker.py`). Model tiers other than the
+    default read their endpoints from `llm.tiers.<tier>.endpoints` or `llm.tiers.<tier>.uri`. The pool is
+    rebuilt when the endpoint configuration changes.
+
+    Args:
+        tier (str, optional): The model tier, `None` for the default model.
+
+    Returns:
+        LLMEndpointPool: The LLM endpoint pool.
+
+    Example:
+        >>> pool = manager.get_llm_pool(manager)
+        >>> print([endpoint.uri for endpoint in pool.endpoints])
+        ['https://llm1:3334/v1/chat/completions', 'https://llm2:3334/v1/chat/completions']
+    """
+    if tier is None and self.config.get('ai.broker_uri'):
+        # The LLM broker queues and caps requests of all AI-MOA services itself.
+        endpoints = [{'uri': self.config.get('ai.broker_uri'), 'max_concurrency': self.config.get('ai.broker_max_concurrency', 16)}]
+    elif tier is None:
+        endpoints = self.config.get('ai.endpoints') or self.config.get('ai.uri', "https://localhost:3334/v1/chat/completions")
+    else:
+        endpoints = self.config.get(f'llm.tiers.{tier}.endpoints') or self.config.get(f'llm.tiers.{tier}.uri')
+
+    if not isinstance(endpoints, list):
+        endpoints = [endpoints]
+
+    endpoints = [endpoint if isinstance(endpoint, dict) else {'uri': endpoint} for endpoint in endpoints]
+    key = (repr(endpoints), self.config.get('ai.health_path', '/health'), self.config.get('ai.health_check_interval', 10))
+
+    with _pool_lock:
+        current = _pools.get(tier)
+        if current is None or current[0] != key:
+            pool = LLMEndpointPool(
+                [LLMEndpoint(endpoint['uri'], endpoint.get('weight', 1), endpoint.get('max_concurrency', 4), key[1]) for endpoint in endpoints],
+                health_interval=key[2],
+                failure_threshold=self.config.get('ai.eject_after_failures', 2),
+                verify=self.config.get('ai.verify-HTTPS')
+            )
+            if current is not None:
+                current[1].close()
+            _pools[tier] = (key, pool)
+            self.logger.info(f"LLM endpoint pool{f' for tier {tier}' if tier else ''} created with {len(endpoints)} endpoint(s).")
+
+    return _pools[tier][1]
@@ -0,0 +1,120 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import sqlite3
+import datetime
+import threading
+
+# Databases whose schema was created by this process, so the schema is only checked once per file.
+_initialized = set()
+_usage_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS llm_usage (
+    timestamp TEXT NOT NULL,
+    hour TEXT NOT NULL,
+    service TEXT,
+    document TEXT,
+    step TEXT,
+    prompt_key TEXT,
+    tier TEXT,
+    prompt_tokens INTEGER,
+    completion_tokens INTEGER,
+    prompt_eval_tokens INTEGER,
+    prompt_ms REAL,
+    predicted_ms REAL,
+    wall_ms REAL
+);
+CREATE INDEX IF NOT EXISTS llm_usage_hour ON llm_usage (hour);
+CREATE INDEX IF NOT EXISTS llm_usage_document ON llm_usage (document);
+CREATE VIEW IF NOT EXISTS llm_usage_by_prompt AS
+    SELECT hour, step, prompt_key, tier, COUNT(*) AS requests,
+           SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+           SUM(prompt_ms) AS prompt_ms, SUM(predicted_ms) AS predicted_ms, SUM(wall_ms) AS wall_ms
+    FROM llm_usage GROUP BY hour, step, prompt_key, tier;
+CREATE VIEW IF NOT EXISTS llm_usage_by_document AS
+    SELECT document, MIN(timestamp) AS started, COUNT(*) AS requests,
+           SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens,
+           SUM(prompt_ms) AS prompt_ms, SUM(predicted_ms) AS predicted_ms, SUM(wall_ms) AS wall_ms
+    FROM llm_usage GROUP BY document;
+"""
+
+
+def record_llm_usage(self, prompt_key, tier, body, wall_time):
+    """
+    Records the token usage and timings of an LLM request in the usage database (`llm_usage.stats_file`).
+
+    The `usage` (prompt and completion tokens) and `timings` (prompt processing and generation time, as
+    returned by llama.cpp) of the response are stored with the wall time of the request, the workflow step,
+    the `ai_prompts` key and the document. The `llm_usage_by_prompt` (per hour) and `llm_usage_by_document`
+    views aggregate them, ie.
+
+        sqlite3 ../config/llm_usage.db "SELECT * FROM llm_usage_by_prompt ORDER BY wall_ms DESC"
+
+    Args:
+        prompt_key (str): The `ai_prompts` key of the prompt, `None` if the prompt has no key.
+        tier (str): The model tier (`llm.tiers`), `None` for the default model.
+        body (dict or bool): The decoded response body, or `False` if the request failed.
+        wall_time (float): The wall time of the request, in seconds.
+
+    Returns:
+        bool: `True` if the usage was recorded, `False` otherwise.
+    """
+    if not self.config.get('llm_usage.enabled', False):
+        return False
+
+    stats_file = self.config.get('llm_usage.stats_file', '../config/llm_usage.db')
+    usage = (body or {}).get('usage') or {}
+    timings = (body or {}).get('timings') or {}
+    now = datetime.datetime.now()
+
+    record = (
+        now.isoformat(timespec='seconds'),
+        now.strftime('%Y-%m-%d %H:00'),
+        self.config.get('ai.service_name', 'aimoa'),
+        str(self.file_name),
+        self.current_step,
+        prompt_key or self.current_step,
+        tier or 'default',
+        usage.get('prompt_tokens'),
+        usage.get('completion_tokens'),
+        timings.get('prompt_n'),
+        timings.get('prompt_ms'),
+        timings.get('predicted_ms'),
+        wall_time * 1000
+    )
+
+    try:
+        with _usage_lock:
+            connection = sqlite3.connect(stats_file, timeout=10)
+            try:
+                if stats_file not in _initialized:
+                    connection.executescript(SCHEMA)
+                    _initialized.add(stats_file)
+                connection.execute("INSERT INTO llm_usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", record)
+                connection.commit()
+            finally:
+                connection.close()
+    except sqlite3.Error as e:
+        self.logger.error(f"Error recording LLM usage: {e}")
+        return False
+
+    return True
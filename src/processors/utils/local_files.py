@@ -63,5 +63,7 @@ def get_local_documents(self):
             file_bytes = file.read()
         self.config.set_shared_state('current_file', file_bytes)
         self.config.set_shared_state('current_file_name', files[0])
+        window = self.config.get('category_batch.window', 0) if self.config.get('category_batch.enabled', False) else 0
+        self.config.set_shared_state('upcoming_documents', [{'name': name, 'path': os.path.join(input_directory, name)} for name in files[1:window + 1]])
         return True
     return False
\ No newline at end of file
@@ -21,6 +21,8 @@
 
 import os
 import io
+import re
+from collections import Counter
 from doctr.io import DocumentFile
 from doctr.models import ocr_predictor
 import torch
@@ -133,6 +135,7 @@ def extract_text_from_pdf_file(self):
                         texts.append(text)
 
                 self.ocr_text = "\n".join(texts)
+                self.config.set_shared_state('ocr_pages', texts)
 
         self.logger.debug("Reading text data completed.")
 
@@ -164,6 +167,12 @@ def extract_text_doctr(self):
         Exception: If there is an issue performing OCR or reading the PDF.
     """
     try:
+        cached = self.get_cached_document(self)
+        if cached and cached.get('ocr_text'):
+            self.ocr_text = cached['ocr_text']
+            self.logger.info("Using the OCR text extracted in the category batch.")
+            return True
+
         if self.enable_ocr_gpu:
             self.logger.debug("OCR using GPU")
             device = torch.device(self.config.get('ocr.device'))
@@ -192,15 +201,20 @@ def extract_text_doctr(self):
 
         # Process the OCR result
         text = ""
+        pages = []
         for page_index, page in enumerate(result.pages):
             self.logger.debug(f"OCR processing page number: {page_index}")
+            page_text = ""
             for block in page.blocks:
                 for line in block.lines:
-                    text += '\n'
+                    page_text += '\n'
                     for word in line.words:
-                        text += word.value + ' '
+                        page_text += word.value + ' '
+            pages.append(page_text)
+            text += page_text
 
         self.ocr_text = text
+        self.config.set_shared_state('ocr_pages', pages)
         self.logger.debug("OCR completed.")
         return True
     except Exception as e:
@@ -220,6 +234,12 @@ def extract_text_doctr_api(self):
         bool: True if OCR and text extraction succeed, False otherwise.
     """
     try:
+        cached = self.get_cached_document(self)
+        if cached and cached.get('ocr_text'):
+            self.ocr_text = cached['ocr_text']
+            self.logger.info("Using the OCR text extracted in the category batch.")
+            return True
+
         # Read the PDF from bytes (or file)
         pdf_bytes = self.config.get_shared_state('current_file')
 
@@ -250,25 +270,97 @@ def extract_text_doctr_api(self):
         results = requests.post(self.config.get('ocr.api_uri','http://localhost:8002/ocr'), headers=headers, params=params, files=files, verify=self.config.get('ocr.verify-HTTPS')).json()
 
         all_outputs = []
+        pages = []
 
         for result in results:
             lines_output = []
 
             for page in result["items"]:
+                page_output = []
                 for block in page["blocks"]:
                     block_lines = []
                     for line in block["lines"]:
                         line_text = " ".join(word["value"] for word in line["words"])
                         block_lines.append(line_text)
                     # Join lines in the block and add a gap after each block
-                    lines_output.append("\n".join(block_lines) + "\n")
+                    page_output.append("\n".join(block_lines) + "\n")
+                lines_output.extend(page_output)
+                pages.append("\n\n".join(page_output))
 
             document_text = "\n\n".join(lines_output)
             all_outputs.append(document_text)
 
         self.ocr_text = "\n".join(all_outputs)
+        self.config.set_shared_state('ocr_pages', pages)
         self.logger.debug("OCR completed.")
         return True
     except Exception as e:
         self.logger.error(f"An error occurred in extract_text_doctr_api: {e}")
         return False
+
+
+# Page numbers added by fax machines and report generators, ie. 'Page 3 of 10', 'Pg. 3/10', '- 3 -'.
+PAGE_NUMBER_LINE = re.compile(r'^(?:page|pg\.?)\s*:?\s*\d+\s*(?:(?:of|/)\s*\d+)?$|^-\s*\d+\s*-$', re.IGNORECASE)
+
+
+def compact_ocr_text(self):
+    """
+    Compacts the OCR text before it is used in prompts.
+
+    This method removes header and footer lines repeated on several pages (sender fax numbers, timestamps,
+    report titles) except on the first page, removes page number lines ('Page 3 of 10'), joins words
+    hyphenated across line breaks, collapses runs of whitespace and drops empty lines. The compacted text
+    replaces `ocr_text`, and the token savings are logged.
+
+    Returns:
+        bool: `True` once the text has been compacted, `False` if there is no OCR text.
+
+    Example:
+        >>> manager.compact_ocr_text()
+        True
+    """
+    if not self.ocr_text:
+        return False
+
+    pages = self.config.get_shared_state('ocr_pages') or [self.ocr_text]
+    edge_lines = self.config.get('ocr.compaction_edge_lines', 6)
+
+    pages = [[re.sub(r'\s+', ' ', line).strip() for line in page.splitlines()] for page in pages]
+    pages = [[line for line in page if line] for page in pages]
+
+    def line_key(line):
+        return re.sub(r'\d', '0', line.lower())
+
+    # Lines found at the top or bottom of at least half of the pages are page headers or footers.
+    repeated = set()
+    if len(pages) > 1:
+        counts = Counter()
+        for page in pages:
+            counts.update({line_key(line) for line in page[:edge_lines] + page[-edge_lines:]})
+        repeated = {key for key, count in counts.items() if count >= max(2, len(pages) / 2)}
+
+    compacted = []
+    for page_index, page in enumerate(pages):
+        lines = []
+        for line in page:
+            if PAGE_NUMBER_LINE.match(line):
+                continue
+            if page_index > 0 and line_key(line) in repeated:
+                continue
+            # Join a word hyphenated at the end of the previous line.
+            if lines and re.search(r'[a-z]-$', lines[-1]) and re.match(r'[a-z]', line):
+                lines[-1] = lines[-1][:-1] + line
+                continue
+            lines.append(line)
+        compacted.append('\n'.join(lines))
+
+    text = '\n'.join(page for page in compacted if page)
+
+    before = self.count_tokens(self, self.ocr_text)
+    after = self.count_tokens(self, text)
+    saved = (1 - after / before) * 100 if before else 0
+    self.logger.info(f"OCR text compacted from {before} to {after} tokens ({saved:.0f}% saved), {len(repeated)} repeated header/footer lines removed.")
+
+    self.ocr_text = text
+    self.config.set_shared_state('ocr_pages', compacted)
+    return True
@@ -79,14 +79,14 @@ def pif_pdf(self):
         self.config.set_shared_state('get_document_description', (True, description))
 
         type_of_query = "search_hin"
-        search_result, data = self.get_patient_Html_Common(self,row['hin'],type_of_query)
+        search_result, data = self.get_patient_Html_Common(self,row['hin'],type_of_query, live=True)
 
         is_patient = False
 
         if search_result is False:
             self.logger.info("Patient not found using HC details, trying DOB.")
             type_of_query = "search_dob"
-            search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query)
+            search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query, live=True)
         else:
             self.logger.info("Match found using HC details, verifying.")
             is_patient, patient_id, roster_status, doctor = self.search_patient(self, data, row, 'hcn')
@@ -94,7 +94,7 @@ def pif_pdf(self):
             if is_patient is False:
                 self.logger.info("Patient not found using HC details, trying DOB.")
                 type_of_query = "search_dob"
-                search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query)
+                search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query, live=True)
 
         if search_result is False:
             self.logger.info("Patient not found using DOB, trying with ai-moa.")
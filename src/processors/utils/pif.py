@@ -22,7 +22,6 @@
 import re
 import os
 from datetime import datetime
-from bs4 import BeautifulSoup
 import mysql.connector
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import Select
@@ -227,14 +226,14 @@ def query_pif(self):
 
                     if category != "Not Eligible":
                         type_of_query = "search_hin"
-                        search_result, data = self.get_patient_Html_Common(self,row['hcn1'],type_of_query)
+                        search_result, data = self.get_patient_Html_Common(self,row['hcn1'],type_of_query, live=True)
 
                         is_patient = False
 
                         if search_result is False:
                             self.logger.info("Patient not found using HC details, trying DOB.")
                             type_of_query = "search_dob"
-                            search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query)
+                            search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query, live=True)
                         else:
                             self.logger.info("Match found using HC details, verifying.")
                             is_patient, patient_id, roster_status, doctor = self.search_patient(self, data, row, 'hcn')
@@ -242,7 +241,7 @@ def query_pif(self):
                             if is_patient is False:
                                 self.logger.info("Patient not found using HC details, trying DOB.")
                                 type_of_query = "search_dob"
-                                search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query)
+                                search_result, data = self.get_patient_Html_Common(self,row['dob1'],type_of_query, live=True)
                         
                         if search_result is False:
                             self.logger.info("Patient not found using DOB, Creating new demographic.")
@@ -556,14 +555,15 @@ def get_lines_after_last_match(self, filepath, phrase, block_size=4096):
 
 def search_patient(self, data, row, match_mode):
     """
-    Searches for a patient in the provided HTML data using the patient's first and last name.
+    Searches for a patient in the provided demographic search records using the patient's first and last name.
 
-    This method parses the provided HTML data (in the form of a string) using BeautifulSoup to extract patient information 
-    from a table. It then compares the first and last name from the provided `row` to the names in the extracted data to 
+    This method reads the patient information from the search records returned by `get_patient_Html_Common`,
+    searched live in the EMR, as the records of the local demographic index have no MRP name.
+    It then compares the first and last name from the provided `row` to the names in the extracted data to 
     find a match. If a match is found, it returns the patient's ID, roster status, and mrp information.
 
     The method performs the following steps:
-    1. Parses the `data` parameter (HTML) to extract patient-related information (name, ID, roster status, mrp).
+    1. Reads the patient-related information (name, ID, roster status, mrp) from the `data` records.
     2. When ``match_mode == 'dob'``, the function performs a case-insensitive,
         whole-word match on both first and last names. Regular expressions are
         used to ensure exact word boundaries and to safely handle special
@@ -578,7 +578,7 @@ def search_patient(self, data, row, match_mode):
        - The mrp's name (`mrp`).
 
     Parameters:
-        data (str): The HTML data containing the patient information to be searched.
+        data (list): The demographic search records containing the patient information to be searched.
         row (dict): A dictionary containing the patient's first and last name (keys `'firstname1'` and `'lastname1'`).
 
     Returns:
@@ -592,27 +592,13 @@ def search_patient(self, data, row, match_mode):
     patient_id = 0
     roster_status = ''
     mrp = ''
-    soup = BeautifulSoup(data, "html.parser")
-
-    pairs = []
-
-    for table_row in soup.find_all("tr"):
-        name_cell = table_row.find("td", class_="name")
-        chart_cell = table_row.find("td", class_="demoIdSearch")
-        roster_status_cell = table_row.find("td", class_="rosterStatus")
-        mrp_cell = table_row.find("td", class_="doctor")
-        dob_cell = table_row.find("td", class_="dob")
-
-        if name_cell and chart_cell:
-            link = chart_cell.find("a")
-            if link:
-                pairs.append((
-                name_cell.get_text(strip=True),
-                link.get_text(strip=True),
-                roster_status_cell.get_text(strip=True),
-                mrp_cell.get_text(strip=True),
-                dob_cell.get_text(strip=True)
-                ))
+    pairs = [(
+        record.get('formattedName', ''),
+        record['demographicNo'],
+        record.get('rosterStatus', ''),
+        record.get('doctor', ''),
+        record.get('formattedDob', '')
+        ) for record in data or [] if 'formattedName' in record]
     if pairs:
         if match_mode == 'dob':
             fn = re.escape(row['firstname1'].rstrip())
@@ -949,9 +935,7 @@ def create_tickler(self, demographic_id, message, to):
         "writeToEncounter": "false"
     }
 
-    self.headers['Referer'] = url
-    self.session.headers.update(self.headers)
-    response = self.session.post(url, data=params, verify=self.config.get('emr.verify-HTTPS'), timeout=self.config.get('general_setting.timeout', 300))
+    response = self.emr_client.post(url, data=params, headers=dict(self.headers, Referer=url))
 
     if response.status_code == 200:
         self.logger.info(f"Tickler updated.")
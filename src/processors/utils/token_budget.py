@@ -0,0 +1,156 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import re
+import zlib
+import requests
+from urllib.parse import urlsplit
+from requests.exceptions import RequestException
+from ..patient_tagger.identifiers import HIN_LABEL, DOB_LABEL, NAME_LABEL
+
+IDENTIFIER_LABELS = re.compile(r'\b(?:' + '|'.join([HIN_LABEL, DOB_LABEL, NAME_LABEL]) + r')\b', re.IGNORECASE)
+
+
+def count_tokens(self, text):
+    """
+    Counts the tokens of a text for the LLM.
+
+    With `token_budget.tokenizer` set to 'server', the LLM server `/tokenize` endpoint is used (llama.cpp
+    and vLLM); otherwise, or if the server cannot be reached, the count is approximated from
+    `token_budget.chars_per_token`.
+
+    Args:
+        text (str): The text to count.
+
+    Returns:
+        int: The number of tokens.
+
+    Example:
+        >>> manager.count_tokens(manager, 'Patient Name: DOE, JOHN')
+        8
+    """
+    if self.config.get('token_budget.tokenizer', 'approximate') == 'server':
+        uri = self.config.get('token_budget.tokenize_uri')
+        if not uri:
+            parts = urlsplit(self.get_llm_pool(self).endpoints[0].uri)
+            uri = f"{parts.scheme}://{parts.netloc}/tokenize"
+        try:
+            response = requests.post(uri, json={"content": text, "prompt": text, "model": self.config.get('llm.model')}, verify=self.config.get('ai.verify-HTTPS'), timeout=30)
+            if response.status_code == 200:
+                result = response.json()
+                return result.get('count') or len(result.get('tokens', []))
+        except (RequestException, ValueError) as e:
+            self.logger.info(f"Token count from LLM server failed, using approximation: {e}")
+
+    return int(len(text) / self.config.get('token_budget.chars_per_token', 3.5)) + 1
+
+
+def fit_text_to_budget(text, max_chars, header_lines=20):
+    """
+    Cuts a text to `max_chars` characters, keeping the most useful lines first.
+
+    Lines are kept in priority order: the first page header, then lines with a patient identifier label
+    (name, date of birth, health card number) with the line after them, then the rest of the body in order.
+    The kept lines are returned in their original order, with '[...]' where lines were left out. A line
+    longer than the budget left is cut to it, so text with few very long lines is not dropped entirely.
+    """
+    lines = text.splitlines()
+    header = list(range(min(header_lines, len(lines))))
+    identifiers = []
+    for index, line in enumerate(lines):
+        if index >= header_lines and IDENTIFIER_LABELS.search(line):
+            identifiers.extend(i for i in (index, index + 1) if i < len(lines))
+
+    selected = {}
+    used = 0
+    for index in header + identifiers + list(range(len(lines))):
+        if index in selected:
+            continue
+        size = len(lines[index]) + 1
+        if used + size > max_chars:
+            room = max_chars - used - len(' [...]') - 1
+            if room > 0:
+                selected[index] = lines[index][:room] + ' [...]'
+                used = max_chars
+            if index in header or index in identifiers:
+                continue
+            break
+        selected[index] = lines[index]
+        used += size
+
+    output = []
+    previous = -1
+    for index in sorted(selected):
+        if index != previous + 1:
+            output.append('[...]')
+        output.append(selected[index])
+        previous = index
+    if previous != len(lines) - 1:
+        output.append('[...]')
+
+    return '\n'.join(output)
+
+
+def get_prompt_text(self, prompt_key):
+    """
+    Returns the OCR text to include in a prompt, cut to the token budget of the prompt.
+
+    The budget is `token_budget.prompts.<prompt_key>` tokens, or `token_budget.default` for prompts without
+    their own budget. The tokens of the OCR text are counted once per document; texts within the budget
+    are returned unchanged, longer texts are cut with `fit_text_to_budget`, so the prefill cost of every
+    prompt is bounded.
+
+    Args:
+        prompt_key (str): The `ai_prompts` key of the prompt the text is used in.
+
+    Returns:
+        str: The OCR text for the prompt.
+
+    Example:
+        >>> text = manager.get_prompt_text(manager, 'get_patient_dob')
+    """
+    text = self.ocr_text or ''
+
+    if not self.config.get('token_budget.enabled', False) or not text:
+        return text
+
+    budget = self.config.get(f'token_budget.prompts.{prompt_key}') or self.config.get('token_budget.default', 3000)
+
+    key = zlib.crc32(text.encode('utf-8'))
+    token_count = self.config.get_shared_state('ocr_text_tokens')
+    if token_count is None or token_count[0] != key:
+        token_count = (key, self.count_tokens(self, text))
+        self.config.set_shared_state('ocr_text_tokens', token_count)
+
+    tokens = token_count[1]
+
+    if tokens <= budget:
+        return text
+
+    max_chars = int(len(text) * budget / tokens)
+    cached = self.config.get_shared_state(f'prompt_text_{key}_{max_chars}')
+    if cached is not None:
+        return cached
+
+    result = fit_text_to_budget(text, max_chars, self.config.get('token_budget.header_lines', 20))
+    self.config.set_shared_state(f'prompt_text_{key}_{max_chars}', result)
+    self.logger.info(f"OCR text of {tokens} tokens cut to the {budget} token budget of {prompt_key}.")
+    return result
@@ -30,12 +30,18 @@ import re
 from ..utils import local_files
 from ..utils import ocr
 from ..utils import llm
+from ..utils import llm_balancer
+from ..utils import circuit_breaker
+from ..utils import token_budget
+from ..utils import llm_usage
+from ..utils import document_spool
+from ..utils.circuit_breaker import LLMUnavailableError, LLMCircuitOpenError
 from ..utils import pif
 from ..utils import pdf_processor
 from ..o19 import o19_updater, o19_inbox
-from ..document_tagger import document_category, get_document_description
+from ..document_tagger import document_category, category_classifier, category_batch, sender_template, get_document_description
 from ..provider_tagger import provider
-from ..patient_tagger import patient
+from ..patient_tagger import patient, identifiers, identification, demographic_index, name_matcher
 
 huey: MemoryHuey = MemoryHuey('aimoa_automation')
 
@@ -65,6 +71,8 @@ class Workflow:
         self.steps = config.workflow_steps
         self.document_categories = config.document_categories
         self.ai_prompts = config.ai_prompts
+        self.ai_prompt_schemas = config.ai_prompt_schemas
+        self.ai_prompt_tiers = config.ai_prompt_tiers
         self.default_values = config.default_values
         self.patient_name = ''
         self.fl_name = ''
@@ -76,10 +84,12 @@ class Workflow:
         self.filepath = config.get('document_processor.local.input_directory', '/app/input')
         self.ocr_text = None
         self.session = session_manager.get_session()
+        self.emr_client = session_manager.get_emr_client()
         self.driver = session_manager.get_driver()
         self.login_successful = session_manager.get_login_successful()
         self.base_url = config.get('emr.base_url')
         self.file_name = ''
+        self.current_step = None
         self.inbox_incoming_lastfile = ''
         self.enable_ocr_gpu = config.get('ocr.enable_gpu', True)
         self.url = config.get('ai.uri', "https://localhost:3334/v1/chat/completions")
@@ -113,12 +123,33 @@ class Workflow:
         self.get_inbox_pendingdocs_documents = o19_inbox.get_inbox_pendingdocs_documents
         self.get_inbox_pendingdocs_documents_opro = o19_inbox.get_inbox_pendingdocs_documents_opro
         self.get_inbox_incomingdocs_documents = o19_inbox.get_inbox_incomingdocs_documents
+        self.get_inbox_pendingdocs_list = o19_inbox.get_inbox_pendingdocs_list
+        self.get_inbox_incomingdocs_list = o19_inbox.get_inbox_incomingdocs_list
         self.get_local_documents = local_files.get_local_documents
         self.has_ocr = ocr.has_ocr
         self.extract_text_doctr = ocr.extract_text_doctr
         self.extract_text_doctr_api = ocr.extract_text_doctr_api
         self.extract_text_from_pdf_file = ocr.extract_text_from_pdf_file
+        self.compact_ocr_text = ocr.compact_ocr_text
         self.query_prompt = llm.query_prompt
+        self.query_prompt_json = llm.query_prompt_json
+        self.send_prompt = llm.send_prompt
+        self.get_prompt_tiers = llm.get_prompt_tiers
+        self.get_tier_option = llm.get_tier_option
+        self.validate_tier_response = llm.validate_tier_response
+        self.record_tier_stats = llm.record_tier_stats
+        self.get_llm_pool = llm_balancer.get_llm_pool
+        self.get_llm_circuit_breaker = circuit_breaker.get_llm_circuit_breaker
+        self.defer_document = circuit_breaker.defer_document
+        self.complete_deferred_document = circuit_breaker.complete_deferred_document
+        self.count_tokens = token_budget.count_tokens
+        self.get_prompt_text = token_budget.get_prompt_text
+        self.record_llm_usage = llm_usage.record_llm_usage
+        self.get_document_spool = document_spool.get_document_spool
+        self.prefetch_documents = document_spool.prefetch_documents
+        self.finish_prefetch = document_spool.finish_prefetch
+        self.get_spooled_document = document_spool.get_spooled_document
+        self.fetch_document = document_spool.fetch_document
         self.query_pif = pif.query_pif
         self.pif_pdf = pdf_processor.pif_pdf
         self.get_fht_tickler_config = pif.get_fht_tickler_config
@@ -135,24 +166,64 @@ class Workflow:
         self.get_category_types = document_category.get_category_types
         self.get_category_type = document_category.get_category_type
         self.get_document_description = document_category.get_document_description
+        self.get_description_task_dependencies = document_category.get_description_task_dependencies
+        self.run_description_task = document_category.run_description_task
+        self.get_category_classifier = category_classifier.get_category_classifier
+        self.classify_document_category = category_classifier.classify_document_category
+        self.record_category_sample = category_classifier.record_category_sample
+        self.get_cached_document = category_batch.get_cached_document
+        self.cache_document = category_batch.cache_document
+        self.get_upcoming_documents = category_batch.get_upcoming_documents
+        self.extract_document_text = category_batch.extract_document_text
+        self.classify_document = category_batch.classify_document
+        self.classify_category_batch = category_batch.classify_category_batch
+        self.get_sender_template_index = sender_template.get_sender_template_index
+        self.get_sender_signature = sender_template.get_sender_signature
+        self.match_sender_template = sender_template.match_sender_template
+        self.record_sender_template = sender_template.record_sender_template
         self.get_provider_list = provider.get_provider_list
         self.get_provider_list_filemode = provider.get_provider_list_filemode
+        self.match_provider_candidates = provider.match_provider_candidates
         self.get_patient_hin = patient.get_patient_hin
         self.get_patient_dob = patient.get_patient_dob
         self.get_patient_name = patient.get_patient_name
+        self.get_name_search_keywords = patient.get_name_search_keywords
+        self.search_patient_names = patient.search_patient_names
         self.get_mrp_details = patient.get_mrp_details
+        self.get_cached_mrp = patient.get_cached_mrp
+        self.cache_mrp_details = patient.cache_mrp_details
         self.unidentified_patients = patient.unidentified_patients
         self.verify_demographic_number = patient.verify_demographic_number
         self.filter_results = patient.filter_results
         self.get_patient_Html_Common = patient.get_patient_Html_Common
         self.convert_date = patient.convert_date
         self.get_patient_Html = patient.get_patient_Html
+        self.get_cached_patient_search = patient.get_cached_patient_search
+        self.cache_patient_search = patient.cache_patient_search
+        self.invalidate_patient_search_cache = patient.invalidate_patient_search_cache
         self.compare_demographic_results = patient.compare_demographic_results
         self.decode_json = patient.decode_json
         self.compare_name_with_text = patient.compare_name_with_text
         self.verify_demographic_data = patient.verify_demographic_data
         self.compare_demographic_results_llm = patient.compare_demographic_results_llm
+        self.select_demographic_results_llm = patient.select_demographic_results_llm
         self.remove_mrp_details = patient.remove_mrp_details
+        self.extract_hin_candidates = identifiers.extract_hin_candidates
+        self.extract_dob_candidates = identifiers.extract_dob_candidates
+        self.extract_name_candidates = identifiers.extract_name_candidates
+        self.get_unique_identifier = identifiers.get_unique_identifier
+        self.get_identification_stats = identification.get_identification_stats
+        self.get_identification_key = identification.get_identification_key
+        self.get_identification_order = identification.get_identification_order
+        self.record_identification_results = identification.record_identification_results
+        self.run_identification_path = identification.run_identification_path
+        self.identify_patient = identification.identify_patient
+        self.get_demographic_index = demographic_index.get_demographic_index
+        self.sync_demographic_index = demographic_index.sync_demographic_index
+        self.search_demographic_index = demographic_index.search_demographic_index
+        self.get_name_matcher = name_matcher.get_name_matcher
+        self.rank_name_candidates = name_matcher.rank_name_candidates
+        self.select_name_candidate = name_matcher.select_name_candidate
 
 
 
@@ -167,6 +238,7 @@ class Workflow:
         """
         function_name = step['name']
         self.logger.info(f"Executing task: {function_name}")
+        self.current_step = function_name
         function_to_call = getattr(self, function_name, None)
         
         if function_to_call and callable(function_to_call):
@@ -189,6 +261,11 @@ class Workflow:
         self.config.reload_config() # Fetch updated config file data.
         self.logger.info("Starting workflow execution")
         self.config.clear_shared_state()
+
+        if self.get_llm_circuit_breaker(self).is_open():
+            self.logger.info("LLM circuit breaker is open, documents are deferred until the LLM is available.")
+            return
+
         current_step = self.steps[0]
 
         while current_step:
@@ -205,6 +282,8 @@ class Workflow:
                 self.config.update_lock_status(False)
                 self.logger.info(f"Lock released.")
                 self.logger.error(f"An error occurred: {e}")
+                if isinstance(e, LLMUnavailableError):
+                    self.defer_document(self, isinstance(e, LLMCircuitOpenError))
                 self.logger.info(f"Stopping workflow task, processing Document No. {self.file_name}")
                 self.logger.error("Exiting from workflow execution.")
                 return
@@ -0,0 +1,93 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+from datetime import date
+
+import pytest
+
+from processors.patient_tagger.identifiers import _bc_phn_valid, _luhn_valid, _parse_date, extract_dob_candidates, extract_hin_candidates, extract_name_candidates
+
+
+@pytest.mark.parametrize("number, valid", [
+    ('1234567897', True),
+    ('1234567898', False),
+    ('4165551234', False),
+])
+def test_luhn_check_digit(number, valid):
+    assert _luhn_valid(number) is valid
+
+
+@pytest.mark.parametrize("number, valid", [
+    ('9698658215', True),
+    ('9698658216', False),
+    ('1698658215', False),
+    ('969865821', False),
+])
+def test_bc_phn_check_digit(number, valid):
+    assert _bc_phn_valid(number) is valid
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('HCN: 1234 567 897 AB', ['1234567897']),
+    ('OHIP # 1234-567-897', ['1234567897']),
+    ('PHN: 9698 658 215', ['9698658215']),
+    ('HCN: 1234 567 898', []),
+    ('Phone: 1234 567 897', []),
+    ('Tel: 416-555-1234 Fax: 416-555-9876', []),
+    ('HCN: 1234 567 897 OHIP: 1234567897', ['1234567897']),
+])
+def test_extract_hin_candidates(text, expected):
+    assert extract_hin_candidates(None, text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('1990-02-03', date(1990, 2, 3)),
+    ('1990/2/3', date(1990, 2, 3)),
+    ('03/04/1990', date(1990, 4, 3)),
+    ('13/04/1990', date(1990, 4, 13)),
+    ('04/13/1990', date(1990, 4, 13)),
+    ('01-Feb-1990', date(1990, 2, 1)),
+    ('1990-Feb-01', date(1990, 2, 1)),
+    ('Feb 1, 1990', date(1990, 2, 1)),
+    ('1990-02-30', None),
+    ('3.4', None),
+])
+def test_parse_date(text, expected):
+    assert _parse_date(text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('DOB: 01-Feb-1990', ['1990-02-01']),
+    ('DOB: 2099-01-01', []),
+    ('DOB: 03/04/1990 Date of Birth: 04/03/1990', ['1990-04-03']),
+])
+def test_extract_dob_candidates(text, expected):
+    assert extract_dob_candidates(None, text) == expected
+
+
+@pytest.mark.parametrize("text, expected", [
+    ('Patient Name: DOE, JOHN DOB: 1990-01-01', ['DOE, JOHN']),
+    ('Patient Name: Smith John Paul', ['Smith John Paul']),
+    ('Patient Name: Smith, John\nReferring Dr', ['Smith, John']),
+    ('PATIENT NAME: SMITH, JOHN\nADDRESS: 123', ['SMITH, JOHN']),
+])
+def test_extract_name_candidates(text, expected):
+    assert extract_name_candidates(None, text) == expected
@@ -0,0 +1,119 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import logging
+from types import SimpleNamespace
+
+import pytest
+
+from processors.patient_tagger.identifiers import extract_dob_candidates
+from processors.patient_tagger.name_matcher import NameMatcher, get_name_matcher, nysiis, rank_name_candidates, select_name_candidate
+
+DOE_JOHN = {'demographicNo': '1', 'formattedName': 'DOE, JOHN', 'formattedDob': '1980-01-31'}
+SMITH_MARY = {'demographicNo': '2', 'formattedName': 'SMITH, MARY', 'formattedDob': '1975-05-05'}
+DOE_JOHN_1981 = {'demographicNo': '3', 'formattedName': 'DOE, JOHN', 'formattedDob': '1981-01-31'}
+DOE_JANE = {'demographicNo': '4', 'formattedName': 'DOE, JANE', 'formattedDob': '1980-01-31'}
+
+
+class FakeConfig:
+    def __init__(self, settings):
+        self.settings = settings
+        self.shared_state = {}
+
+    def get(self, key, default=None):
+        return self.settings.get(key, default)
+
+    def get_shared_state(self, key, default=None):
+        return self.shared_state.get(key, default)
+
+    def set_shared_state(self, key, value):
+        self.shared_state[key] = value
+
+
+def make_workflow(text, settings):
+    return SimpleNamespace(
+        config=FakeConfig(settings),
+        logger=logging.getLogger(__name__),
+        ocr_text=text,
+        get_name_matcher=get_name_matcher,
+        rank_name_candidates=rank_name_candidates,
+        extract_dob_candidates=extract_dob_candidates
+    )
+
+
+@pytest.mark.parametrize("first, second", [
+    ('Johnson', 'Jonson'),
+    ('Catherine', 'Katherine'),
+])
+def test_nysiis_matches_spelling_variants(first, second):
+    assert nysiis(first) == nysiis(second)
+
+
+def test_nysiis_keeps_different_names_apart():
+    assert nysiis('Smith') != nysiis('Jones')
+
+
+@pytest.mark.parametrize("part, token, distance", [
+    ('kitten', 'sitting', 3),
+    ('smith', 'smith', 0),
+    ('smith', 'smyth', 1),
+    ('doe', 'does', 1),
+])
+def test_distances(part, token, distance):
+    assert NameMatcher(token).distances([part]).tolist() == [[distance]]
+
+
+def test_distances_of_several_parts_and_tokens():
+    matcher = NameMatcher('sitting here')
+
+    assert matcher.tokens == ['here', 'sitting']
+    assert matcher.distances(['kitten', 'her']).tolist() == [[5, 3], [1, 7]]
+
+
+def test_contains_apostrophe_names():
+    matcher = NameMatcher("Patient: O'Brien, Mary")
+
+    assert matcher.contains("o'brien")
+    assert matcher.contains('MARY')
+    assert not matcher.contains('bri')
+
+
+@pytest.mark.parametrize("text, name, expected", [
+    ('Patient: DOE, JOHN', 'DOE, JOHN', 1.0),
+    ('Patient: DOE, JOHN', 'SMITH, MARY', 0.0),
+    ('Patient: Jonathon Smyth', 'SMITH, JONATHAN', 0.838),
+])
+def test_score_names(text, name, expected):
+    assert NameMatcher(text).score_names([name])[0] == pytest.approx(expected, abs=0.001)
+
+
+@pytest.mark.parametrize("settings, candidates, expected", [
+    ({'name_matching.enabled': True}, [DOE_JOHN, SMITH_MARY], DOE_JOHN),
+    ({'name_matching.enabled': True}, [DOE_JOHN_1981, DOE_JOHN], DOE_JOHN),
+    ({'name_matching.enabled': True}, [DOE_JOHN, DOE_JANE], None),
+    ({'name_matching.enabled': True, 'name_matching.threshold': 1.01}, [DOE_JOHN, SMITH_MARY], None),
+    ({'name_matching.enabled': True}, [DOE_JOHN], None),
+    ({}, [DOE_JOHN, SMITH_MARY], None),
+])
+def test_select_name_candidate(settings, candidates, expected):
+    workflow = make_workflow('Patient: DOE, JOHN DOB: 1980-01-31', settings)
+
+    assert select_name_candidate(workflow, candidates) == expected
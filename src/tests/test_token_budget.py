@@ -0,0 +1,46 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+from processors.utils.token_budget import fit_text_to_budget
+
+
+def test_long_single_line_is_cut_to_budget():
+    text = fit_text_to_budget('x' * 50000, 1000)
+
+    assert text != '[...]'
+    assert text.startswith('x' * 900)
+    assert text.endswith('[...]')
+    assert len(text) <= 1000
+
+
+def test_long_body_line_is_cut_after_header():
+    lines = [f"Header line {index}" for index in range(3)] + ['y' * 5000, 'z' * 5000]
+    text = fit_text_to_budget('\n'.join(lines), 1000, header_lines=3)
+
+    assert text.startswith('Header line 0\nHeader line 1\nHeader line 2\nyyy')
+    assert 'z' not in text
+    assert text.endswith('[...]')
+
+
+def test_text_within_budget_is_unchanged():
+    text = 'Patient Name: DOE, JOHN\nDOB: 1980-01-31'
+
+    assert fit_text_to_budget(text, 1000) == text
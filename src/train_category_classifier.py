@@ -0,0 +1,98 @@
+# COPYRIGHT © 2024 by Spring Health Corporation <office(at)springhealth.org>
+# Toronto, Ontario, Canada
+# SUMMARY: This file is part of the Get Well Clinic's original "AI-MOA" project's collection of software,
+# documentation, and configuration files.
+# These programs, documentation, and configuration files are made available to you as open source
+# in the hopes that your clinic or organization may find it useful and improve your care to the public
+# by reducing administrative burden for your staff and service providers.
+# NO WARRANTY: This software and related documentation is provided "AS IS" and WITHOUT ANY WARRANTY of any kind;
+# and WITHOUT EXPRESS OR IMPLIED WARRANTY OF SUITABILITY, MERCHANTABILITY OR FITNESS FOR A PARTICULAR PURPOSE.
+# LICENSE: This software is licensed under the "GNU Affero General Public License Version 3".
+# Please see LICENSE file for full details. Or contact the Free Software Foundation for more details.
+# ***
+# NOTICE: We hope that you will consider contributing to our common source code repository so that
+# others may benefit from your shared work.
+# However, if you distribute this code or serve this application to users in modified form,
+# or as part of a derivative work, you are required to make your modified or derivative work
+# source code available under the same herein described license.
+# Please notify Spring Health Corp <office(at)springhealth.org> where your modified or derivative work
+# source code can be acquired publicly in its latest most up-to-date version, within one month.
+# ***
+
+import argparse
+import json
+import random
+from collections import Counter
+from processors.document_tagger.category_classifier import CategoryClassifier
+
+def load_corpus(corpus_file: str):
+    """
+    Loads the category corpus recorded by AI-MOA (one JSON object with `text` and `category` per line).
+    Later entries for the same document replace earlier ones.
+    """
+    samples = {}
+    with open(corpus_file, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if record.get('text') and record.get('category'):
+                samples[record.get('document') or len(samples)] = (record['text'], record['category'])
+    return list(samples.values())
+
+def args_parse_training():
+    """
+    Parse command-line arguments for training the category classifier.
+    """
+    parser = argparse.ArgumentParser(description="AI-MOA category classifier training")
+    parser.add_argument("--corpus", default="../config/category_corpus.jsonl", help="Path to the category corpus file")
+    parser.add_argument("--output", default="../config/category_classifier.npz", help="Path to the output model file")
+    parser.add_argument("--holdout", type=float, default=0.2, help="Fraction of documents held out for calibration and evaluation")
+    parser.add_argument("--min-samples", type=int, default=5, help="Minimum number of documents for a category to be learned")
+    parser.add_argument("--features", type=int, default=2 ** 17, help="Size of the hashed feature space")
+    return parser.parse_args()
+
+def main():
+    args = args_parse_training()
+    samples = load_corpus(args.corpus)
+    counts = Counter(category for _, category in samples)
+    samples = [sample for sample in samples if counts[sample[1]] >= args.min_samples]
+
+    if not samples:
+        print(f"No usable documents found in {args.corpus}.")
+        return
+
+    random.seed(0)
+    random.shuffle(samples)
+    split = int(len(samples) * (1 - args.holdout))
+    train, holdout = samples[:split], samples[split:]
+
+    print(f"Training on {len(train)} documents, {len(holdout)} held out, {len(set(c for _, c in samples))} categories.")
+    classifier = CategoryClassifier(n_features=args.features)
+    classifier.fit([text for text, _ in train], [category for _, category in train])
+
+    if holdout:
+        texts = [text for text, _ in holdout]
+        labels = [category for _, category in holdout]
+        print(f"Calibrated temperature: {classifier.calibrate(texts, labels)}")
+        predictions = [classifier.predict(text) for text in texts]
+        for threshold in (0.5, 0.7, 0.8, 0.9, 0.95):
+            accepted = [(p, label) for p, label in zip(predictions, labels) if p[1] >= threshold]
+            correct = sum(1 for p, label in accepted if p[0] == label)
+            accuracy = correct / len(accepted) if accepted else 0
+            print(f"Threshold {threshold}: coverage {len(accepted) / len(labels):.1%}, accuracy {accuracy:.1%}")
+
+        # Train the final model on all documents, keeping the calibrated temperature.
+        temperature = classifier.temperature
+        classifier.fit([text for text, _ in samples], [category for _, category in samples])
+        classifier.temperature = temperature
+
+    classifier.save(args.output)
+    print(f"Category classifier saved to {args.output}.")
+
+if __name__ == "__main__":
+    main()